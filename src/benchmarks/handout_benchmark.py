@@ -0,0 +1,114 @@
+'''
+Benchmark of the streaming handout archive against the previous copy to a temporary directory and shutil.make_archive,
+and of an incremental update of the archive after one file changed
+
+Run from the src directory:
+    python benchmarks/handout_benchmark.py [--size-mb 2048] [--files 64] [--jobs 8] [--directory /tmp]
+'''
+
+import os
+import sys
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from library.archive import HandoutArchive
+
+ROOT = "web_benchmark"
+
+def io_counters() -> dict:
+    '''
+    Bytes read and written by this process, when the kernel reports them
+    '''
+    try:
+        with open("/proc/self/io") as file:
+            return {key: int(value) for key, value in (line.split(": ") for line in file.read().splitlines())}
+    except (OSError, ValueError):
+        return {}
+
+def create_handout(path: Path, size: int, files: int):
+    # Half of the files are text, which compresses well, and half are random, like compiled binaries
+    chunk = 1024 * 1024
+    text = (b"The quick brown fox jumps over the lazy dog. " * (chunk // 45 + 1))[:chunk]
+    for index in range(files):
+        file = path.joinpath(f"dir{index % 8}", f"file{index}.{'txt' if index % 2 else 'bin'}")
+        file.parent.mkdir(parents=True, exist_ok=True)
+        with open(file, "wb") as output:
+            remaining = size // files
+            while remaining > 0:
+                output.write((text if index % 2 else os.urandom(chunk))[:remaining])
+                remaining -= chunk
+
+def archive_copy(handout: Path, destination: Path):
+    with tempfile.TemporaryDirectory(dir=destination.parent) as temp_dir:
+        shutil.copytree(handout, os.path.join(temp_dir, ROOT))
+        shutil.make_archive(str(destination.with_suffix("")), "zip", root_dir=temp_dir, base_dir=ROOT)
+
+def archive_stream(handout: Path, destination: Path, jobs: int = 1):
+    HandoutArchive(handout, ROOT, jobs=jobs).write(destination)
+
+def archive_incremental(handout: Path, destination: Path):
+    # The previous archive and its manifest are written first, then one file is changed
+    HandoutArchive(handout, ROOT).write(destination, incremental=True)
+    changed = next(handout.rglob("*.txt"))
+    with open(changed, "ab") as file:
+        file.write(b"changed")
+    return lambda: HandoutArchive(handout, ROOT).write(destination, incremental=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the handout archive")
+    parser.add_argument("--size-mb", help="Total size of the generated handout", type=int, default=2048)
+    parser.add_argument("--files", help="Number of files in the generated handout", type=int, default=64)
+    parser.add_argument("--jobs", help="Number of compression threads of the parallel measurement", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--directory", help="Directory to generate the handout in", type=str, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        handout = Path(directory).joinpath("handout")
+        create_handout(handout, args.size_mb * 1024 * 1024, args.files)
+        print(f"Handout: {args.size_mb} MB in {args.files} files")
+
+        measurements = {
+            "copytree + make_archive": archive_copy,
+            "HandoutArchive (streaming)": archive_stream,
+            f"HandoutArchive ({args.jobs} threads)": lambda handout, destination: archive_stream(handout, destination, args.jobs),
+        }
+        names = {}
+        baseline = None
+        for name, function in measurements.items():
+            destination = Path(directory).joinpath(f"{ROOT}.zip")
+            before = io_counters()
+            start = time.perf_counter()
+            function(handout, destination)
+            seconds = time.perf_counter() - start
+            after = io_counters()
+
+            baseline = baseline or seconds
+            line = f"  {name:<31} {seconds:8.2f} s  ({baseline / seconds:.2f}x)"
+            if before and after:
+                line += f"  read {(after['rchar'] - before['rchar']) / 1024 ** 2:8.0f} MB, written {(after['wchar'] - before['wchar']) / 1024 ** 2:8.0f} MB"
+            print(line)
+
+            with zipfile.ZipFile(destination) as archive:
+                names[name] = sorted(archive.namelist())
+            destination.unlink()
+
+        if len({tuple(value) for value in names.values()}) != 1:
+            print("Archives differ in their entries")
+            sys.exit(1)
+
+        destination = Path(directory).joinpath(f"{ROOT}.zip")
+        update = archive_incremental(handout, destination)
+        start = time.perf_counter()
+        result = update()
+        seconds = time.perf_counter() - start
+        print(f"  {'HandoutArchive (1 file changed)':<31} {seconds:8.2f} s  ({baseline / seconds:.2f}x)  compressed {result.compressed}, reused {result.reused} files")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+'''
+Benchmark of the template engine against the previous str.replace based renderer
+
+Run from the src directory:
+    python benchmarks/template_benchmark.py [--size-kb 512] [--iterations 20]
+'''
+
+import sys
+import argparse
+import timeit
+
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from library.template import Template
+
+BASE_TEMPLATE = Path(__file__).resolve().parent.parent.parent.joinpath("template", "instanced-k8s-challenge.yml")
+CHALLENGE_TEMPLATE = Path(__file__).resolve().parent.parent.parent.joinpath("template", "instanced-web-k8s.yml")
+
+VALUES = {
+    "CHALLENGE_NAME": "benchmark",
+    "CHALLENGE_CATEGORY": "web",
+    "CHALLENGE_TYPE": "web",
+    "CHALLENGE_VERSION": "42",
+    "CHALLENGE_EXPIRES": "3600",
+    "CHALLENGE_AVAILABLE_AT": "0",
+    "CHALLENGE_REPO": "ctfpilot/benchmark",
+    "DOCKER_IMAGE": "web-benchmark",
+}
+
+def replace_templated(key: str, value: str, content: str):
+    content = content.replace("{{ " + key + " }}", value)
+    content = content.replace("{{" + key + "}}", value)
+    content = content.replace("{ { " + key + " } }", value)
+    content = content.replace("{ {" + key + "} }", value)
+    return content
+
+def render_replace(base: str, block: str) -> str:
+    output = base.replace("    %%TEMPLATE%%", block)
+    for key, value in VALUES.items():
+        output = replace_templated(key, value, output)
+    return output
+
+def render_template(base: str, block: str) -> str:
+    return Template(base).render(VALUES, {"TEMPLATE": block})
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the template engine")
+    parser.add_argument("--size-kb", help="Approximate size of the embedded challenge template", type=int, default=512)
+    parser.add_argument("--iterations", help="Number of renders per measurement", type=int, default=20)
+    args = parser.parse_args()
+
+    base = BASE_TEMPLATE.read_text()
+    challenge = CHALLENGE_TEMPLATE.read_text()
+    repeats = max(1, (args.size_kb * 1024) // len(challenge))
+    block = "\n".join(["    " + line for line in ("---\n".join([challenge] * repeats)).splitlines()])
+
+    if render_replace(base, block) != render_template(base, block):
+        print("Outputs differ between the renderers")
+        sys.exit(1)
+
+    compiled = Template(base)
+    measurements = {
+        "str.replace": lambda: render_replace(base, block),
+        "Template (compile + render)": lambda: render_template(base, block),
+        "Template (render only)": lambda: compiled.render(VALUES, {"TEMPLATE": block}),
+    }
+
+    print(f"Embedded template: {len(block) / 1024:.0f} KB, {args.iterations} iterations")
+    baseline = None
+    for name, function in measurements.items():
+        seconds = min(timeit.repeat(function, number=args.iterations, repeat=3)) / args.iterations
+        baseline = baseline or seconds
+        print(f"  {name:<28} {seconds * 1000:8.2f} ms/render  ({baseline / seconds:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+'''
+Benchmark of loading and dumping a challenge.yml with the pure-Python and libyaml implementations
+
+Run from the src directory:
+    python benchmarks/yaml_benchmark.py [--iterations 2000]
+'''
+
+import sys
+import argparse
+import timeit
+
+from pathlib import Path
+
+import yaml
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from library.utils import Utils
+
+CHALLENGE_FILE = Path(__file__).resolve().parent.parent.joinpath("tests", "data", "full-example.yml")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark YAML loading and dumping")
+    parser.add_argument("--iterations", help="Number of loads and dumps per measurement", type=int, default=2000)
+    args = parser.parse_args()
+
+    if not hasattr(yaml, "CSafeLoader"):
+        print("PyYAML is not built with libyaml, both measurements use the pure-Python implementation")
+
+    content = CHALLENGE_FILE.read_text()
+    data = yaml.safe_load(content)
+
+    if Utils.dump_yaml(data) != yaml.dump(data, Dumper=yaml.SafeDumper, sort_keys=False, allow_unicode=True):
+        print("Outputs differ between the dumpers")
+        sys.exit(1)
+
+    measurements = {
+        "load (pure-Python)": lambda: yaml.load(content, Loader=yaml.SafeLoader),
+        "load (Utils.load_yaml)": lambda: Utils.load_yaml(CHALLENGE_FILE),
+        "dump (pure-Python)": lambda: yaml.dump(data, Dumper=yaml.SafeDumper, sort_keys=False, allow_unicode=True),
+        "dump (Utils.dump_yaml)": lambda: Utils.dump_yaml(data),
+    }
+
+    print(f"{CHALLENGE_FILE.name}: {len(content)} bytes, {args.iterations} iterations")
+    baseline = None
+    for name, function in measurements.items():
+        seconds = min(timeit.repeat(function, number=args.iterations, repeat=3)) / args.iterations
+        # Compare each libyaml measurement to the pure-Python one before it
+        baseline = seconds if "pure-Python" in name else baseline
+        print(f"  {name:<24} {seconds * 1_000_000:8.1f} us  ({baseline / seconds:.2f}x)")
+
+if __name__ == "__main__":
+    main()
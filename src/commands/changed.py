@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+from contextlib import redirect_stdout
+from pathlib import PurePosixPath
+from typing import List, Optional, Set
+
+from library.utils import Utils
+from library.index import ChallengeIndex
+
+# Shared templates, and the outputs they affect
+CHALLENGE_TEMPLATES = ["challenge-configmap.yml"]
+INSTANCED_TEMPLATES = ["instanced-k8s-challenge.yml"]
+PAGE_TEMPLATES = ["page-configmap.yml"]
+CREATE_TEMPLATES = ["instanced-web-k8s.yml", "instanced-tcp-k8s.yml"]
+
+class Args:
+    args = None
+    subcommand = False
+
+    def __init__(self, parent_parser = None):
+        if parent_parser:
+            self.subcommand = True
+            self.parser = parent_parser.add_parser("changed", help="List challenges and pages affected by changes since a git ref")
+        else:
+            self.parser = argparse.ArgumentParser(description="List challenges and pages affected by changes since a git ref")
+
+        self.parser.add_argument("--since", help="Git ref to compare against (e.g. 'origin/main' or a commit SHA)", required=True)
+        self.parser.add_argument("--until", help="Git ref to compare to. Defaults to the working tree", default=None)
+        self.parser.add_argument("--type", help="Type of resources to list", choices=["all", "challenges", "pages"], default="all")
+        self.parser.add_argument("--format", help="Output format. 'matrix' outputs a GitHub Actions matrix", choices=["text", "json", "matrix"], default="text")
+        self.parser.add_argument("--github-output", help="Also write the 'matrix' and 'has-changes' outputs to the file in GITHUB_OUTPUT, so jobs can be skipped when nothing changed", action="store_true")
+
+    def parse(self):
+        if self.subcommand:
+            self.args = self.parser.parse_args(sys.argv[2:])
+        else:
+            self.args = self.parser.parse_args()
+
+    def __getattr__(self, name):
+        return getattr(self.args, name)
+
+class Changes:
+    '''
+    Maps changed files onto the challenges and pages they affect
+    '''
+    def __init__(self):
+        self.challenges: Set[str] = set()
+        self.pages: Set[str] = set()
+        self.removed_challenges: Set[str] = set()
+        self.removed_pages: Set[str] = set()
+        self.templates: Set[str] = set()
+
+    @staticmethod
+    def git(command: List[str]) -> List[str]:
+        result = subprocess.run(["git"] + command, cwd=Utils.get_repo_dir(), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"git {command[0]} failed: {result.stderr.strip()}")
+
+        return [line.strip() for line in result.stdout.splitlines() if line.strip()]
+
+    @staticmethod
+    def git_changed_files(since: str, until: Optional[str] = None) -> List[str]:
+        command = ["diff", "--name-only", "--no-renames", "--relative", since]
+        if until:
+            command.append(until)
+        files = Changes.git(command)
+
+        # Compared to the working tree, new files that are not committed yet are changes too
+        if not until:
+            files += Changes.git(["ls-files", "--others", "--exclude-standard"])
+
+        return files
+
+    def add_file(self, file: str):
+        parts = PurePosixPath(file).parts
+
+        if len(parts) >= 4 and parts[0] == "challenges":
+            challenge = f"{parts[1]}/{parts[2]}"
+            if Utils.get_challenges_dir().joinpath(parts[1], parts[2]).is_dir():
+                self.challenges.add(challenge)
+            else:
+                self.removed_challenges.add(challenge)
+        elif len(parts) >= 3 and parts[0] == "pages":
+            if Utils.get_pages_dir().joinpath(parts[1]).is_dir():
+                self.pages.add(parts[1])
+            else:
+                self.removed_pages.add(parts[1])
+        elif len(parts) >= 2 and parts[0] == "template":
+            self.templates.add(str(PurePosixPath(*parts[1:])))
+
+    @staticmethod
+    def is_instanced(challenge: str) -> bool:
+        try:
+            # Keep loading messages out of the command output
+            with redirect_stdout(sys.stderr):
+                loaded = ChallengeIndex.shared().challenge(Utils.get_challenges_dir().joinpath(challenge))
+        except Exception:
+            # Let downstream commands report invalid challenges
+            return True
+        return loaded is None or loaded.type == "instanced"
+
+    def add_shared_templates(self):
+        '''
+        Changes to shared templates affect every output rendered from them
+        '''
+        templates = self.templates - set(CREATE_TEMPLATES)
+        if not templates:
+            return
+
+        unknown = templates - set(CHALLENGE_TEMPLATES) - set(INSTANCED_TEMPLATES) - set(PAGE_TEMPLATES)
+
+        if unknown or templates & set(CHALLENGE_TEMPLATES):
+            self.challenges.update(Utils.list_challenges())
+        elif templates & set(INSTANCED_TEMPLATES):
+            ChallengeIndex.shared().refresh(pages=[])
+            self.challenges.update(challenge for challenge in Utils.list_challenges() if self.is_instanced(challenge))
+
+        if unknown or templates & set(PAGE_TEMPLATES):
+            self.pages.update(Utils.list_pages())
+
+    @staticmethod
+    def from_git(since: str, until: Optional[str] = None) -> "Changes":
+        changes = Changes()
+        for file in Changes.git_changed_files(since, until):
+            changes.add_file(file)
+        changes.add_shared_templates()
+        return changes
+
+class ChangedCommand:
+    args = None
+    parent_parser = None
+
+    def __init__(self, parent_parser = None):
+        self.parent_parser = parent_parser
+
+    def register_subcommand(self):
+        self.args = Args(self.parent_parser)
+
+    @staticmethod
+    def matrix(challenges: List[str], pages: List[str]) -> dict:
+        include = []
+        for challenge in challenges:
+            category, slug = challenge.split("/", 1)
+            include.append({"type": "challenge", "name": challenge, "category": category, "slug": slug})
+        for page in pages:
+            include.append({"type": "page", "name": page, "slug": page})
+        return {"include": include}
+
+    @staticmethod
+    def write_github_output(matrix: dict):
+        '''
+        Write the matrix and whether anything changed to the outputs of the GitHub Actions step.
+        An empty matrix is rejected by GitHub Actions, so jobs using it should only run when has-changes is true
+        '''
+        path = os.getenv("GITHUB_OUTPUT")
+        if not path:
+            print("GITHUB_OUTPUT is not set. --github-output can only be used in GitHub Actions", file=sys.stderr)
+            sys.exit(1)
+
+        with open(path, "a") as f:
+            f.write(f"matrix={json.dumps(matrix)}\n")
+            f.write(f"has-changes={'true' if matrix['include'] else 'false'}\n")
+
+    def run(self):
+        if not self.args:
+            arguments = Args(self.parent_parser)
+            arguments.parse()
+            self.args = arguments
+        else:
+            self.args.parse()
+
+        args = self.args
+
+        try:
+            changes = Changes.from_git(args.since, args.until)
+        except RuntimeError as e:
+            print(str(e), file=sys.stderr)
+            sys.exit(1)
+
+        challenges = sorted(changes.challenges) if args.type in ["all", "challenges"] else []
+        pages = sorted(changes.pages) if args.type in ["all", "pages"] else []
+
+        if args.github_output:
+            self.write_github_output(self.matrix(challenges, pages))
+
+        if args.format == "json":
+            print(json.dumps({
+                "has_changes": bool(challenges or pages),
+                "challenges": challenges,
+                "pages": pages,
+                "removed_challenges": sorted(changes.removed_challenges) if args.type in ["all", "challenges"] else [],
+                "removed_pages": sorted(changes.removed_pages) if args.type in ["all", "pages"] else [],
+                "templates": sorted(changes.templates),
+            }, indent=2))
+        elif args.format == "matrix":
+            print(json.dumps(self.matrix(challenges, pages)))
+        else:
+            for name in challenges + pages:
+                print(name)
+
+if __name__ == "__main__":
+    ChangedCommand().run()
@@ -3,17 +3,29 @@ import sys
 import argparse
 
 from datetime import datetime
+from dataclasses import dataclass
+from typing import List
 
 from library.utils import Utils
 from library.data import Page
 from library.generator import Generator
 from library.config import PAGE_SCHEMA
+from library.parallel import ParallelExecutor, Task, default_jobs
+from library.template import Template, TemplateCache
+from library.index import ChallengeIndex
+
+@dataclass
+class PageOptions:
+    repo: str = ""
 
 class Args:
     args = None
     page: Page
+    pages: List[str] = []
+    batch = False
     subcommand = False
     repo: str
+    jobs: int = 1
     
     def __init__(self, parent_parser = None):
         if parent_parser:
@@ -22,8 +34,10 @@ class Args:
         else:
             self.parser = argparse.ArgumentParser(description="Render template for CTFd pages")
 
-        self.parser.add_argument("page", help="Page to render (directory for page - 'web/example')")
+        self.parser.add_argument("page", help="Page(s) to render (directory for page - 'web/example')", nargs="*")
+        self.parser.add_argument("--all", help="Render every page in the repository", action="store_true")
         self.parser.add_argument("--repo", help="GitHub repository for CTFd pages in the format 'owner/repo'", default=os.getenv("GITHUB_REPOSITORY", ""))
+        self.parser.add_argument("--jobs", help="Number of pages to render in parallel when rendering multiple pages (defaults to the number of CPUs)", type=int, default=default_jobs())
     
     def parse(self):
         if self.subcommand:
@@ -31,24 +45,45 @@ class Args:
         else:
             self.args = self.parser.parse_args()
         
+        self.repo = self.args.repo or os.getenv("GITHUB_REPOSITORY", "")
+        self.jobs = self.args.jobs
+        
+        if self.args.all or len(self.args.page) > 1:
+            self.batch = True
+            self.pages = self.args.page or Utils.list_pages()
+            if not self.pages:
+                print("No pages found to render")
+                sys.exit(1)
+        else:
+            self.parse_single()
+        
+        if not self.repo or self.repo.strip() == "":
+            print("GitHub repository is required. Please provide it via the --repo argument or the GITHUB_REPOSITORY environment variable.")
+            sys.exit(1)
+    
+    def parse_single(self):
+        if not self.args.page:
+            print("A page must be provided. Use --all to render every page.")
+            sys.exit(1)
+        
+        page_name = self.args.page[0]
+        
         # Parse page from page argument
-        page_path = Utils.get_page_dir(self.args.page)
+        page_path = Utils.get_page_dir(page_name)
         if not page_path.exists() or not page_path.is_dir():
-            print(f"Page {self.args.page} does not exist")
+            print(f"Page {page_name} does not exist")
             sys.exit(1)
 
-        page = Page.load_dir(page_path)
+        page = ChallengeIndex.shared().page(page_path)
 
         if not page:
-            print(f"Page {self.args.page} is not a valid page")
+            print(f"Page {page_name} is not a valid page")
             sys.exit(1)
 
         self.page = page
-        self.repo = self.args.repo or os.getenv("GITHUB_REPOSITORY", "")
-        
-        if not self.repo or self.repo.strip() == "":
-            print("GitHub repository is required. Please provide it via the --repo argument or the GITHUB_REPOSITORY environment variable.")
-            sys.exit(1)
+    
+    def options(self) -> PageOptions:
+        return PageOptions(self.repo)
 
     def __getattr__(self, name):
         return getattr(self.args, name)
@@ -69,21 +104,10 @@ class PageRender:
             print("No page specified")
             sys.exit(1)
         
-    @staticmethod
-    def replace_templated(key: str, value: str, content: str):
-        content = content.replace("{{ " + key + " }}", value)
-        content = content.replace("{{" + key + "}}", value)
-        content = content.replace("{ { " + key + " } }", value)
-        content = content.replace("{ {" + key + "} }", value)
-        return content
-    
     def get_template_content(self):
         template_source = self.page.str_json(PAGE_SCHEMA)
 
-        # Iterate over each line in the source, and indent it
-        template_source_indented = "".join(["    " + line + "\n" for line in template_source.splitlines()])
-        
-        return template_source_indented
+        return Template.indent(template_source)
     
     def get_content(self):
         if not self.page:
@@ -105,52 +129,41 @@ class PageRender:
         with open(content_path, "r") as f:
             rendered_content = f.read()
         
-        # Iterate over each line in the source, and indent it
-        rendered_content_indented = "".join(["    " + line + "\n" for line in rendered_content.splitlines()])
-        
-        return rendered_content_indented
+        return Template.indent(rendered_content)
     
-    def render(self, args: Args):
-        if not os.path.exists(Utils.get_template_dir()) or not os.path.isdir(Utils.get_template_dir()) or not os.path.exists(os.path.join(Utils.get_template_dir(), self.configmap_template)):
+    def render(self, args: PageOptions):
+        if not TemplateCache.exists(os.path.join(Utils.get_template_dir(), self.configmap_template)):
             print("Configmap template source file does not exist. Critical error.")
             sys.exit(1)
 
         # Increment version
-        version = self.page.get_version()
-        print(f"Current version: {version}")
+        print(f"Current version: {self.page.get_version()}")
         print("Incrementing version...")
-        version += 1
-        self.page.save_version(version)
+        version = self.page.version_file().increment()
         print(f"New version: {version}")
         
         # Get template content
-        template = os.path.join(Utils.get_template_dir(), self.configmap_template)
-        template_content = ""
-        with open(template, "r") as f:
-            template_content = f.read()
-
-        # Insert template content
-        template_json = self.get_template_content()
-        output_content_initial = template_content.replace("    %%PAGE%%", template_json)
-        
-        content = self.get_content()
-        output_content = output_content_initial.replace("    %%CONTENT%%", content)
-    
-        # Template values in configmap
-        output_content = self.replace_templated("PAGE_SLUG", self.page.slug, output_content)
-        output_content = self.replace_templated("PAGE_NAME", self.page.slug, output_content)
-        output_content = self.replace_templated("PAGE_PATH", Utils.get_page_dir_str(self.page.slug), output_content)
-        output_content = self.replace_templated("PAGE_REPO", args.repo, output_content)
-        output_content = self.replace_templated("PAGE_VERSION", str(args.page.get_version()), output_content)
-        output_content = self.replace_templated("PAGE_ENABLED", str(args.page.enabled).lower(), output_content)
-        
+        template = TemplateCache.get(os.path.join(Utils.get_template_dir(), self.configmap_template))
+
         # Insert the current date, for knowing when the challenge was last updated
         now = datetime.now()
         current_date = now.strftime("%Y-%m-%d %H:%M:%S")
-        output_content = self.replace_templated("CURRENT_DATE", current_date, output_content)
+        
+        output_content = template.render({
+            "PAGE_SLUG": self.page.slug,
+            "PAGE_NAME": self.page.slug,
+            "PAGE_PATH": Utils.get_page_dir_str(self.page.slug),
+            "PAGE_REPO": args.repo,
+            "PAGE_VERSION": str(self.page.get_version()),
+            "PAGE_ENABLED": str(self.page.enabled).lower(),
+            "CURRENT_DATE": current_date,
+        }, {
+            "PAGE": self.get_template_content(),
+            "CONTENT": self.get_content(),
+        })
         
         # Write the output to a file
-        output_file = os.path.join(Utils.get_k8s_page_dir(args.page.slug), f"page.yml")
+        output_file = os.path.join(Utils.get_k8s_page_dir(self.page.slug), f"page.yml")
         if not os.path.exists(os.path.dirname(output_file)):
             os.makedirs(os.path.dirname(output_file)) 
     
@@ -159,6 +172,46 @@ class PageRender:
     
         print(f"Configmap generated at {output_file}")
 
+class PageBatch:
+    '''
+    Render multiple pages in parallel, collecting failures into a summary
+    '''
+    def __init__(self, args: Args):
+        self.args = args
+
+    @staticmethod
+    def render_page(page_name: str, options: PageOptions):
+        print(f"Rendering page {page_name}")
+
+        page_path = Utils.get_page_dir(page_name)
+        if not page_path.exists() or not page_path.is_dir():
+            raise ValueError(f"Page {page_name} does not exist")
+
+        page = ChallengeIndex.shared().page(page_path)
+        if not page:
+            raise ValueError(f"Page {page_name} is not a valid page")
+
+        PageRender(page).render(options)
+        print("")
+
+    def run(self) -> bool:
+        options = self.args.options()
+
+        # Parse changed pages once up front, so the workers only read the index
+        ChallengeIndex.shared().refresh(challenges=[], pages=self.args.pages)
+
+        tasks = [Task(page_name, PageBatch.render_page, (page_name, options)) for page_name in self.args.pages]
+        results = ParallelExecutor(self.args.jobs).run(tasks)
+        failed = [result for result in results if not result.success]
+
+        print("Summary:")
+        print(f"  Pages rendered: {len(results) - len(failed)}")
+        print(f"  Pages failed: {len(failed)}")
+        for result in failed:
+            print(f"  - {result.name}: {result.error}")
+
+        return len(failed) == 0
+
 class PageCommand:
     args = None
     parent_parser = None
@@ -179,11 +232,16 @@ class PageCommand:
         
         args = self.args
         
+        if args and args.batch:
+            if not PageBatch(args).run():
+                sys.exit(1)
+            return
+
         if not args or not args.page:
             print("No page specified")
             return
 
-        PageRender(args.page).render(args)
+        PageRender(args.page).render(args.options())
 
 if __name__ == "__main__":
     PageCommand().run()
\ No newline at end of file
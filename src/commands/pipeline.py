@@ -1,9 +1,27 @@
 import sys
+import json
+import time
 import argparse
 import subprocess
 
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
 from library.utils import Utils
 from library.data import Challenge, DockerfileLocation
+from library.index import ChallengeIndex
+from library.fingerprint import BuildState, FINGERPRINT_LABEL, context_fingerprint
+from library.buildcache import BuildCache, CacheOptions, CACHE_TYPES
+from library.report import RunReport
+
+if TYPE_CHECKING:
+    import asyncio
+    from library.docker import DockerRunner
+    from library.engine import EngineClient
+    from library.buildkit import BuildProgress
+
+BACKENDS = ["cli", "engine"]
 
 class Args:
     args = None
@@ -16,10 +34,29 @@ class Args:
         else:
             self.parser = argparse.ArgumentParser(description="Pipeline for CTF challenges")
         
-        self.parser.add_argument("challenge", help="Challenge to run (directory for challenge - 'web/example')")
+        self.parser.add_argument("challenge", help="Challenge(s) to run (directory for challenge - 'web/example')", nargs="*")
         self.parser.add_argument("registry", help="Registry to push the Docker image to")
         self.parser.add_argument("image_prefix", help="Prefix for the Docker image")
+        self.parser.add_argument("--all", help="Run every challenge in the repository", action="store_true", default=False)
+        self.parser.add_argument("--from-file", help="Run the challenges listed in a file, one per line ('-' for standard input)", metavar="FILE", default=None)
         self.parser.add_argument("--image_suffix", help="Suffix for the Docker image", default="")
+        self.parser.add_argument("--jobs", "-j", help="Number of Docker images to build at the same time, across all challenges", type=int, default=1)
+        self.parser.add_argument("--bake", help="Write a 'docker buildx bake' JSON file for the images, instead of building them one by one", metavar="FILE", default=None)
+        self.parser.add_argument("--bake-run", help="Build and push the images with a single 'docker buildx bake' invocation", action="store_true", default=False)
+        self.parser.add_argument("--force", help="Build and push the images, even if their build contexts are unchanged since the last successful build", action="store_true", default=False)
+        self.parser.add_argument("--docker", help="Docker binary to run", default="docker")
+        self.parser.add_argument("--backend", help="Build and push by running the docker CLI, or through the Docker Engine API over its unix socket", choices=BACKENDS, default="cli")
+        self.parser.add_argument("--docker-host", help="Socket of the Docker Engine, for the engine backend (default: DOCKER_HOST, or /var/run/docker.sock)", default=None)
+        self.parser.add_argument("--log-mode", help="Print the output of docker commands (stream), or write it to a log file per image and only print progress summaries (quiet), and the last lines on failure (tail)", choices=["stream", "quiet", "tail"], default="stream")
+        self.parser.add_argument("--log-tail", help="Number of lines printed when a docker command fails with --log-mode tail", type=int, default=50)
+        self.parser.add_argument("--report", help="Write timings of each phase and image, exit codes and image names to a JSON file", metavar="FILE", default=None)
+        self.parser.add_argument("--metrics", help="Write the timings as an OpenMetrics textfile", metavar="FILE", default=None)
+        self.parser.add_argument("--build-stats", help="Build with '--progress=rawjson', and report the duration and cache status of each build step", action="store_true", default=False)
+        self.parser.add_argument("--timeout", help="Seconds after which a docker command is stopped and fails", type=float, default=None)
+        self.parser.add_argument("--cache-type", help="BuildKit cache to import from and export to: a local directory, the registry, or inline in the pushed image", choices=CACHE_TYPES, default="none")
+        self.parser.add_argument("--cache-dir", help="Directory of the local BuildKit cache (default: .ctf-cache/buildkit)", default=None)
+        self.parser.add_argument("--cache-max-age", help="Remove local caches of images not built for this many days (0 to keep them)", type=float, default=14)
+        self.parser.add_argument("--cache-max-size", help="Remove the least recently built local caches while the local cache is larger than this many MB (0 for no limit)", type=float, default=0)
     
     def parse(self):
         if self.subcommand:
@@ -30,14 +67,72 @@ class Args:
     def __getattr__(self, name):
         return getattr(self.args, name)
     
+@dataclass
+class BuildResult:
+    identifier: str
+    image: str
+    success: bool
+    duration: float = 0.0
+    error: Optional[str] = None
+    skipped: bool = False
+    build_duration: Optional[float] = None
+    push_duration: Optional[float] = None
+    exit_code: Optional[int] = None
+    challenge: Optional[str] = None
+    image_id: Optional[str] = None
+    digest: Optional[str] = None
+    build_stats: Optional[dict] = None
+    
+    def status(self) -> str:
+        return "done" if self.success else "skipped" if self.skipped else "failed"
+    
+    def to_dict(self) -> dict:
+        return {**asdict(self), "status": self.status()}
+
+@dataclass
+class BuildJob:
+    '''
+    Image to build and push, and the duration of its last successful build, if known
+    '''
+    challenge: Challenge
+    dockerfile_location: DockerfileLocation
+    version: Optional[int] = None
+    fingerprint: Optional[str] = None
+    expected_duration: Optional[float] = None
+
 class Docker:
-    def __init__(self, registry: str, image_prefix: str, image_suffix: str):
+    def __init__(self, registry: str, image_prefix: str, image_suffix: str, cache: Optional[CacheOptions] = None, binary: str = "docker", timeout: Optional[float] = None, log_mode: str = "stream", log_tail: int = 50, backend: str = "cli", docker_host: Optional[str] = None, build_stats: bool = False):
         self.registry = registry
         self.image_prefix = image_prefix
         self.image_suffix = image_suffix
+        self.cache = cache or CacheOptions()
+        self.binary = binary
+        self.timeout = timeout
+        self.log_mode = log_mode
+        self.log_tail = log_tail
+        self.backend = backend
+        self.docker_host = docker_host
+        self.build_stats = build_stats
+    
+    def runner(self) -> "DockerRunner":
+        # Imported on first use, as asyncio is only needed when running docker
+        from library.docker import DockerRunner
+        return DockerRunner(self.binary, self.timeout, log_mode=self.log_mode, tail_lines=self.log_tail)
+    
+    def engine(self) -> "EngineClient":
+        # Imported on first use, as the engine backend is optional
+        from library.engine import EngineClient
+        return EngineClient(self.docker_host)
     
     @staticmethod
-    def build(registry: str, image_prefix: str, image_suffix: str, challenge: Challenge, dockerfile_location: DockerfileLocation):
+    def log_file(name: str) -> Path:
+        '''
+        Log file for the output of docker commands, when the output is not streamed
+        '''
+        return Utils.get_cache_dir().joinpath("logs", f"{Utils.slugify(name) or 'default'}.log")
+    
+    @staticmethod
+    def image_name(registry: str, image_prefix: str, image_suffix: str, challenge: Challenge, dockerfile_location: DockerfileLocation) -> str:
         image_full = f"{registry}/{image_prefix}-{Utils.slugify(challenge.category)}-{challenge.slug}".lower()
         
         if dockerfile_location.identifier and dockerfile_location.identifier.lower() not in ["none", "null", ""]:
@@ -45,39 +140,335 @@ class Docker:
         if image_suffix and image_suffix.lower() not in ["none", "null", ""]:
             image_full += f"-{image_suffix}"
             
-        image_full = image_full.lower()
+        return image_full.lower()
+    
+    @staticmethod
+    def image_tags(image_full: str, challenge: Challenge, version: Optional[int] = None) -> List[str]:
+        version = version if version is not None else challenge.get_version()
+        return [f"{image_full}:latest", f"{image_full}:{version}"]
+    
+    @staticmethod
+    def challenge_key(challenge: Challenge) -> str:
+        return f"{challenge.category}/{challenge.slug}"
+    
+    @staticmethod
+    def dockerfile(challenge: Challenge, dockerfile_location: DockerfileLocation) -> str:
+        return f"{Utils.get_challenge_dir(challenge.category, challenge.slug)}/{dockerfile_location.location}"
+    
+    @staticmethod
+    def context(challenge: Challenge, dockerfile_location: DockerfileLocation) -> str:
+        return f"{Utils.get_challenge_dir(challenge.category, challenge.slug)}/{dockerfile_location.context}"
+    
+    @staticmethod
+    def fingerprint(challenge: Challenge, dockerfile_location: DockerfileLocation) -> str:
+        '''
+        Fingerprint of the build context of an image. The version file is left out, as the pipeline itself changes it
+        '''
+        return context_fingerprint(
+            Path(Docker.dockerfile(challenge, dockerfile_location)),
+            Path(Docker.context(challenge, dockerfile_location)),
+            exclude={challenge.get_path().joinpath("version")},
+        )
+    
+    def fingerprints(self, challenge: Challenge) -> Dict[str, str]:
+        '''
+        Fingerprints of every image of a challenge, by image name.
+        Images which cannot be fingerprinted, for example if the Dockerfile is missing, get an empty fingerprint
+        '''
+        fingerprints = {}
+        for dockerfile_location in challenge.dockerfile_locations:
+            image = Docker.image_name(self.registry, self.image_prefix, self.image_suffix, challenge, dockerfile_location)
+            try:
+                fingerprints[image] = Docker.fingerprint(challenge, dockerfile_location)
+            except OSError as e:
+                print(f"Could not fingerprint build context of {image}: {e}")
+                fingerprints[image] = ""
+        return fingerprints
+    
+    @staticmethod
+    def identifier(dockerfile_location: DockerfileLocation) -> str:
+        return dockerfile_location.identifier or "default"
+    
+    @staticmethod
+    def build_command(image_full: str, challenge: Challenge, dockerfile_location: DockerfileLocation, fingerprint: Optional[str] = None, cache: Optional[CacheOptions] = None, version: Optional[int] = None, progress: bool = False) -> List[str]:
+        '''
+        Arguments to docker building an image. With a BuildKit cache, the image is built with buildx, as the default
+        docker driver cannot export caches, and loaded into the local image store to be pushed as usual.
+        With progress, BuildKit prints its progress as raw JSON, to be parsed
+        '''
+        if cache and cache.enabled():
+            build_command = ["buildx", "build", "--load"] + BuildCache.arguments(cache, image_full)
+        else:
+            build_command = ["build"]
+        if progress:
+            build_command.append("--progress=rawjson")
+        for tag in Docker.image_tags(image_full, challenge, version):
+            build_command += ["-t", tag]
+        if fingerprint:
+            build_command += ["--label", f"{FINGERPRINT_LABEL}={fingerprint}"]
+        build_command += [
+            "-f", Docker.dockerfile(challenge, dockerfile_location),
+            Docker.context(challenge, dockerfile_location)
+        ]
+        return build_command
+    
+    def build_jobs_of(self, challenge: Challenge, fingerprints: Optional[Dict[str, str]] = None, version: Optional[int] = None, state: Optional[BuildState] = None) -> List["BuildJob"]:
+        '''
+        Jobs building every image of a challenge, with the durations of the last successful builds in state
+        '''
+        build_jobs = []
+        for dockerfile_location in challenge.dockerfile_locations:
+            image = Docker.image_name(self.registry, self.image_prefix, self.image_suffix, challenge, dockerfile_location)
+            expected_duration = state.duration(image) if state is not None else None
+            build_jobs.append(BuildJob(challenge, dockerfile_location, version, (fingerprints or {}).get(image), expected_duration))
+        return build_jobs
+    
+    def build_all(self, challenge: Challenge, jobs: int = 1, fingerprints: Optional[Dict[str, str]] = None, version: Optional[int] = None) -> List[BuildResult]:
+        '''
+        Build and push every image of a challenge. Fingerprints, by image name, are added to the images as a label.
+        Images are tagged with version, defaulting to the current version of the challenge.
+        '''
+        return self.build_jobs(self.build_jobs_of(challenge, fingerprints, version), jobs)
+    
+    def build_jobs(self, build_jobs: List["BuildJob"], jobs: int = 1) -> List[BuildResult]:
+        '''
+        Build and push images, of any number of challenges, from a single queue. Up to jobs images are built at the same time,
+        and each image is pushed while the next images are built. When a build fails, builds of the same challenge that have
+        not started yet are skipped, while other challenges carry on. Results are in the order of build_jobs
+        '''
+        import asyncio
+        return asyncio.run(self.run_jobs(build_jobs, jobs))
+    
+    @staticmethod
+    def schedule(build_jobs: List["BuildJob"]) -> List[int]:
+        '''
+        Order to start jobs in: longest job first, by the duration of their previous build, so long builds do not start last
+        and hold up the end of the run. Jobs without a previous duration go first, in their original order, as they may be the longest
+        '''
+        return sorted(range(len(build_jobs)), key=lambda index: (build_jobs[index].expected_duration is not None, -(build_jobs[index].expected_duration or 0)))
+    
+    @staticmethod
+    def prefixes(build_jobs: List["BuildJob"]) -> List[str]:
+        '''
+        Output of builds and pushes of different images overlaps, so lines are prefixed with the image they belong to
+        '''
+        if len(build_jobs) <= 1:
+            return [""] * len(build_jobs)
+        
+        single_challenge = len({Docker.challenge_key(job.challenge) for job in build_jobs}) == 1
+        labels = []
+        for job in build_jobs:
+            if single_challenge:
+                labels.append(Docker.identifier(job.dockerfile_location))
+            elif job.dockerfile_location.identifier and job.dockerfile_location.identifier.lower() not in ["none", "null", ""]:
+                labels.append(f"{Docker.challenge_key(job.challenge)}/{job.dockerfile_location.identifier}")
+            else:
+                labels.append(Docker.challenge_key(job.challenge))
+        width = max(len(label) for label in labels)
+        return [f"[{label:<{width}}] " for label in labels]
+    
+    async def run_jobs(self, build_jobs: List["BuildJob"], jobs: int) -> List[BuildResult]:
+        import asyncio
         
-        print(f"Building Docker image \"{image_full}\"...")
+        runner = self.runner()
+        client = None
+        if self.backend == "engine":
+            from concurrent.futures import ThreadPoolExecutor
+            client = self.engine()
+            # Requests to the engine block a worker thread, there is one for every build and push slot
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=2 * max(jobs, 1)))
+        builds = asyncio.Semaphore(max(jobs, 1))
+        pushes = asyncio.Semaphore(max(jobs, 1))
+        failed = {Docker.challenge_key(job.challenge): asyncio.Event() for job in build_jobs}
+        prefixes = Docker.prefixes(build_jobs)
         
+        tasks: List[Optional["asyncio.Future"]] = [None] * len(build_jobs)
+        for index in Docker.schedule(build_jobs):
+            job = build_jobs[index]
+            # Tasks start in the order they are created, and acquire the build slots in the same order
+            tasks[index] = asyncio.ensure_future(self.build_image(runner, job, prefixes[index], builds, pushes, failed[Docker.challenge_key(job.challenge)], client))
         try:
-            build_command = [
-                "docker", "build",
-                "-t", f"{image_full}:latest",
-                "-t", f"{image_full}:{challenge.get_version()}",
-                "-f", f"{Utils.get_challenge_dir(challenge.category, challenge.slug)}/{dockerfile_location.location}",
-                f"{Utils.get_challenge_dir(challenge.category, challenge.slug)}/{dockerfile_location.context}"
-            ]
-            build_proc = subprocess.Popen(build_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-            if build_proc.stdout is not None:
-                for line in build_proc.stdout:
-                    print(line, end="")
-            build_proc.wait()
-            if build_proc.returncode != 0:
-                raise subprocess.CalledProcessError(build_proc.returncode, build_command)
+            return list(await asyncio.gather(*tasks))
+        finally:
+            if client is not None:
+                client.close()
+    
+    async def run_build(self, runner: "DockerRunner", client: Optional["EngineClient"], image_full: str, job: "BuildJob", prefix: str, log: Optional[Path], progress: Optional["BuildProgress"] = None) -> Optional[str]:
+        '''
+        Build an image with the docker CLI, or through the engine. Returns the ID of the image, if known
+        '''
+        challenge, dockerfile_location = job.challenge, job.dockerfile_location
+        if client is None:
+            await runner.run(Docker.build_command(image_full, challenge, dockerfile_location, job.fingerprint, self.cache, job.version, progress is not None), prefix, log=log, progress=progress)
+            return None
+        
+        from library.engine import EngineOperation
+        operation = EngineOperation()
+        tags = Docker.image_tags(image_full, challenge, job.version)
+        labels = {FINGERPRINT_LABEL: job.fingerprint} if job.fingerprint else None
+        dockerfile, context = Path(Docker.dockerfile(challenge, dockerfile_location)), Path(Docker.context(challenge, dockerfile_location))
+        return await runner.run_thread(lambda write: client.build(context, dockerfile, tags, labels, write, operation), operation.cancel, ["POST", "/build", *tags], prefix, log=log)
+    
+    async def run_push(self, runner: "DockerRunner", client: Optional["EngineClient"], image_full: str, job: "BuildJob", prefix: str, log: Optional[Path]) -> Optional[str]:
+        '''
+        Push every tag of an image with the docker CLI, or through the engine. Returns the digest of the image, if known
+        '''
+        if client is None:
+            await runner.run(["push", image_full, "--all-tags"], prefix, log=log)
+            return None
+        
+        from library.engine import EngineOperation
+        digest = None
+        for tag in Docker.image_tags(image_full, job.challenge, job.version):
+            name, _, tag = tag.rpartition(":")
+            operation = EngineOperation()
+            digest = await runner.run_thread(lambda write: client.push(name, tag, write=write, operation=operation), operation.cancel, ["POST", f"/images/{name}/push", tag], prefix, log=log) or digest
+        return digest
+    
+    async def build_image(self, runner: "DockerRunner", job: "BuildJob", prefix: str, builds: "asyncio.Semaphore", pushes: "asyncio.Semaphore", failed: "asyncio.Event", client: Optional["EngineClient"] = None) -> BuildResult:
+        # Imported on first use, as the engine module is only needed when building images
+        from library.engine import EngineError
+        
+        challenge, dockerfile_location = job.challenge, job.dockerfile_location
+        identifier = Docker.identifier(dockerfile_location)
+        image_full = Docker.image_name(self.registry, self.image_prefix, self.image_suffix, challenge, dockerfile_location)
+        key = Docker.challenge_key(challenge)
+        
+        async with builds:
+            if failed.is_set():
+                return self.skipped(challenge, dockerfile_location)
+            
+            start = time.monotonic()
+            runner.output(f"Building Docker image \"{image_full}\"...", prefix)
+            log = Docker.log_file(image_full) if runner.spools() else None
+            if log is not None:
+                # Each run starts a new log, the push is appended to the log of the build
+                log.unlink(missing_ok=True)
+            progress = None
+            if self.build_stats and client is None:
+                from library.buildkit import BuildProgress
+                progress = BuildProgress()
+            try:
+                image_id = await self.run_build(runner, client, image_full, job, prefix, log, progress)
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError, EngineError) as e:
+                BuildCache.discard(self.cache, image_full)
+                result = Docker.failed(runner, identifier, image_full, start, e, prefix, failed)
+                result.build_duration = result.duration
+                result.challenge = key
+                result.build_stats = Docker.report_progress(runner, progress, prefix)
+                return result
+            build_duration = time.monotonic() - start
+            build_stats = Docker.report_progress(runner, progress, prefix)
+            
+            try:
+                BuildCache.rotate(self.cache, image_full)
+            except OSError as e:
+                print(f"{prefix}Warning: Could not update local build cache of {image_full}: {e}", file=sys.stderr)
+        
+        # The build slot is released, so the next image builds while this one is pushed
+        async with pushes:
+            push_start = time.monotonic()
+            runner.output(f"Pushing Docker image \"{image_full}\"...", prefix)
+            try:
+                digest = await self.run_push(runner, client, image_full, job, prefix, log)
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError, EngineError) as e:
+                result = Docker.failed(runner, identifier, image_full, start, e, prefix, failed)
+                result.build_duration = build_duration
+                result.push_duration = time.monotonic() - push_start
+                result.challenge = key
+                result.image_id = image_id
+                result.build_stats = build_stats
+                return result
+        
+        # Durations include time spent waiting for a push slot, the push duration does not
+        return BuildResult(identifier, image_full, True, time.monotonic() - start, build_duration=build_duration, push_duration=time.monotonic() - push_start, exit_code=0, challenge=key, image_id=image_id, digest=digest, build_stats=build_stats)
+    
+    @staticmethod
+    def report_progress(runner: "DockerRunner", progress: Optional["BuildProgress"], prefix: str) -> Optional[dict]:
+        '''
+        Print the summary of the build steps, returning it for the report
+        '''
+        if progress is None:
+            return None
+        summary = progress.summary()
+        for line in progress.describe(summary):
+            runner.output(line, prefix)
+        return summary
+    
+    @staticmethod
+    def failed(runner: "DockerRunner", identifier: str, image: str, start: float, error: Exception, prefix: str, failed: "asyncio.Event") -> BuildResult:
+        runner.report_error(error, prefix)
+        failed.set()
+        exit_code = error.returncode if isinstance(error, subprocess.CalledProcessError) else None
+        return BuildResult(identifier, image, False, time.monotonic() - start, runner.describe_error(error), exit_code=exit_code)
+    
+    def skipped(self, challenge: Challenge, dockerfile_location: DockerfileLocation) -> BuildResult:
+        image = Docker.image_name(self.registry, self.image_prefix, self.image_suffix, challenge, dockerfile_location)
+        return BuildResult(Docker.identifier(dockerfile_location), image, False, error="Another image of the challenge failed", skipped=True, challenge=Docker.challenge_key(challenge))
 
-            push_command = [
-                "docker", "push", image_full, "--all-tags"
-            ]
-            push_proc = subprocess.Popen(push_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-            if push_proc.stdout is not None:
-                for line in push_proc.stdout:
-                    print(line, end="")
-            push_proc.wait()
-            if push_proc.returncode != 0:
-                raise subprocess.CalledProcessError(push_proc.returncode, push_command)
-        except subprocess.CalledProcessError as e:
-            print(f"Error: Command failed with exit code {e.returncode}: {e.cmd}", file=sys.stderr)
-            raise e
+class Bake:
+    '''
+    Plan for 'docker buildx bake', building every image of the challenges in a single invocation.
+    BuildKit then schedules the builds concurrently, and shares layers between images with the same base images.
+    '''
+    @staticmethod
+    def target_name(challenge: Challenge, dockerfile_location: DockerfileLocation) -> str:
+        name = f"{challenge.category}-{challenge.slug}"
+        if dockerfile_location.identifier and dockerfile_location.identifier.lower() not in ["none", "null", ""]:
+            name += f"-{dockerfile_location.identifier}"
+        # Bake target names may only contain letters, digits, underscores and dashes
+        return Utils.slugify(name) or "default"
+    
+    @staticmethod
+    def plan(docker: Docker, challenges: List[Challenge], fingerprints: Optional[Dict[str, str]] = None, versions: Optional[Dict[str, int]] = None) -> dict:
+        '''
+        Plan building every image of the challenges. Images are tagged with the version in versions, by challenge key,
+        falling back to the current version of the challenge
+        '''
+        targets = {}
+        for challenge in challenges:
+            version = (versions or {}).get(Docker.challenge_key(challenge))
+            for dockerfile_location in challenge.dockerfile_locations:
+                image_full = Docker.image_name(docker.registry, docker.image_prefix, docker.image_suffix, challenge, dockerfile_location)
+                target = {
+                    "context": Docker.context(challenge, dockerfile_location),
+                    "dockerfile": Docker.dockerfile(challenge, dockerfile_location),
+                    "tags": Docker.image_tags(image_full, challenge, version),
+                }
+                if fingerprints and image_full in fingerprints:
+                    target["labels"] = {FINGERPRINT_LABEL: fingerprints[image_full]}
+                cache_from, cache_to = BuildCache.specs(docker.cache, image_full)
+                if cache_from:
+                    target["cache-from"] = cache_from
+                if cache_to:
+                    target["cache-to"] = cache_to
+                targets[Bake.target_name(challenge, dockerfile_location)] = target
+        
+        return {
+            "group": {
+                "default": {
+                    "targets": list(targets),
+                },
+            },
+            "target": targets,
+        }
+    
+    @staticmethod
+    def write(plan: dict, file: Path):
+        file.parent.mkdir(parents=True, exist_ok=True)
+        with open(file, "w") as f:
+            json.dump(plan, f, indent=2)
+            f.write("\n")
+    
+    @staticmethod
+    def run(file: Path, runner: Optional["DockerRunner"] = None):
+        if runner is None:
+            from library.docker import DockerRunner
+            runner = DockerRunner()
+        log = Docker.log_file("bake") if runner.spools() else None
+        if log is not None:
+            log.unlink(missing_ok=True)
+        runner.run_sync(["buildx", "bake", "--file", str(file), "--push"], log=log)
 
 class DockerBuild:
     args = None
@@ -103,52 +494,332 @@ class DockerBuild:
             print("No arguments provided")
             sys.exit(1)
         
-        challenge = args.challenge
+        report = RunReport()
+        try:
+            self.pipeline(report)
+        finally:
+            if report.status == "running":
+                report.status = "failed"
+            self.write_report(report)
     
-        if "/" not in challenge:
-            print(f"Challenge {challenge} must be in the format 'category/name'")
-            exit(1)
+    def challenge_names(self) -> List[str]:
+        '''
+        Challenges to run: the challenges given as arguments, followed by the challenges listed in the --from-file file
+        (one per line, '-' for standard input) and, with --all, every challenge in the repository. Duplicates are removed
+        '''
+        args = self.args.args
+        names = list(args.challenge)
+        
+        if args.from_file:
+            try:
+                if args.from_file == "-":
+                    lines = sys.stdin.read().splitlines()
+                else:
+                    with open(args.from_file, "r") as f:
+                        lines = f.read().splitlines()
+            except OSError as e:
+                print(f"Could not read challenges from {args.from_file}: {e}")
+                sys.exit(1)
+            names += [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
         
-        challenge_path = Utils.get_challenges_dir().joinpath(challenge)
+        if args.all:
+            names += Utils.list_challenges()
+        
+        return list(dict.fromkeys(name.strip("/") for name in names))
+    
+    @staticmethod
+    def validate(name: str) -> Optional[str]:
+        if "/" not in name:
+            return f"Challenge {name} must be in the format 'category/name'"
+        
+        challenge_path = Utils.get_challenges_dir().joinpath(name)
         if not challenge_path.exists():
-            print(f"Challenge {challenge} does not exist")
-            sys.exit(1)
-
+            return f"Challenge {name} does not exist"
         if not challenge_path.is_dir():
-            print(f"Challenge {challenge} is not a directory")
+            return f"Challenge {name} is not a directory"
+        return None
+    
+    def load(self, names: List[str], report: RunReport) -> List[Challenge]:
+        '''
+        Load the challenges, recording challenges that cannot be loaded as failed in the report
+        '''
+        index = ChallengeIndex.shared()
+        index.refresh(challenges=[name for name in names if self.validate(name) is None], pages=[])
+        
+        challenges = []
+        for name in names:
+            error = self.validate(name)
+            if error is None:
+                try:
+                    challenge = index.challenge(Utils.get_challenges_dir().joinpath(name))
+                except Exception as e:
+                    challenge = None
+                    error = f"Failed to load challenge data for {name}: {e}"
+                if challenge is None and error is None:
+                    error = f"Failed to load challenge data for {name}"
+            
+            if error is not None:
+                print(error)
+                report.challenge(name).update(status="failed", error=error)
+                continue
+            challenges.append(challenge)
+        return challenges
+    
+    def pipeline(self, report: RunReport):
+        args = self.args.args
+        
+        names = self.challenge_names()
+        if not names:
+            print("No challenges given. Provide challenges as arguments, or use --all or --from-file")
             sys.exit(1)
-
-        print(f"Running pipeline for challenge \"{challenge}\"")
+        
+        if len(names) == 1:
+            print(f"Running pipeline for challenge \"{names[0]}\"")
+        else:
+            print(f"Running pipeline for {len(names)} challenges")
         
         print("Loading challenge data...")
-        challenge = Challenge.load_dir(challenge_path)
-        if not challenge:
+        with report.phase("load"):
+            challenges = self.load(names, report)
+        if not challenges:
             print("Failed to load challenge data")
             sys.exit(1)
         
         print("Data loaded successfully")
-        print("")
-        print("Data:")
-        print(challenge)
+        if len(challenges) == 1:
+            print("")
+            print("Data:")
+            print(challenges[0])
         print("")
         
-        version = challenge.get_version()
-        print(f"Current version: {version}")
-        print("Incrementing version...")
-        version += 1
-        challenge.save_version(version)
-        print(f"New version: {version}")
-        print("")
-        print("")
-
-        print("Starting docker process...")
-        docker = Docker(args.registry, args.image_prefix, args.image_suffix)
-        for dockerfile_location in challenge.dockerfile_locations:
-            print(f"Building Docker image for {dockerfile_location.identifier or 'default'}...")
-            Docker.build(docker.registry, docker.image_prefix, docker.image_suffix, challenge, dockerfile_location)
-
+        cache = CacheOptions(args.cache_type, Path(args.cache_dir) if args.cache_dir else None, args.cache_max_age, args.cache_max_size)
+        if args.backend == "engine":
+            self.check_engine(cache)
+        if args.build_stats and (args.bake or args.bake_run):
+            print("--build-stats reports the steps of each image, and cannot be used with --bake or --bake-run")
+            sys.exit(1)
+        docker = Docker(args.registry, args.image_prefix, args.image_suffix, cache, args.docker, args.timeout, args.log_mode, args.log_tail, args.backend, args.docker_host, args.build_stats)
+        with report.phase("fingerprint"):
+            state = BuildState()
+            fingerprints = {Docker.challenge_key(challenge): docker.fingerprints(challenge) for challenge in challenges}
+        
+        changed = []
+        for challenge in challenges:
+            key = Docker.challenge_key(challenge)
+            if not args.force and state.unchanged(fingerprints[key]):
+                print(f"Build contexts of {key} are unchanged since the last successful build, skipping build, push and version bump")
+                report.challenge(key).update(status="unchanged", version=challenge.get_version())
+                for dockerfile_location in challenge.dockerfile_locations:
+                    image = Docker.image_name(docker.registry, docker.image_prefix, docker.image_suffix, challenge, dockerfile_location)
+                    report.add_image(key, {"identifier": Docker.identifier(dockerfile_location), "image": image, "success": True, "status": "unchanged"})
+            else:
+                changed.append(challenge)
+        
+        if changed:
+            self.build_changed(docker, changed, state, fingerprints, report)
+        
+        self.summary(docker, challenges, report)
+        
+        failed = [key for key, challenge in report.challenges.items() if challenge["status"] == "failed"]
+        planned = any(challenge["status"] == "planned" for challenge in report.challenges.values())
+        report.status = "failed" if failed else "planned" if planned else "success"
+        if failed:
+            print(f"Docker process failed for {len(failed)} of {len(report.challenges)} {'challenge' if len(report.challenges) == 1 else 'challenges'}: {', '.join(failed)}")
+            sys.exit(1)
+        
+        if planned:
+            print("Bake file written, no images were built. Use --bake-run to build and push them")
+            return
         print("Docker process complete")
     
+    def check_engine(self, cache: CacheOptions):
+        '''
+        Options that need the docker CLI cannot be combined with the engine backend
+        '''
+        args = self.args.args
+        if args.bake or args.bake_run:
+            print("--bake and --bake-run run the docker CLI, and cannot be used with --backend engine")
+            sys.exit(1)
+        if cache.enabled() or args.build_stats:
+            print("The engine backend builds without BuildKit, which is needed for --cache-type and --build-stats")
+            sys.exit(1)
+        
+        from library.engine import EngineClient
+        try:
+            EngineClient.socket_path(args.docker_host)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+    
+    def build_changed(self, docker: Docker, challenges: List[Challenge], state: BuildState, fingerprints: Dict[str, Dict[str, str]], report: RunReport):
+        '''
+        Build and push the images of the challenges, and commit the new version of each challenge whose images all succeeded
+        '''
+        args = self.args.args
+        
+        # Versions are reserved, so concurrent runs get different versions, and only written to the version file
+        # once every image of the challenge is built and pushed. Versions of failed challenges are released, to be used again
+        versions: Dict[str, int] = {}
+        committed = set()
+        try:
+            with report.phase("version"):
+                for challenge in challenges:
+                    key = Docker.challenge_key(challenge)
+                    current = challenge.get_version()
+                    versions[key] = challenge.version_file().reserve()
+                    report.challenge(key)["version"] = versions[key]
+                    print(f"Version of {key}: {current} -> {versions[key]}")
+            print("")
+            
+            with report.phase("build"):
+                if args.bake or args.bake_run:
+                    merged = {image: fingerprint for images in fingerprints.values() for image, fingerprint in images.items()}
+                    file = self.write_bake(docker, challenges, merged, versions)
+                    if not args.bake_run:
+                        # Nothing is built, so the versions in the bake file are released below rather than committed
+                        for challenge in challenges:
+                            report.challenge(Docker.challenge_key(challenge))["status"] = "planned"
+                        return
+                    succeeded = [Docker.challenge_key(challenge) for challenge in challenges] if self.bake(docker, challenges, state, merged, versions, file, report) else []
+                else:
+                    succeeded = self.build(docker, challenges, state, fingerprints, versions, report)
+            
+            with report.phase("commit"):
+                for challenge in challenges:
+                    key = Docker.challenge_key(challenge)
+                    if key in succeeded:
+                        challenge.version_file().commit(versions[key])
+                        committed.add(key)
+                        report.challenge(key)["status"] = "success"
+        finally:
+            for challenge in challenges:
+                key = Docker.challenge_key(challenge)
+                if key in versions and key not in committed:
+                    challenge.version_file().release(versions[key])
+                    if report.challenge(key)["status"] == "planned":
+                        print(f"Version {versions[key]} of {key} is only planned in the bake file and was not committed, the version is still {challenge.get_version()}")
+                        continue
+                    report.challenge(key).update(status="failed", version=None)
+                    print(f"Version {versions[key]} of {key} was not committed, the version is still {challenge.get_version()}")
+    
+    def build(self, docker: Docker, challenges: List[Challenge], state: BuildState, fingerprints: Dict[str, Dict[str, str]], versions: Dict[str, int], report: RunReport) -> List[str]:
+        '''
+        Build and push the images of every challenge from a single queue. Returns the challenges whose images all succeeded
+        '''
+        args = self.args.args
+        
+        build_jobs = []
+        for challenge in challenges:
+            key = Docker.challenge_key(challenge)
+            build_jobs += docker.build_jobs_of(challenge, fingerprints[key], versions[key], state)
+        
+        print(f"Starting docker process for {len(build_jobs)} images...")
+        results = docker.build_jobs(build_jobs, args.jobs)
+        
+        failed = set()
+        for job, result in zip(build_jobs, results):
+            key = Docker.challenge_key(job.challenge)
+            report.add_image(key, result.to_dict())
+            if not result.success:
+                failed.add(key)
+            elif fingerprints[key].get(result.image):
+                state.record(result.image, fingerprints[key][result.image], versions[key], result.duration)
+        self.save_state(state)
+        self.prune_cache(docker.cache)
+        
+        return [Docker.challenge_key(challenge) for challenge in challenges if Docker.challenge_key(challenge) not in failed]
+    
+    def summary(self, docker: Docker, challenges: List[Challenge], report: RunReport):
+        print("")
+        print("Summary:")
+        for key, challenge in report.challenges.items():
+            status = {"success": "done", "unchanged": "unchanged", "failed": "failed", "planned": "planned"}.get(challenge["status"], challenge["status"])
+            details = f", version {challenge['version']}" if status in ["done", "planned"] else ""
+            print(f"  {key}: {status}{details}" + (f" - {challenge['error']}" if challenge.get("error") else ""))
+            for image in challenge["images"]:
+                if image["status"] == "unchanged":
+                    print(f"    {image['identifier']}: unchanged ({image['image']})")
+                else:
+                    stats = image.get("build_stats") or {}
+                    cached = f", {stats['cache_hit_ratio']:.0%} of steps cached" if stats.get("cache_hit_ratio") is not None else ""
+                    print(f"    {image['identifier']}: {image['status']} in {image['duration']:.1f}s{cached} ({image['image']})" + (f" - {image['error']}" if image.get("error") else ""))
+        
+        statuses = [challenge["status"] for challenge in report.challenges.values()]
+        planned = f", {statuses.count('planned')} planned" if "planned" in statuses else ""
+        print(f"{len(statuses)} {'challenge' if len(statuses) == 1 else 'challenges'}: {statuses.count('success')} done, {statuses.count('unchanged')} unchanged{planned}, {statuses.count('failed')} failed")
+    
+    def write_report(self, report: RunReport):
+        args = self.args.args
+        try:
+            if args.report:
+                report.write_json(Path(args.report))
+            if args.metrics:
+                report.write_openmetrics(Path(args.metrics))
+        except OSError as e:
+            print(f"Warning: Could not write the run report: {e}", file=sys.stderr)
+    
+    @staticmethod
+    def save_state(state: BuildState):
+        try:
+            state.save()
+        except OSError as e:
+            # The images are already pushed, so only the next run is affected
+            print(f"Warning: Could not save build state to {state.path}: {e}", file=sys.stderr)
+    
+    @staticmethod
+    def prune_cache(cache: CacheOptions):
+        try:
+            removed = BuildCache.prune(cache)
+        except OSError as e:
+            print(f"Warning: Could not prune local build cache in {cache.root()}: {e}", file=sys.stderr)
+            return
+        if removed:
+            print(f"Pruned {len(removed)} local build caches from {cache.root()}")
+    
+    def write_bake(self, docker: Docker, challenges: List[Challenge], fingerprints: Dict[str, str], versions: Dict[str, int]) -> Path:
+        '''
+        Write the bake file of the images, tagged with the reserved versions
+        '''
+        args = self.args.args
+        
+        file = Path(args.bake) if args.bake else Utils.get_cache_dir().joinpath("docker-bake.json")
+        plan = Bake.plan(docker, challenges, fingerprints, versions)
+        Bake.write(plan, file)
+        print(f"Bake file with {len(plan['target'])} images written to {file}")
+        return file
+    
+    def bake(self, docker: Docker, challenges: List[Challenge], state: BuildState, fingerprints: Dict[str, str], versions: Dict[str, int], file: Path, report: RunReport) -> bool:
+        '''
+        Build and push the images of the bake file with a single invocation. Returns whether the images were built
+        '''
+        print("Starting docker buildx bake...")
+        start = time.monotonic()
+        try:
+            Bake.run(file, docker.runner())
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+            print(f"Error: docker buildx bake failed: {e}", file=sys.stderr)
+            exit_code = e.returncode if isinstance(e, subprocess.CalledProcessError) else None
+            for challenge in challenges:
+                for dockerfile_location in challenge.dockerfile_locations:
+                    image = Docker.image_name(docker.registry, docker.image_prefix, docker.image_suffix, challenge, dockerfile_location)
+                    BuildCache.discard(docker.cache, image)
+                    # Bake builds every image in one invocation, so images share its duration and outcome
+                    result = BuildResult(Docker.identifier(dockerfile_location), image, False, time.monotonic() - start, str(e), exit_code=exit_code)
+                    report.add_image(Docker.challenge_key(challenge), result.to_dict())
+            return False
+        
+        for challenge in challenges:
+            for dockerfile_location in challenge.dockerfile_locations:
+                image = Docker.image_name(docker.registry, docker.image_prefix, docker.image_suffix, challenge, dockerfile_location)
+                BuildCache.rotate(docker.cache, image)
+                report.add_image(Docker.challenge_key(challenge), BuildResult(Docker.identifier(dockerfile_location), image, True, time.monotonic() - start, exit_code=0).to_dict())
+                if fingerprints.get(image):
+                    state.record(image, fingerprints[image], versions[Docker.challenge_key(challenge)])
+        self.save_state(state)
+        self.prune_cache(docker.cache)
+        print(f"docker buildx bake complete in {time.monotonic() - start:.1f}s")
+        return True
+    
 if __name__ == "__main__":
     DockerBuild().run()
 
@@ -1,9 +1,9 @@
 import os
 import sys
 import argparse
-import tempfile
-import shutil
 from pathlib import Path
+from typing import List, Optional
+from dataclasses import dataclass
 
 from datetime import datetime
 
@@ -11,14 +11,50 @@ from library.utils import Utils
 from library.data import Challenge
 from library.generator import Generator
 from library.config import CHALLENGE_SCHEMA
+from library.parallel import ParallelExecutor, Task, default_jobs
+from library.cache import RenderCache
+from library.template import Template, TemplateCache
+from library.index import ChallengeIndex
+
+RENDERERS = ["k8s", "configmap", "clean", "handout"]
+BATCH_RENDERERS = ["k8s", "configmap", "handout"]
+
+# Kept in sync with library.archive, which is only imported when rendering handouts
+HANDOUT_FORMATS = ["zip", "tar.gz", "tar.zst"]
+COMPRESS_LEVEL_RANGES = {"zip": (0, 9), "tar.gz": (0, 9), "tar.zst": (1, 22)}
+
+@dataclass
+class RenderOptions:
+    expires: int = 3600
+    available: int = 0
+    repo: str = ""
+    incremental: bool = False
+    reproducible: bool = False
+    source_date_epoch: Optional[str] = None
+    handout_format: str = "zip"
+    compress_level: Optional[int] = None
+    compress_jobs: int = 1
+    
+    def cache_key(self):
+        return {"expires": self.expires, "available": self.available, "repo": self.repo}
 
 class Args:
     args = None
     challenge: Challenge
+    challenges: List[str] = []
+    renderers: List[str] = []
+    batch = False
     subcommand = False
     expires: int = 3600
     available: int = 0
     repo: str
+    jobs: int = 1
+    incremental: bool = False
+    reproducible: bool = False
+    source_date_epoch: Optional[str] = None
+    handout_format: str = "zip"
+    compress_level: Optional[int] = None
+    compress_jobs: int = 1
     
     def __init__(self, parent_parser = None):
         if parent_parser:
@@ -27,11 +63,18 @@ class Args:
         else:
             self.parser = argparse.ArgumentParser(description="Render template for K8s challenge")
             
-        self.parser.add_argument("renderer", help="Renderer to use for the challenge", choices=["k8s", "configmap", "clean", "handout"])
-        self.parser.add_argument("challenge", help="Challenge to run (directory for challenge - 'web/example')")
+        self.parser.add_argument("renderer", help="Renderer to use for the challenge. 'all' runs the renderers given by --renderers", choices=RENDERERS + ["all"])
+        self.parser.add_argument("challenge", help="Challenge(s) to run (directory for challenge - 'web/example'). When using the 'all' renderer, every challenge is rendered if none are provided", nargs="*")
+        self.parser.add_argument("--renderers", help="Comma separated list of renderers to run when using the 'all' renderer", default=",".join(BATCH_RENDERERS))
         self.parser.add_argument("--expires", help="Time until challenge expires", type=int, default=3600)
         self.parser.add_argument("--available", help="Time until challenge is available", type=int, default=0)
         self.parser.add_argument("--repo", help="GitHub repository for CTFd pages in the format 'owner/repo'", default=os.getenv("GITHUB_REPOSITORY", ""))
+        self.parser.add_argument("--jobs", help="Number of challenges to render in parallel in batch mode (defaults to the number of CPUs)", type=int, default=default_jobs())
+        self.parser.add_argument("--incremental", help="Skip k8s and configmap renders when none of their inputs changed since the last render, and only compress changed handout files", action="store_true")
+        self.parser.add_argument("--reproducible", help="Create handout archives with fixed timestamps and permissions, so the same files always give the same archive. Enabled when SOURCE_DATE_EPOCH is set", action="store_true")
+        self.parser.add_argument("--handout-format", help="Archive format of handouts. tar.zst needs Python 3.14 or the zstandard package", choices=HANDOUT_FORMATS, default="zip")
+        self.parser.add_argument("--compress-level", help="Compression level of handout archives, 0-9 for zip and tar.gz (0 stores files uncompressed), 1-22 for tar.zst. Defaults to 6 for zip and tar.gz, and 3 for tar.zst", type=int, default=None)
+        self.parser.add_argument("--compress-jobs", help="Number of threads compressing each handout (defaults to the number of CPUs, divided by --jobs in batch mode)", type=int, default=None)
     
     def parse(self):
         if self.subcommand:
@@ -39,28 +82,99 @@ class Args:
         else:
             self.args = self.parser.parse_args()
         
+        self.expires = self.args.expires
+        self.available = self.args.available
+        self.repo = self.args.repo or os.getenv("GITHUB_REPOSITORY", "")
+        self.jobs = self.args.jobs
+        self.incremental = self.args.incremental
+        self.source_date_epoch = os.getenv("SOURCE_DATE_EPOCH") or None
+        self.reproducible = self.args.reproducible or self.source_date_epoch is not None
+        if self.source_date_epoch is not None and not self.source_date_epoch.isdigit():
+            print(f"SOURCE_DATE_EPOCH must be a number of seconds since 1970, got '{self.source_date_epoch}'")
+            sys.exit(1)
+        
+        if self.args.renderer == "all" or len(self.args.challenge) > 1:
+            self.parse_batch()
+        else:
+            self.parse_single()
+        
+        self.parse_compression()
+        
+        if not self.repo or self.repo.strip() == "":
+            print("GitHub repository is required. Please provide it via the --repo argument or the GITHUB_REPOSITORY environment variable.")
+            sys.exit(1)
+    
+    def parse_compression(self):
+        self.handout_format = self.args.handout_format
+        self.compress_level = self.args.compress_level
+        low, high = COMPRESS_LEVEL_RANGES[self.handout_format]
+        if self.compress_level is not None and not low <= self.compress_level <= high:
+            print(f"Compression level of {self.handout_format} handouts must be between {low} and {high}")
+            sys.exit(1)
+        
+        # Challenges are already rendered in parallel in batch mode, so the threads are shared between them
+        self.compress_jobs = self.args.compress_jobs or (max(1, default_jobs() // max(1, self.jobs)) if self.batch else default_jobs())
+        
+        if self.handout_format == "tar.zst" and "handout" in self.renderers:
+            # Imported on first use, as it is only needed for handouts
+            from library.archive import zstd_module
+            if zstd_module() is None:
+                print("tar.zst handouts need Python 3.14 or later, or the zstandard package (pip install zstandard)")
+                sys.exit(1)
+    
+    def parse_single(self):
+        if not self.args.challenge:
+            print("A challenge must be provided. Use the 'all' renderer to render every challenge.")
+            sys.exit(1)
+        
+        challenge_name = self.args.challenge[0]
+        self.renderers = [self.args.renderer]
+        
         # Parse challenge from challenge argument
-        challenge_path = Utils.get_challenges_dir().joinpath(self.args.challenge)
+        challenge_path = Utils.get_challenges_dir().joinpath(challenge_name)
         if not challenge_path.exists() or not challenge_path.is_dir():
-            print(f"Challenge {self.args.challenge} does not exist")
+            print(f"Challenge {challenge_name} does not exist")
             sys.exit(1)
             
-        challenge = Challenge.load_dir(challenge_path)
+        challenge = ChallengeIndex.shared().challenge(challenge_path)
         
         if not challenge:
-            print(f"Challenge {self.args.challenge} is not a valid challenge")
+            print(f"Challenge {challenge_name} is not a valid challenge")
             sys.exit(1)
             
         self.challenge = challenge
+    
+    def parse_batch(self):
+        self.batch = True
         
-        self.expires = self.args.expires
-        self.available = self.args.available
-        self.repo = self.args.repo or os.getenv("GITHUB_REPOSITORY", "")
+        if self.args.renderer == "all":
+            self.renderers = [renderer.strip() for renderer in self.args.renderers.split(",") if renderer.strip()]
+        else:
+            self.renderers = [self.args.renderer]
         
-        if not self.repo or self.repo.strip() == "":
-            print("GitHub repository is required. Please provide it via the --repo argument or the GITHUB_REPOSITORY environment variable.")
+        for renderer in self.renderers:
+            if renderer not in RENDERERS:
+                print(f"Renderer {renderer} not supported. Must be one of: {', '.join(RENDERERS)}")
+                sys.exit(1)
+        
+        self.challenges = self.args.challenge or Utils.list_challenges()
+        if not self.challenges:
+            print("No challenges found to render")
             sys.exit(1)
         
+    def options(self) -> RenderOptions:
+        return RenderOptions(
+            self.expires,
+            self.available,
+            self.repo,
+            self.incremental,
+            self.reproducible,
+            self.source_date_epoch,
+            self.handout_format,
+            self.compress_level,
+            self.compress_jobs,
+        )
+        
     def __getattr__(self, name):
         return getattr(self.args, name)
 
@@ -93,36 +207,19 @@ class Clean:
         
         print(f"Cleaned instanced template for {self.challenge.slug}")
 
-class Renderer:
-    @staticmethod
-    def replace_templated(key: str, value: str, content: str):
-        content = content.replace("{{ " + key + " }}", value)
-        content = content.replace("{{" + key + "}}", value)
-        content = content.replace("{ { " + key + " } }", value)
-        content = content.replace("{ {" + key + "} }", value)
-        return content
-    
-
 class K8s:
     def __init__(self, challenge: Challenge):
         self.challenge = challenge
         self.generator = Generator(challenge)
 
     def get_template_content(self):
-        template_source_path = os.path.join(Utils.get_template_dir(), "instanced-k8s-challenge.yml")
-        with open(template_source_path, "r") as f:
-            base_template_content = f.read()
-        
-        challenge_template = os.path.join(self.generator.dir_template, "k8s.yml")
-        challenge_template_content = ""
-        challenge_template_indented = ""
-        with open(challenge_template, "r") as f:
-            challenge_template_content = f.read()
-            challenge_template_indented = "\n".join(["    " + line for line in challenge_template_content.splitlines()])
-        
-        return base_template_content, challenge_template_content, challenge_template_indented
+        base_template = TemplateCache.get(os.path.join(Utils.get_template_dir(), "instanced-k8s-challenge.yml"))
+        challenge_template = TemplateCache.get(os.path.join(self.generator.dir_template, "k8s.yml"))
+        challenge_template_indented = "\n".join(["    " + line for line in challenge_template.source.splitlines()])
 
-    def render(self, args: Args):
+        return base_template, challenge_template, challenge_template_indented
+
+    def render(self, args: RenderOptions):
         if not self.generator.instanced_template_source_file_exists():
             print("Instanced template source file does not exist. Critical error.")
             sys.exit(1)
@@ -131,30 +228,40 @@ class K8s:
             print("Challenge does not have a k8s template.")
             sys.exit(0)
         
-        base_template_content, challenge_template, challenge_template_indented = self.get_template_content()
+        cache = RenderCache(self.challenge)
+        # The digest is stored after every render, so a later incremental render never compares against outdated outputs
+        digest = cache.digest("k8s", args.cache_key())
+        if args.incremental and cache.is_fresh("k8s", digest):
+            print(f"K8s template for challenge {self.challenge.slug} is up to date, skipping render.")
+            return
+        
+        outputs = []
+        base_template, challenge_template, challenge_template_indented = self.get_template_content()
 
         # If instanced, it needs to utilize the base template for instanced challenges
         templateing_base_template = challenge_template
         if self.challenge.type == "instanced":
-            templateing_base_template = base_template_content
+            templateing_base_template = base_template
             
-        print(f"Rendering k8s template for challenge {args.challenge.slug}...")
+        print(f"Rendering k8s template for challenge {self.challenge.slug}...")
 
-        output_content = templateing_base_template.replace("    %%TEMPLATE%%", challenge_template_indented)
-
-        output_content = Renderer.replace_templated("CHALLENGE_NAME", args.challenge.slug, output_content)
-        output_content = Renderer.replace_templated("CHALLENGE_CATEGORY", args.challenge.category, output_content)
-        output_content = Renderer.replace_templated("CHALLENGE_TYPE", args.challenge.instanced_type, output_content)
-        output_content = Renderer.replace_templated("CHALLENGE_VERSION", str(args.challenge.get_version()), output_content)
-        output_content = Renderer.replace_templated("CHALLENGE_EXPIRES", str(args.expires), output_content)
-        output_content = Renderer.replace_templated("CHALLENGE_AVAILABLE_AT", str(args.available), output_content)
-        output_content = Renderer.replace_templated("CHALLENGE_REPO", args.repo, output_content)
-        
         # Create docker image name
-        docker_image = f"{args.challenge.category}-{args.challenge.slug}".lower().replace(" ", "")
-        output_content = Renderer.replace_templated("DOCKER_IMAGE", docker_image, output_content)
+        docker_image = f"{self.challenge.category}-{self.challenge.slug}".lower().replace(" ", "")
+
+        output_content = templateing_base_template.render({
+            "CHALLENGE_NAME": self.challenge.slug,
+            "CHALLENGE_CATEGORY": self.challenge.category,
+            "CHALLENGE_TYPE": self.challenge.instanced_type,
+            "CHALLENGE_VERSION": str(self.challenge.get_version()),
+            "CHALLENGE_EXPIRES": str(args.expires),
+            "CHALLENGE_AVAILABLE_AT": str(args.available),
+            "CHALLENGE_REPO": args.repo,
+            "DOCKER_IMAGE": docker_image,
+        }, {
+            "TEMPLATE": challenge_template_indented,
+        })
 
-        deployment_dir = Utils.get_challenge_render_dir(args.challenge.category, args.challenge.slug)
+        deployment_dir = Utils.get_challenge_render_dir(self.challenge.category, self.challenge.slug)
         if not os.path.exists(deployment_dir):
             os.makedirs(deployment_dir)
 
@@ -163,27 +270,29 @@ class K8s:
             helm_template = os.path.join(deployment_dir, "Chart.yaml")
             with open(helm_template, "w") as f:
                 f.write("apiVersion: v2\n")
-                f.write(f"name: {args.challenge.slug}\n")
-                semver_version = f"1.{args.challenge.get_version()}.0"
+                f.write(f"name: {self.challenge.slug}\n")
+                semver_version = f"1.{self.challenge.get_version()}.0"
                 f.write(f"version: {semver_version}\n")
-                f.write(f"description: Challenge {args.challenge.slug} in category {args.challenge.category}\n")
+                f.write(f"description: Challenge {self.challenge.slug} in category {self.challenge.category}\n")
                 f.write(f"appVersion: \"{semver_version}\"\n")
                 f.write(f"type: application\n")
+            outputs.append(helm_template)
             
             helm_values_file = os.path.join(deployment_dir, "values.yaml")
             with open(helm_values_file, "w") as f:
                 f.write(f"challenge:\n")
-                f.write(f"  enabled: {str(args.challenge.enabled).lower()}\n")
-                f.write(f"  name: {args.challenge.slug}\n")
-                f.write(f"  category: {args.challenge.category}\n")
-                f.write(f"  type: {args.challenge.instanced_type}\n")
-                f.write(f"  version: {args.challenge.get_version()}\n")
-                f.write(f"  path: {Utils.get_challenge_dir_str(args.challenge.category, args.challenge.slug)}\n")
+                f.write(f"  enabled: {str(self.challenge.enabled).lower()}\n")
+                f.write(f"  name: {self.challenge.slug}\n")
+                f.write(f"  category: {self.challenge.category}\n")
+                f.write(f"  type: {self.challenge.instanced_type}\n")
+                f.write(f"  version: {self.challenge.get_version()}\n")
+                f.write(f"  path: {Utils.get_challenge_dir_str(self.challenge.category, self.challenge.slug)}\n")
                 f.write(f"  dockerImage: {docker_image}\n")
                 f.write(f"kubectf:\n")
                 f.write(f"  expires: {args.expires}\n")
                 f.write(f"  availableAt: {args.available}\n")
                 f.write(f"  host: example.com\n")
+            outputs.append(helm_values_file)
 
             deployment_dir = os.path.join(deployment_dir, "templates")
 
@@ -193,6 +302,9 @@ class K8s:
 
         with open(output_file, "w") as f:
             f.write(output_content)
+        outputs.append(output_file)
+        
+        cache.store("k8s", digest, outputs)
         
         print(f"K8s template generated at {output_file}")
 
@@ -208,67 +320,67 @@ class ConfigMap:
     def get_template_content(self):
         template_source = self.challenge.str_json(CHALLENGE_SCHEMA)
         
-        # Iterate over each line in the source, and indent it
-        template_source_indented = "".join(["    " + line + "\n" for line in template_source.splitlines()])
-        
-        return template_source_indented
+        return Template.indent(template_source)
     
     def get_description(self):
-        return "".join(["    " + line + "\n" for line in self.challenge.get_description().splitlines()])
+        return Template.indent(self.challenge.get_description())
     
-    def render(self, args: Args):
-        if not os.path.exists(Utils.get_template_dir()) or not os.path.isdir(Utils.get_template_dir()) or not os.path.exists(os.path.join(Utils.get_template_dir(), self.configmap_template)):
+    def render(self, args: RenderOptions):
+        if not TemplateCache.exists(os.path.join(Utils.get_template_dir(), self.configmap_template)):
             print("Configmap template source file does not exist. Critical error.")
             sys.exit(1)
         
-        template = os.path.join(Utils.get_template_dir(), self.configmap_template)
-        template_content = ""
-        with open(template, "r") as f:
-            template_content = f.read()
-
-        # Insert template content
-        template_json = self.get_template_content()
-        output_content = template_content.replace("    %%CONFIG%%", template_json)
-        output_content = output_content.replace("    %%DESCRIPTION%%", self.get_description())
-    
-        # Template values in configmap
-        output_content = Renderer.replace_templated("CHALLENGE_NAME", args.challenge.slug, output_content)
-        output_content = Renderer.replace_templated("CHALLENGE_PATH", Utils.get_challenge_dir_str(self.challenge.category, self.challenge.slug), output_content)
-        output_content = Renderer.replace_templated("CHALLENGE_REPO", args.repo, output_content)
-        output_content = Renderer.replace_templated("CHALLENGE_CATEGORY", args.challenge.category, output_content)
-        output_content = Renderer.replace_templated("CHALLENGE_TYPE", args.challenge.instanced_type, output_content)
-        output_content = Renderer.replace_templated("CHALLENGE_VERSION", str(args.challenge.get_version()), output_content)
-        output_content = Renderer.replace_templated("CHALLENGE_ENABLED", str(args.challenge.enabled).lower(), output_content)
-        output_content = Renderer.replace_templated("HOST", "{{ .Values.kubectf.host }}", output_content)
+        cache = RenderCache(self.challenge)
+        # The digest is stored after every render, so a later incremental render never compares against outdated outputs
+        digest = cache.digest("configmap", args.cache_key())
+        if args.incremental and cache.is_fresh("configmap", digest):
+            print(f"Configmap for challenge {self.challenge.slug} is up to date, skipping render.")
+            return
         
+        template = TemplateCache.get(os.path.join(Utils.get_template_dir(), self.configmap_template))
+
         # Insert the current date, for knowing when the challenge was last updated
         now = datetime.now()
         current_date = now.strftime("%Y-%m-%d %H:%M:%S")
-        output_content = Renderer.replace_templated("CURRENT_DATE", current_date, output_content)
+        
+        output_content = template.render({
+            "CHALLENGE_NAME": self.challenge.slug,
+            "CHALLENGE_PATH": Utils.get_challenge_dir_str(self.challenge.category, self.challenge.slug),
+            "CHALLENGE_REPO": args.repo,
+            "CHALLENGE_CATEGORY": self.challenge.category,
+            "CHALLENGE_TYPE": self.challenge.instanced_type,
+            "CHALLENGE_VERSION": str(self.challenge.get_version()),
+            "CHALLENGE_ENABLED": str(self.challenge.enabled).lower(),
+            "HOST": "{{ .Values.kubectf.host }}",
+            "CURRENT_DATE": current_date,
+        }, {
+            "CONFIG": self.get_template_content(),
+            "DESCRIPTION": self.get_description(),
+        })
 
-        configmap_dir =Utils.get_configmap_dir(args.challenge.category, args.challenge.slug)
+        configmap_dir =Utils.get_configmap_dir(self.challenge.category, self.challenge.slug)
         if not os.path.exists(configmap_dir):
             os.makedirs(configmap_dir)
         
         helm_template = os.path.join(configmap_dir, "Chart.yaml")
         with open(helm_template, "w") as f:
             f.write("apiVersion: v2\n")
-            f.write(f"name: configmap-{args.challenge.slug}\n")
-            semver_version = f"1.{args.challenge.get_version()}.0"
+            f.write(f"name: configmap-{self.challenge.slug}\n")
+            semver_version = f"1.{self.challenge.get_version()}.0"
             f.write(f"version: {semver_version}\n")
-            f.write(f"description: Challenge configmap for {args.challenge.slug} in category {args.challenge.category}\n")
+            f.write(f"description: Challenge configmap for {self.challenge.slug} in category {self.challenge.category}\n")
             f.write(f"appVersion: \"{semver_version}\"\n")
             f.write(f"type: application\n")
         
         helm_values_file = os.path.join(configmap_dir, "values.yaml")
         with open(helm_values_file, "w") as f:
             f.write(f"challenge:\n")
-            f.write(f"  enabled: {str(args.challenge.enabled).lower()}\n")
-            f.write(f"  name: {args.challenge.slug}\n")
-            f.write(f"  category: {args.challenge.category}\n")
-            f.write(f"  type: {args.challenge.instanced_type}\n")
-            f.write(f"  version: {args.challenge.get_version()}\n")
-            f.write(f"  path: {Utils.get_challenge_dir_str(args.challenge.category, args.challenge.slug)}\n")
+            f.write(f"  enabled: {str(self.challenge.enabled).lower()}\n")
+            f.write(f"  name: {self.challenge.slug}\n")
+            f.write(f"  category: {self.challenge.category}\n")
+            f.write(f"  type: {self.challenge.instanced_type}\n")
+            f.write(f"  version: {self.challenge.get_version()}\n")
+            f.write(f"  path: {Utils.get_challenge_dir_str(self.challenge.category, self.challenge.slug)}\n")
             f.write(f"kubectf:\n")
             f.write(f"  expires: {args.expires}\n")
             f.write(f"  availableAt: {args.available}\n")
@@ -281,6 +393,8 @@ class ConfigMap:
     
         with open(output_file, "w") as f:
             f.write(output_content)
+        
+        cache.store("configmap", digest, [helm_template, helm_values_file, output_file])
     
         print(f"Configmap generated at {output_file}")
 
@@ -288,10 +402,12 @@ class HandoutRenderer:
     def __init__(self, challenge: Challenge):
         self.challenge = challenge
     
-    def render(self):
+    def render(self, args: RenderOptions):
+        # Imported on first use, as it is only needed for handouts
+        from library.archive import ArchiveError, HandoutArchive
+        
         print(f"Rendering handout for challenge {self.challenge.slug}...")
         
-        # Copy the handout directory to a temporary location
         challenge_path = Utils.get_challenge_dir(self.challenge.category, self.challenge.slug)
         
         # Check if the file directory exists
@@ -318,53 +434,133 @@ class HandoutRenderer:
             print("Please create the handout directory and add the necessary files, if you want to pack handout files.")
             sys.exit(0)
         
-        # Create temporary directory for handout
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Create structure of <category>/<slug>/handout
-            temp_handout_path = os.path.join(temp_dir, f"{self.challenge.category}_{self.challenge.slug}")
-            os.makedirs(temp_handout_path, exist_ok=True)
-            
-            # Copy files from the handout directory to the temporary directory
-            handout_base = Path(handout_path).resolve()
-            for item in os.listdir(handout_path):
-                # Verify the item is within the handout directory using resolved paths
-                source_item = handout_base / item
-                try:
-                    source_item_resolved = source_item.resolve()
-                    # Ensure the resolved path is within the handout directory
-                    source_item_resolved.relative_to(handout_base)
-                except (ValueError, RuntimeError):
-                    print(f"Skipping item {item} as it is outside the handout directory.")
-                    continue
-                
-                source_item = str(source_item_resolved)
-                dest_item = os.path.join(temp_handout_path, item)
-                
-                # Get filename
-                item_filename = os.path.basename(item)
-                if item_filename in ['.gitkeep', '.gitignore']:
-                    # Skip .gitkeep and .gitignore files
-                    continue
-                
-                if os.path.isdir(source_item):
-                    # Copy directory
-                    shutil.copytree(source_item, dest_item, dirs_exist_ok=True) 
-                else:  
-                    # Copy file  
-                    shutil.copy2(source_item, dest_item) 
-            
-            # If no files are present in the handout directory, do not create a zip file
-            if not os.listdir(temp_handout_path):
-                print("No files found in the handout directory. Skipping zip creation.")
-                return
-            
-            # Create a zip file of the handout directory
-            handout_zip_path = os.path.join(files_path, f"{self.challenge.category}_{self.challenge.slug}")
-            shutil.make_archive(handout_zip_path, 'zip', root_dir=temp_dir, base_dir=f"{self.challenge.category}_{self.challenge.slug}")
-            print(f"Handout files zipped to {handout_zip_path}.zip")
+        # Files are streamed into the archive, under a <category>_<slug> directory
+        archive = HandoutArchive(
+            Path(handout_path),
+            f"{self.challenge.category}_{self.challenge.slug}",
+            reproducible=args.reproducible,
+            date_time=HandoutArchive.source_date(args.source_date_epoch),
+            compress_level=args.compress_level,
+            jobs=args.compress_jobs,
+        )
+        entries = archive.entries()
+        
+        # If no files are present in the handout directory, do not create an archive
+        if not entries:
+            print("No files found in the handout directory. Skipping zip creation.")
+            return
+        
+        handout_archive_path = os.path.join(files_path, f"{self.challenge.category}_{self.challenge.slug}.{args.handout_format}")
+        try:
+            if args.handout_format != "zip":
+                archive.write_tar(Path(handout_archive_path), args.handout_format, entries)
+            else:
+                result = archive.write(Path(handout_archive_path), entries, incremental=args.incremental)
+        except ArchiveError as e:
+            print(f"Failed to archive handout of challenge {self.challenge.slug}: {e}")
+            sys.exit(1)
+        
+        if args.handout_format != "zip":
+            print(f"Handout files archived to {handout_archive_path}")
+            print("Handout rendered successfully for challenge:", self.challenge.slug)
+            return
+        
+        if result.unchanged:
+            print(f"Handout files unchanged since the last render. Skipping zip creation of {handout_archive_path}")
+        else:
+            print(f"Handout files zipped to {handout_archive_path}")
+            if args.incremental:
+                print(f"Compressed {result.compressed} of {result.files} files, reused {result.reused} from the previous archive")
+            if result.stored:
+                print(f"Stored {result.stored} of {result.files} files without compression, as they are already compressed")
 
         print("Handout rendered successfully for challenge:", self.challenge.slug)
 
+@dataclass
+class RenderResult:
+    challenge: str
+    renderer: str
+    success: bool
+    error: Optional[str] = None
+
+class BatchRenderer:
+    '''
+    Render multiple challenges with multiple renderers.
+    Each challenge is loaded once, and challenges are rendered in parallel across a process pool.
+    Failures are collected into a summary instead of stopping the run.
+    '''
+    def __init__(self, args: Args):
+        self.args = args
+        self.results: List[RenderResult] = []
+    
+    @staticmethod
+    def run_renderer(challenge_name: str, renderer: str, challenge: Challenge, options: RenderOptions) -> RenderResult:
+        try:
+            TemplateRenderer.render(renderer, challenge, options)
+        except SystemExit as e:
+            # Renderers exit with code 0 when there is nothing to render for the challenge
+            if e.code is None or e.code == 0:
+                return RenderResult(challenge_name, renderer, True)
+            return RenderResult(challenge_name, renderer, False, f"Renderer exited with code {e.code}")
+        except Exception as e:
+            return RenderResult(challenge_name, renderer, False, str(e))
+        
+        return RenderResult(challenge_name, renderer, True)
+    
+    @staticmethod
+    def render_challenge(challenge_name: str, renderers: List[str], options: RenderOptions) -> List[RenderResult]:
+        print(f"Rendering challenge {challenge_name} ({', '.join(renderers)})")
+        
+        challenge_path = Utils.get_challenges_dir().joinpath(challenge_name)
+        if not challenge_path.exists() or not challenge_path.is_dir():
+            print(f"Challenge {challenge_name} does not exist")
+            return [RenderResult(challenge_name, renderer, False, "Challenge does not exist") for renderer in renderers]
+        
+        try:
+            challenge = ChallengeIndex.shared().challenge(challenge_path)
+        except Exception as e:
+            print(f"Failed to load challenge {challenge_name}: {e}")
+            return [RenderResult(challenge_name, renderer, False, f"Failed to load challenge: {e}") for renderer in renderers]
+        
+        if not challenge:
+            print(f"Challenge {challenge_name} is not a valid challenge")
+            return [RenderResult(challenge_name, renderer, False, "Not a valid challenge") for renderer in renderers]
+        
+        results = [BatchRenderer.run_renderer(challenge_name, renderer, challenge, options) for renderer in renderers]
+        print("")
+        return results
+    
+    def print_summary(self):
+        failed = [result for result in self.results if not result.success]
+        
+        print("Summary:")
+        print(f"  Challenges: {len(self.args.challenges)}")
+        print(f"  Renders succeeded: {len(self.results) - len(failed)}")
+        print(f"  Renders failed: {len(failed)}")
+        for result in failed:
+            print(f"  - {result.challenge} ({result.renderer}): {result.error}")
+    
+    def run(self) -> bool:
+        options = self.args.options()
+        
+        # Parse changed challenges once up front, so the workers only read the index
+        ChallengeIndex.shared().refresh(challenges=self.args.challenges, pages=[])
+        
+        tasks = [
+            Task(challenge_name, BatchRenderer.render_challenge, (challenge_name, self.args.renderers, options))
+            for challenge_name in self.args.challenges
+        ]
+        
+        for task_result in ParallelExecutor(self.args.jobs).run(tasks):
+            if task_result.success and task_result.value is not None:
+                self.results.extend(task_result.value)
+            else:
+                self.results.extend([RenderResult(task_result.name, renderer, False, task_result.error) for renderer in self.args.renderers])
+        
+        self.print_summary()
+        
+        return all(result.success for result in self.results)
+
 class TemplateRenderer:
     args = None
     parent_parser = None
@@ -374,6 +570,23 @@ class TemplateRenderer:
   
     def register_subcommand(self):
         self.args = Args(self.parent_parser)
+    
+    @staticmethod
+    def render(renderer: str, challenge: Challenge, args: RenderOptions):
+        if renderer == "clean":
+            clean = Clean(challenge)
+            clean.run()
+        elif renderer == "k8s":
+            k8s = K8s(challenge)
+            k8s.render(args)
+        elif renderer == "configmap":
+            configmap = ConfigMap(challenge)
+            configmap.render(args)
+        elif renderer == "handout":
+            handout_renderer = HandoutRenderer(challenge)
+            handout_renderer.render(args)
+        else:
+            print(f"Renderer {renderer} not supported.")
   
     def run(self):
         if not self.args:
@@ -385,21 +598,12 @@ class TemplateRenderer:
         
         args = self.args
         
-        if args.renderer == "clean":
-            clean = Clean(args.challenge)
-            clean.run()
+        if args.batch:
+            if not BatchRenderer(args).run():
+                sys.exit(1)
             return
-        elif args.renderer == "k8s":
-            k8s = K8s(args.challenge)
-            k8s.render(args)
-        elif args.renderer == "configmap":
-            configmap = ConfigMap(args.challenge)
-            configmap.render(args)
-        elif args.renderer == "handout":
-            handout_renderer = HandoutRenderer(args.challenge)
-            handout_renderer.render()
-        else:
-            print(f"Renderer {args.renderer} not supported.")
+        
+        self.render(args.renderer, args.challenge, args.options())
 
 if __name__ == "__main__":
     TemplateRenderer().run()
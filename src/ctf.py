@@ -1,17 +1,24 @@
 import os
+import sys
 
 import argparse
+import importlib
 
-from commands.challenge_creator import ChallengeCreator
-from commands.template_renderer import TemplateRenderer
-from commands.page import PageCommand
-from commands.pipeline import DockerBuild 
-from commands.slugify import SlugifyCommand
+# Subcommands, mapped to the module and class implementing them, and their help text.
+# Only the module of the command being run is imported, to keep startup fast.
+COMMANDS = {
+    "create": ("commands.challenge_creator", "ChallengeCreator", "Template Generator for CTF Challenges"),
+    "template": ("commands.template_renderer", "TemplateRenderer", "Render template for K8s challenge"),
+    "pipeline": ("commands.pipeline", "DockerBuild", "Pipeline for CTF challenges"),
+    "page": ("commands.page", "PageCommand", "Render template for CTFd pages"),
+    "slugify": ("commands.slugify", "SlugifyCommand", "Slugify a string for use in challenge slug"),
+    "changed": ("commands.changed", "ChangedCommand", "List challenges and pages affected by changes since a git ref"),
+}
 
 class Args:
     command = None
     parser = None
-    
+
     def __init__(self):
         self.parser = argparse.ArgumentParser(description="Challenge Toolkit CLI")
 
@@ -19,42 +26,41 @@ class Args:
         if self.parser:
             self.parser.print_help()
 
+def load_command(name: str, subparser):
+    module_name, class_name, _ = COMMANDS[name]
+    module = importlib.import_module(module_name)
+    command = getattr(module, class_name)(subparser)
+    command.register_subcommand()
+    return command
+
 if __name__ == "__main__":
     try:
         args = Args()
-        
+
         if (args.parser is None):
             print("Error: Parser is not initialized.")
             exit(1)
-        
+
         subparser = args.parser.add_subparsers(dest="command", help="Subcommand to run", title="subcommands")
-        
-        challengeCreator = ChallengeCreator(subparser)
-        challengeCreator.register_subcommand()
-        templateRenderer = TemplateRenderer(subparser)
-        templateRenderer.register_subcommand()
-        dockerBuild = DockerBuild(subparser)
-        dockerBuild.register_subcommand()
-        pageRender = PageCommand(subparser)
-        pageRender.register_subcommand()
-        slugify = SlugifyCommand(subparser)
-        slugify.register_subcommand()
+
+        # Subcommand arguments are parsed from sys.argv[2:], so the command is always the first argument
+        selected = sys.argv[1] if len(sys.argv) > 1 and sys.argv[1] in COMMANDS else None
+
+        tool = None
+        for name, (_, _, help) in COMMANDS.items():
+            if name == selected:
+                tool = load_command(name, subparser)
+            else:
+                # Placeholder, so the command is still listed in the help output
+                subparser.add_parser(name, help=help)
 
         # Get subcommand to run
         namespace = args.parser.parse_args()
         command = namespace.command
-            
+
         # Call the appropriate tool based on the command
-        if command == "create":
-            challengeCreator.run()
-        elif command == "template":
-            templateRenderer.run()
-        elif command == "pipeline":
-            dockerBuild.run()
-        elif command == "page":
-            pageRender.run()
-        elif command == "slugify":
-            slugify.run()
+        if tool is not None and command == selected:
+            tool.run()
         else:
             args.print_help()
             exit(1)
@@ -62,6 +68,5 @@ if __name__ == "__main__":
         # Detect if we are running inside a Github runner
         if os.getenv("GITHUB_ACTIONS"):
             print(f"::error::An error occurred: {e}")
-        
-        raise e
 
+        raise e
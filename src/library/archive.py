@@ -0,0 +1,796 @@
+import os
+import json
+import math
+import stat
+import time
+import zlib
+import shutil
+import struct
+import gzip
+import hashlib
+import tarfile
+import zipfile
+import calendar
+import tempfile
+import threading
+import contextlib
+import collections
+import concurrent.futures
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from .utils import Utils
+
+# Size of the chunks files are read and compressed in, so memory use does not depend on the size of the files
+CHUNK_SIZE = 1024 * 1024
+ZEROS = bytes(CHUNK_SIZE)
+
+# Files from this size on are compressed by the writer as they are written, instead of by the compression threads,
+# so their compressed data is never spooled to disk next to the archive
+STREAMED_FILE_SIZE = 256 * 1024 * 1024
+
+# Files from this size on always get ZIP64 headers, so they can be written even when they grow while being archived
+ZIP64_FILE_SIZE = 1024 * 1024 * 1024
+
+# Version needed to extract members with ZIP64 headers
+ZIP64_EXTRACT_VERSION = 45
+
+# Local file header of a zip member, as laid out in the zip specification
+LOCAL_FILE_HEADER = struct.Struct("<4s5H3L2H")
+LOCAL_FILE_HEADER_SIGNATURE = b"PK\x03\x04"
+
+# Seconds between progress lines of archives being written
+PROGRESS_INTERVAL_SECONDS = 10.0
+
+# Files left out of the top level of a handout, as they only exist to keep the directory in git
+SKIPPED_FILES = [".gitkeep", ".gitignore"]
+
+# Earliest date a zip file can store, used as the timestamp of reproducible archives when SOURCE_DATE_EPOCH is not set
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+# Formats handouts can be archived in
+ARCHIVE_FORMATS = ["zip", "tar.gz", "tar.zst"]
+
+# Compression levels used when none is given, pinned instead of relying on the defaults of the libraries
+DEFAULT_COMPRESS_LEVELS = {"zip": 6, "tar.gz": 6, "tar.zst": 3}
+COMPRESS_LEVEL_RANGES = {"zip": (0, 9), "tar.gz": (0, 9), "tar.zst": (1, 22)}
+
+# Files that are already compressed, which are stored in zip archives as is
+INCOMPRESSIBLE_EXTENSIONS = {
+    ".7z", ".apk", ".br", ".bz2", ".docx", ".flac", ".gif", ".gz", ".jar", ".jpeg", ".jpg", ".lz4", ".lzma", ".mkv", ".mov",
+    ".mp3", ".mp4", ".odt", ".ogg", ".png", ".pptx", ".rar", ".tgz", ".webm", ".webp", ".whl", ".xlsx", ".xz", ".zip", ".zst",
+}
+
+# Files with other extensions are sampled at the start and the middle, and stored when the bytes are close to random
+ENTROPY_SAMPLE_SIZE = 32 * 1024
+INCOMPRESSIBLE_ENTROPY = 7.5
+
+# Compressed files kept in memory until written to the archive, larger files are spooled to a temporary file
+SPOOL_SIZE = 4 * 1024 * 1024
+
+# Bump when the manifest format changes, to rebuild archives of existing manifests from scratch
+MANIFEST_VERSION = 2
+
+class ArchiveError(Exception):
+    pass
+
+class RawZipMembers:
+    '''
+    Parts of writing zip archives that ZipFile has no public interface for, kept in one place.
+
+    ZipFile only writes data it compresses itself, so members deflated ahead of time by the compression threads,
+    or copied from the previous archive, are appended the way ZipFile.open appends a member, with the same local header
+    '''
+    @staticmethod
+    def set_compress_level(info: zipfile.ZipInfo, level: int):
+        '''
+        Level of the compressor ZipFile.open uses for the member, which is only public from Python 3.13
+        '''
+        if hasattr(zipfile.ZipInfo, "compress_level"):
+            info.compress_level = level
+        else:
+            info._compresslevel = level
+
+    @staticmethod
+    def data_offset(source: BinaryIO, info: zipfile.ZipInfo) -> int:
+        '''
+        Offset of the compressed data of a member, after its local header, which may have other extra fields than its central directory entry
+        '''
+        source.seek(info.header_offset)
+        header = source.read(LOCAL_FILE_HEADER.size)
+        if len(header) != LOCAL_FILE_HEADER.size or not header.startswith(LOCAL_FILE_HEADER_SIGNATURE):
+            raise zipfile.BadZipFile(f"Bad local header of {info.filename}")
+        *_, name_length, extra_length = LOCAL_FILE_HEADER.unpack(header)
+        return info.header_offset + LOCAL_FILE_HEADER.size + name_length + extra_length
+
+    @staticmethod
+    def append(archive: zipfile.ZipFile, info: zipfile.ZipInfo, data: BinaryIO, zip64: bool):
+        '''
+        Append a member with compressed data that is read from data, and the sizes and CRC already set in its header
+        '''
+        info.flag_bits = 0
+        info.header_offset = archive.fp.tell()
+        archive.fp.write(info.FileHeader(zip64))
+        remaining = info.compress_size
+        while remaining > 0:
+            chunk = data.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Compressed data of {info.filename} ends early")
+            archive.fp.write(chunk)
+            remaining -= len(chunk)
+
+        archive.filelist.append(info)
+        archive.NameToInfo[info.filename] = info
+        archive.start_dir = archive.fp.tell()
+
+def zstd_module():
+    '''
+    Module providing zstd compression: compression.zstd of Python 3.14 and later, or the optional zstandard package
+    '''
+    try:
+        from compression import zstd
+        return zstd
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+class SourceReader:
+    '''
+    Reader of a handout file in chunks, reporting the bytes read to the progress of the archive.
+
+    Holes of sparse files, such as disk images, are not read from disk but filled in with zeros,
+    on filesystems that can report them (SEEK_DATA and SEEK_HOLE)
+    '''
+    def __init__(self, path: Path, progress: Optional["ArchiveProgress"] = None):
+        self.file = open(path, "rb")
+        self.progress = progress
+        status = os.fstat(self.file.fileno())
+        self.size = status.st_size
+        self.position = 0
+        self.hole_end = 0
+        self.data_end = 0
+        # Files with as many blocks as their size have no holes
+        self.sparse = hasattr(os, "SEEK_HOLE") and hasattr(status, "st_blocks") and status.st_blocks * 512 < status.st_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.file.close()
+
+    def chunks(self) -> Iterator[bytes]:
+        return iter(lambda: self.read(CHUNK_SIZE), b"")
+
+    def read(self, size: int = CHUNK_SIZE) -> bytes:
+        data = self.read_sparse(size) if self.sparse else self.file.read(size)
+        if self.progress is not None:
+            self.progress.advance(len(data))
+        return data
+
+    def read_sparse(self, size: int) -> bytes:
+        output = bytearray()
+        while len(output) < size and self.position < self.size:
+            if self.position >= max(self.hole_end, self.data_end):
+                self.locate()
+            if self.position < self.hole_end:
+                length = min(size - len(output), self.hole_end - self.position)
+                output += memoryview(ZEROS)[:length] if length <= CHUNK_SIZE else bytes(length)
+                self.position += length
+                continue
+
+            self.file.seek(self.position)
+            data = self.file.read(min(size - len(output), self.data_end - self.position))
+            if not data:
+                # The file was truncated while being read
+                break
+            output += data
+            self.position += len(data)
+        return bytes(output)
+
+    def locate(self):
+        '''
+        Find the hole or the data at the current position
+        '''
+        try:
+            data = os.lseek(self.file.fileno(), self.position, os.SEEK_DATA)
+        except OSError:
+            # No data after the position, the rest of the file is a hole
+            data = self.size
+        if data > self.position:
+            self.hole_end = self.data_end = min(data, self.size)
+            return
+        self.hole_end = self.position
+        try:
+            self.data_end = min(os.lseek(self.file.fileno(), self.position, os.SEEK_HOLE), self.size)
+        except OSError:
+            self.data_end = self.size
+
+class ArchiveProgress:
+    '''
+    Progress of an archive being written, printed at most once per interval with the rate and the estimated time left.
+    Files are read by the compression threads as well as the writer, so updates are counted under a lock
+    '''
+    def __init__(self, name: str, total: int, interval: Optional[float] = None, output: Callable[[str], None] = print):
+        self.name = name
+        self.total = total
+        self.interval = PROGRESS_INTERVAL_SECONDS if interval is None else interval
+        self.output = output
+        self.done = 0
+        self.start = self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def advance(self, size: int):
+        with self.lock:
+            self.done += size
+            now = time.monotonic()
+            if now - self.last < self.interval:
+                return
+            self.last = now
+            line = self.line(now - self.start)
+        self.output(line)
+
+    def line(self, elapsed: float) -> str:
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        line = f"Archiving {self.name}: {Utils.format_size(self.done)} of {Utils.format_size(self.total)}"
+        if self.total:
+            line += f" ({min(self.done / self.total, 1.0):.0%})"
+        line += f", {Utils.format_size(int(rate))}/s"
+        if rate > 0:
+            line += f", ETA {ArchiveProgress.format_duration(max(self.total - self.done, 0) / rate)}"
+        return line
+
+    @staticmethod
+    def format_duration(seconds: float) -> str:
+        seconds = int(round(seconds))
+        if seconds >= 3600:
+            return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m {seconds % 60:02d}s"
+        if seconds >= 60:
+            return f"{seconds // 60}m {seconds % 60:02d}s"
+        return f"{seconds}s"
+
+@dataclass
+class HandoutEntry:
+    '''
+    File or directory of a handout: its resolved path on disk, and its name within the archive
+    '''
+    source: Path
+    name: str
+    directory: bool = False
+
+@dataclass
+class ArchiveResult:
+    '''
+    Outcome of writing an archive: the number of files, and how many were compressed or copied from the previous archive
+    '''
+    files: int = 0
+    compressed: int = 0
+    stored: int = 0
+    reused: int = 0
+    unchanged: bool = False
+
+@dataclass
+class CompressedFile:
+    '''
+    Deflated content of a file, waiting to be written to the archive
+    '''
+    file: BinaryIO
+    sha256: str
+
+@dataclass
+class PreviousMember:
+    '''
+    Member of the previous archive, as listed in its manifest and in the archive itself
+    '''
+    manifest: dict
+    info: Optional[zipfile.ZipInfo] = None
+
+class HandoutArchive:
+    '''
+    Zip archive of a handout directory, with every entry under a root directory named after the challenge.
+
+    The handout directory is walked once, and files are compressed straight into the archive a chunk at a time,
+    instead of being copied to a temporary directory first. Symbolic links are followed, as long as they resolve
+    to a path within the handout directory. The archive is written next to the destination, and moved into place once complete.
+
+    Reproducible archives store the same timestamp for every entry, normalized permissions, and a fixed compression level,
+    so the same handout content always results in the same bytes.
+
+    Files are deflated in a pool of threads, ahead of being written to the archive in order. Files that are already compressed,
+    detected by their extension or a sample of their content, are stored without compression.
+
+    Incremental writes keep a manifest of the entries next to the archive, with the size, modification time and SHA-256 of
+    every file. When nothing changed the archive is left as is. Otherwise the compressed data of unchanged files is copied
+    from the previous archive, and only new and changed files are compressed.
+    '''
+    def __init__(
+        self,
+        source: Path,
+        root: str,
+        reproducible: bool = False,
+        date_time: Tuple[int, int, int, int, int, int] = ZIP_EPOCH,
+        compress_level: Optional[int] = None,
+        jobs: int = 1,
+    ):
+        self.source = Path(source)
+        self.base = self.source.resolve()
+        self.root = root
+        self.reproducible = reproducible
+        self.date_time = date_time
+        self.compress_level = compress_level
+        self.jobs = max(1, jobs)
+        self.progress: Optional[ArchiveProgress] = None
+
+    def level(self, format: str = "zip") -> int:
+        return DEFAULT_COMPRESS_LEVELS[format] if self.compress_level is None else self.compress_level
+
+    @staticmethod
+    def source_date(epoch: Optional[str]) -> Tuple[int, int, int, int, int, int]:
+        '''
+        Timestamp of reproducible archives, from the value of SOURCE_DATE_EPOCH (seconds since 1970 in UTC).
+        Dates before 1980 are moved to the earliest date a zip file can store
+        '''
+        if not epoch:
+            return ZIP_EPOCH
+        date_time = tuple(time.gmtime(int(epoch))[:6])
+        return max(date_time, ZIP_EPOCH)
+
+    def entries(self) -> List[HandoutEntry]:
+        '''
+        List the entries of the archive, in the order they are written. Directories come before their content
+        '''
+        entries: List[HandoutEntry] = []
+        self.walk(self.source, self.root, entries, {self.base}, top_level=True)
+        return entries
+
+    def walk(self, directory: Path, name: str, entries: List[HandoutEntry], parents: Set[Path], top_level: bool = False):
+        for item in sorted(os.listdir(directory)):
+            if top_level and item in SKIPPED_FILES:
+                continue
+
+            path = directory.joinpath(item)
+            try:
+                resolved = path.resolve()
+                # Ensure the resolved path is within the handout directory
+                resolved.relative_to(self.base)
+            except (ValueError, RuntimeError, OSError):
+                print(f"Skipping item {path.relative_to(self.source)} as it is outside the handout directory.")
+                continue
+
+            entry_name = f"{name}/{item}"
+            if resolved.is_dir():
+                if resolved in parents:
+                    print(f"Skipping item {path.relative_to(self.source)} as it links to one of its parent directories.")
+                    continue
+                entries.append(HandoutEntry(resolved, entry_name, directory=True))
+                self.walk(resolved, entry_name, entries, parents | {resolved})
+            elif resolved.is_file():
+                entries.append(HandoutEntry(resolved, entry_name))
+
+    @staticmethod
+    def manifest_path(destination: Path) -> Path:
+        return destination.with_name(f".{destination.stem}.manifest.json")
+
+    def settings(self) -> dict:
+        '''
+        Settings the compressed data depends on. Compressed data of a previous archive is only reused when these match
+        '''
+        return {
+            "version": MANIFEST_VERSION,
+            "compress_level": self.level(),
+        }
+
+    def write(self, destination: Path, entries: Optional[List[HandoutEntry]] = None, incremental: bool = False) -> ArchiveResult:
+        '''
+        Write the archive to destination. Incremental writes skip the archive when the files match the manifest,
+        and copy the compressed data of unchanged files from the previous archive
+        '''
+        entries = self.entries() if entries is None else entries
+        destination = Path(destination)
+        manifest_path = HandoutArchive.manifest_path(destination)
+        members = [HandoutEntry(self.base, self.root, directory=True)] + entries
+        infos = [self.info(entry.source, entry.name, entry.directory) for entry in members]
+        result = ArchiveResult(files=len(entries) - sum(1 for entry in entries if entry.directory))
+
+        previous = self.previous(destination, manifest_path) if incremental else {}
+        manifest = [self.manifest_entry(entry, info, previous.get(info.filename)) for entry, info in zip(members, infos)]
+        if previous and HandoutArchive.matches(manifest, previous):
+            result.unchanged = True
+        else:
+            new_files = [entry for entry, manifest_entry in zip(members, manifest) if not entry.directory and manifest_entry["sha256"] is None]
+            reused = sum(manifest_entry["compress_size"] for manifest_entry in manifest if manifest_entry.get("sha256") is not None)
+            HandoutArchive.check_space(destination, HandoutArchive.estimate_size(new_files) + reused + sum(2 * len(info.filename) + 100 for info in infos))
+            self.progress = ArchiveProgress(destination.name, sum(info.file_size for info in infos))
+            self.write_archive(destination, members, infos, manifest, previous, result)
+
+        if not incremental:
+            manifest_path.unlink(missing_ok=True)
+        elif not result.unchanged or manifest != [member.manifest for member in previous.values()]:
+            # Manifests are also updated when only modification times changed, so files are not hashed again next time
+            HandoutArchive.write_manifest(manifest_path, {**self.settings(), "archive_size": destination.stat().st_size, "entries": manifest})
+        return result
+
+    def write_tar(self, destination: Path, format: str, entries: Optional[List[HandoutEntry]] = None) -> ArchiveResult:
+        '''
+        Write the handout as a tar archive compressed with gzip ("tar.gz") or zstd ("tar.zst"), as a single stream
+        '''
+        entries = self.entries() if entries is None else entries
+        destination = Path(destination)
+        files = [entry for entry in entries if not entry.directory]
+        result = ArchiveResult(files=len(files))
+        # Every entry takes at least a header block, and the archive ends with two empty blocks and padding
+        HandoutArchive.check_space(destination, HandoutArchive.estimate_size(files) + 1024 * (len(entries) + 1) + tarfile.RECORDSIZE)
+        self.progress = ArchiveProgress(destination.name, sum(os.stat(entry.source).st_size for entry in files))
+        temporary = destination.with_name(f".{destination.name}.{os.getpid()}.tmp")
+        try:
+            with open(temporary, "wb") as raw, self.compressor(raw, format) as stream:
+                with tarfile.open(fileobj=stream, mode="w|", format=tarfile.PAX_FORMAT, copybufsize=CHUNK_SIZE) as archive:
+                    for entry in [HandoutEntry(self.base, self.root, directory=True)] + entries:
+                        info = self.tar_info(archive, entry)
+                        if entry.directory:
+                            archive.addfile(info)
+                        else:
+                            with SourceReader(entry.source, self.progress) as source:
+                                archive.addfile(info, source)
+                            result.compressed += 1
+            os.replace(temporary, destination)
+        except BaseException:
+            temporary.unlink(missing_ok=True)
+            raise
+        return result
+
+    @staticmethod
+    def estimate_size(files: List[HandoutEntry]) -> int:
+        '''
+        Estimate of the space files take in an archive, when they do not compress: their size,
+        or the blocks allocated to them when smaller, as holes of sparse files compress to nearly nothing
+        '''
+        total = 0
+        for entry in files:
+            status = os.stat(entry.source)
+            allocated = getattr(status, "st_blocks", None)
+            total += status.st_size if allocated is None else min(status.st_size, allocated * 512)
+        return total
+
+    @staticmethod
+    def check_space(destination: Path, required: int):
+        '''
+        Fail before writing when the filesystem of the archive does not have room for it
+        '''
+        free = shutil.disk_usage(destination.parent).free
+        if required > free:
+            raise ArchiveError(
+                f"Not enough free space to write {destination.name}: about {Utils.format_size(required)} needed, "
+                f"{Utils.format_size(free)} free in {destination.parent}"
+            )
+
+    def compressor(self, raw: BinaryIO, format: str):
+        '''
+        Writable stream compressing into raw. Closing the stream finishes the compressed data, but leaves raw open
+        '''
+        if format == "tar.gz":
+            # The name of the file and the time are left out of the gzip header of reproducible archives
+            return gzip.GzipFile(filename="", mode="wb", fileobj=raw, compresslevel=self.level(format), mtime=self.mtime() if self.reproducible else None)
+
+        zstd = zstd_module()
+        if zstd is None:
+            raise ArchiveError("tar.zst archives need Python 3.14 or later, or the zstandard package (pip install zstandard)")
+        # Output of zstd with one or more worker threads does not depend on the number of threads
+        if zstd.__name__ == "zstandard":
+            return zstd.ZstdCompressor(level=self.level(format), threads=self.jobs).stream_writer(raw, closefd=False)
+        options = {zstd.CompressionParameter.compression_level: self.level(format), zstd.CompressionParameter.nb_workers: self.jobs}
+        return zstd.ZstdFile(raw, "w", options=options)
+
+    def tar_info(self, archive: tarfile.TarFile, entry: HandoutEntry) -> tarfile.TarInfo:
+        info = archive.gettarinfo(str(entry.source), entry.name)
+        if self.reproducible:
+            info.mtime = self.mtime()
+            info.mode = HandoutArchive.mode(info.mode, entry.directory)
+            info.uid = info.gid = 0
+            info.uname = info.gname = ""
+        return info
+
+    def mtime(self) -> int:
+        return calendar.timegm(self.date_time)
+
+    def write_archive(self, destination: Path, members: List[HandoutEntry], infos: List[zipfile.ZipInfo], manifest: List[dict], previous: Dict[str, PreviousMember], result: ArchiveResult):
+        temporary = destination.with_name(f".{destination.name}.{os.getpid()}.tmp")
+        try:
+            with open(destination, "rb") if previous else contextlib.nullcontext() as source, zipfile.ZipFile(temporary, "w", zipfile.ZIP_DEFLATED) as archive, \
+                    contextlib.closing(self.prepare_members(members, infos, manifest, destination.parent)) as prepared:
+                for entry, info, manifest_entry, data in prepared:
+                    if entry.directory:
+                        archive.writestr(info, b"")
+                        continue
+
+                    if manifest_entry["sha256"] is not None:
+                        HandoutArchive.copy_member(source, previous[info.filename].info, info, archive)
+                        self.progress.advance(info.file_size)
+                        result.reused += 1
+                        continue
+
+                    if data is None:
+                        manifest_entry["sha256"] = self.add_file(archive, entry, info)
+                        if info.compress_type == zipfile.ZIP_STORED:
+                            result.stored += 1
+                    else:
+                        with data.file:
+                            HandoutArchive.write_raw(archive, info, data.file)
+                        manifest_entry["sha256"] = data.sha256
+                    manifest_entry.update({"crc": info.CRC, "compress_size": info.compress_size, "compress_type": info.compress_type})
+                    result.compressed += 1
+            os.replace(temporary, destination)
+        except BaseException:
+            temporary.unlink(missing_ok=True)
+            raise
+
+    def prepare_members(self, members: List[HandoutEntry], infos: List[zipfile.ZipInfo], manifest: List[dict], spool_dir: Path) -> Iterator[tuple]:
+        '''
+        Yield the members in order, with files to deflate compressed by the thread pool a few members ahead of the writes
+        '''
+        pending: Deque[tuple] = collections.deque()
+        pool = concurrent.futures.ThreadPoolExecutor(self.jobs) if self.jobs > 1 else None
+        try:
+            for entry, info, manifest_entry in zip(members, infos, manifest):
+                task = None
+                if not entry.directory and manifest_entry["sha256"] is None:
+                    task = pool.submit(self.compress_file, entry, info, spool_dir) if pool else (self.compress_file, entry, info, spool_dir)
+                pending.append((entry, info, manifest_entry, task))
+                while len(pending) > 2 * self.jobs:
+                    yield HandoutArchive.prepared(pending.popleft())
+            while pending:
+                yield HandoutArchive.prepared(pending.popleft())
+        finally:
+            if pool is not None:
+                # Members that were not started are dropped, as shutdown(cancel_futures=True) needs Python 3.9
+                for *_, task in pending:
+                    if isinstance(task, concurrent.futures.Future):
+                        task.cancel()
+                pool.shutdown(wait=True)
+            # Compressed files of members that were not written, when writing failed
+            for *_, task in pending:
+                if isinstance(task, concurrent.futures.Future) and task.done() and not task.cancelled() and task.exception() is None and task.result() is not None:
+                    task.result().file.close()
+
+    @staticmethod
+    def prepared(member: tuple) -> tuple:
+        entry, info, manifest_entry, task = member
+        if isinstance(task, concurrent.futures.Future):
+            return entry, info, manifest_entry, task.result()
+        if task is not None:
+            function, *arguments = task
+            return entry, info, manifest_entry, function(*arguments)
+        return entry, info, manifest_entry, None
+
+    def compression(self, source: Path, size: int) -> int:
+        '''
+        Compression of a file: stored when the level is 0, or when the file is already compressed, and deflated otherwise
+        '''
+        if self.level() == 0 or source.suffix.lower() in INCOMPRESSIBLE_EXTENSIONS:
+            return zipfile.ZIP_STORED
+        if size >= 2 * ENTROPY_SAMPLE_SIZE and HandoutArchive.entropy(HandoutArchive.sample(source, size)) > INCOMPRESSIBLE_ENTROPY:
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+    @staticmethod
+    def sample(source: Path, size: int) -> bytes:
+        with open(source, "rb") as f:
+            start = f.read(ENTROPY_SAMPLE_SIZE)
+            f.seek(size // 2)
+            return start + f.read(ENTROPY_SAMPLE_SIZE)
+
+    @staticmethod
+    def entropy(data: bytes) -> float:
+        '''
+        Shannon entropy of data in bits per byte, 8 for random data
+        '''
+        if not data:
+            return 0.0
+        return -sum(count / len(data) * math.log2(count / len(data)) for count in collections.Counter(data).values())
+
+    def compress_file(self, entry: HandoutEntry, info: zipfile.ZipInfo, spool_dir: Path) -> Optional["CompressedFile"]:
+        '''
+        Deflate a file into a temporary file, filling in the sizes and CRC of its header.
+        Returns None for files that are stored, and for large files, which are read as they are written
+        '''
+        info.compress_type = self.compression(entry.source, info.file_size)
+        if info.compress_type == zipfile.ZIP_STORED or info.file_size >= STREAMED_FILE_SIZE or HandoutArchive.zip64(info):
+            return None
+
+        # Raw deflate stream, as written by ZipFile
+        compressor = zlib.compressobj(self.level(), zlib.DEFLATED, -15)
+        digest = hashlib.sha256()
+        crc = 0
+        size = 0
+        spool = tempfile.SpooledTemporaryFile(SPOOL_SIZE, dir=spool_dir)
+        try:
+            with SourceReader(entry.source, self.progress) as source:
+                for chunk in source.chunks():
+                    digest.update(chunk)
+                    crc = zlib.crc32(chunk, crc)
+                    size += len(chunk)
+                    spool.write(compressor.compress(chunk))
+            spool.write(compressor.flush())
+        except BaseException:
+            spool.close()
+            raise
+
+        info.CRC = crc
+        info.file_size = size
+        info.compress_size = spool.tell()
+        spool.seek(0)
+        return CompressedFile(spool, digest.hexdigest())
+
+    def previous(self, destination: Path, manifest_path: Path) -> Dict[str, PreviousMember]:
+        '''
+        Members of the previous archive, when its manifest matches the settings and the central directory of the archive
+        '''
+        try:
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+            if not isinstance(manifest, dict) or any(manifest.get(key) != value for key, value in self.settings().items()):
+                return {}
+            if manifest.get("archive_size") != destination.stat().st_size:
+                return {}
+            with zipfile.ZipFile(destination) as archive:
+                infos = {info.filename: info for info in archive.infolist()}
+        except (OSError, ValueError, zipfile.BadZipFile):
+            return {}
+
+        previous: Dict[str, PreviousMember] = {}
+        for entry in manifest.get("entries") or []:
+            info = infos.get(entry.get("name")) if isinstance(entry, dict) else None
+            if info is None:
+                return {}
+            # The archive may have been replaced since the manifest was written
+            if not entry.get("directory") and (info.CRC, info.compress_size, info.file_size, info.compress_type) != (entry.get("crc"), entry.get("compress_size"), entry.get("size"), entry.get("compress_type")):
+                return {}
+            previous[info.filename] = PreviousMember(entry, info)
+        return previous
+
+    @staticmethod
+    def matches(manifest: List[dict], previous: Dict[str, PreviousMember]) -> bool:
+        '''
+        Whether the archive would be the same as the previous one: the same entries, with the same headers and content
+        '''
+        if [entry["name"] for entry in manifest] != list(previous):
+            return False
+        for entry in manifest:
+            known = previous[entry["name"]].manifest
+            if entry.get("directory"):
+                if entry != known:
+                    return False
+            elif entry["sha256"] is None or any(entry[key] != known.get(key) for key in ["date_time", "external_attr"]):
+                return False
+        return True
+
+    def manifest_entry(self, entry: HandoutEntry, info: zipfile.ZipInfo, known: Optional[PreviousMember] = None) -> dict:
+        '''
+        Manifest entry of a member. Files with the content of the previous archive get its SHA-256 and compressed size,
+        other files get them once compressed
+        '''
+        manifest_entry = {"name": info.filename, "date_time": list(info.date_time), "external_attr": info.external_attr}
+        if entry.directory:
+            manifest_entry["directory"] = True
+            return manifest_entry
+
+        mtime_ns = os.stat(entry.source).st_mtime_ns
+        unchanged = known is not None and known.info is not None and HandoutArchive.content_unchanged(entry, info.file_size, mtime_ns, known.manifest)
+        manifest_entry.update({
+            "size": info.file_size,
+            "mtime_ns": mtime_ns,
+            "sha256": known.manifest["sha256"] if unchanged else None,
+            "crc": known.info.CRC if unchanged else None,
+            "compress_size": known.info.compress_size if unchanged else None,
+            "compress_type": known.info.compress_type if unchanged else None,
+        })
+        return manifest_entry
+
+    @staticmethod
+    def content_unchanged(entry: HandoutEntry, size: int, mtime_ns: int, known: dict) -> bool:
+        '''
+        Whether a file has the content listed in the manifest. Files are only hashed when their modification time changed
+        '''
+        if known.get("size") != size or not known.get("sha256"):
+            return False
+        if known.get("mtime_ns") == mtime_ns:
+            return True
+        return HandoutArchive.hash_file(entry.source) == known["sha256"]
+
+    @staticmethod
+    def hash_file(path: Path) -> str:
+        digest = hashlib.sha256()
+        with SourceReader(path) as source:
+            for chunk in source.chunks():
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def write_manifest(path: Path, manifest: dict):
+        temp_path = path.with_name(path.name + ".tmp")
+        with open(temp_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.write("\n")
+        os.replace(temp_path, path)
+
+    def info(self, source: Path, name: str, directory: bool = False) -> zipfile.ZipInfo:
+        # Timestamps before 1980 cannot be stored in a zip file, and are clamped instead of failing the archive
+        info = zipfile.ZipInfo.from_file(source, f"{name}/" if directory else name, strict_timestamps=False)
+        info.compress_type = zipfile.ZIP_STORED if directory else zipfile.ZIP_DEFLATED
+        if self.reproducible:
+            info.date_time = self.date_time
+            info.create_system = 3
+            info.external_attr = HandoutArchive.attributes(info.external_attr >> 16, directory)
+        return info
+
+    @staticmethod
+    def mode(mode: int, directory: bool) -> int:
+        '''
+        Normalized permissions of an entry: directories and executable files are 755, other files 644, like git stores them
+        '''
+        return 0o755 if directory or mode & 0o111 else 0o644
+
+    @staticmethod
+    def attributes(mode: int, directory: bool) -> int:
+        if directory:
+            return (stat.S_IFDIR | HandoutArchive.mode(mode, directory)) << 16 | 0x10
+        return (stat.S_IFREG | HandoutArchive.mode(mode, directory)) << 16
+
+    def add_file(self, archive: zipfile.ZipFile, entry: HandoutEntry, info: zipfile.ZipInfo) -> str:
+        '''
+        Write a file into the archive with the compression of its header, returning the SHA-256 of its content
+        '''
+        RawZipMembers.set_compress_level(info, self.level())
+        zip64 = HandoutArchive.zip64(info)
+        if zip64:
+            HandoutArchive.set_zip64_version(info)
+        digest = hashlib.sha256()
+        with SourceReader(entry.source, self.progress) as source, archive.open(info, "w", force_zip64=zip64) as target:
+            for chunk in source.chunks():
+                digest.update(chunk)
+                target.write(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def copy_member(source, previous: zipfile.ZipInfo, info: zipfile.ZipInfo, archive: zipfile.ZipFile):
+        '''
+        Copy the compressed data of a member of the previous archive, with the header of the current file
+        '''
+        info.compress_type = previous.compress_type
+        info.CRC = previous.CRC
+        info.file_size = previous.file_size
+        info.compress_size = previous.compress_size
+
+        source.seek(RawZipMembers.data_offset(source, previous))
+        HandoutArchive.write_raw(archive, info, source)
+
+    @staticmethod
+    def zip64(info: zipfile.ZipInfo) -> bool:
+        '''
+        Whether a member gets ZIP64 headers. Large files always do, so they are written by ZipFile.open with force_zip64
+        '''
+        return info.file_size >= ZIP64_FILE_SIZE
+
+    @staticmethod
+    def set_zip64_version(info: zipfile.ZipInfo):
+        '''
+        Older versions of Python, such as 3.8 to 3.10, do not raise the version needed to extract when ZIP64 headers are forced on a file that fits without them
+        '''
+        info.extract_version = max(info.extract_version, ZIP64_EXTRACT_VERSION)
+        info.create_version = max(info.create_version, ZIP64_EXTRACT_VERSION)
+
+    @staticmethod
+    def write_raw(archive: zipfile.ZipFile, info: zipfile.ZipInfo, data: BinaryIO):
+        '''
+        Write a member with compressed data as is, with the local header ZipFile.open would write,
+        which keeps archives identical no matter which files were compressed or copied
+        '''
+        zip64 = HandoutArchive.zip64(info)
+        if zip64:
+            HandoutArchive.set_zip64_version(info)
+        RawZipMembers.append(archive, info, data, zip64)
@@ -0,0 +1,147 @@
+import os
+import time
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .utils import Utils
+
+CACHE_TYPES = ["none", "local", "registry", "inline"]
+
+# Tag of the cache image, when the cache is stored in the registry
+REGISTRY_CACHE_TAG = "buildcache"
+
+@dataclass
+class CacheOptions:
+    type: str = "none"
+    directory: Optional[Path] = None
+    max_age_days: float = 14
+    max_size_mb: float = 0
+
+    def enabled(self) -> bool:
+        return self.type != "none"
+
+    def root(self) -> Path:
+        return self.directory if self.directory is not None else Utils.get_cache_dir().joinpath("buildkit")
+
+class BuildCache:
+    '''
+    BuildKit cache import and export for an image, derived from the name of the image.
+
+    The local cache is exported to a new directory, which replaces the previous cache after a successful build.
+    BuildKit only ever adds to a local cache, so this keeps the cache from growing with stale layers.
+    '''
+    @staticmethod
+    def directory(options: CacheOptions, image_full: str) -> Path:
+        return options.root().joinpath(Utils.slugify(image_full) or "default")
+
+    @staticmethod
+    def staging_directory(options: CacheOptions, image_full: str) -> Path:
+        directory = BuildCache.directory(options, image_full)
+        return directory.with_name(f"{directory.name}-new")
+
+    @staticmethod
+    def specs(options: CacheOptions, image_full: str) -> Tuple[List[str], List[str]]:
+        '''
+        Cache sources and destinations of an image, as values for --cache-from and --cache-to
+        '''
+        if options.type == "local":
+            directory = BuildCache.directory(options, image_full)
+            cache_from = [f"type=local,src={directory}"] if directory.joinpath("index.json").is_file() else []
+            return cache_from, [f"type=local,dest={BuildCache.staging_directory(options, image_full)},mode=max"]
+        if options.type == "registry":
+            reference = f"{image_full}:{REGISTRY_CACHE_TAG}"
+            return [f"type=registry,ref={reference}"], [f"type=registry,ref={reference},mode=max"]
+        if options.type == "inline":
+            return [f"type=registry,ref={image_full}:latest"], ["type=inline"]
+        return [], []
+
+    @staticmethod
+    def arguments(options: CacheOptions, image_full: str) -> List[str]:
+        cache_from, cache_to = BuildCache.specs(options, image_full)
+        arguments = []
+        for spec in cache_from:
+            arguments += ["--cache-from", spec]
+        for spec in cache_to:
+            arguments += ["--cache-to", spec]
+        return arguments
+
+    @staticmethod
+    def rotate(options: CacheOptions, image_full: str):
+        '''
+        Replace the local cache of an image with the cache exported by the last successful build
+        '''
+        if options.type != "local":
+            return
+
+        directory = BuildCache.directory(options, image_full)
+        staging = BuildCache.staging_directory(options, image_full)
+        if not staging.is_dir():
+            return
+
+        # Imported on first use, as it is only needed for the local cache
+        import shutil
+
+        if directory.exists():
+            shutil.rmtree(directory)
+        os.replace(staging, directory)
+        # Mark the cache as used, for pruning
+        os.utime(directory)
+
+    @staticmethod
+    def discard(options: CacheOptions, image_full: str):
+        '''
+        Remove the cache exported by a failed build
+        '''
+        staging = BuildCache.staging_directory(options, image_full)
+        if options.type == "local" and staging.is_dir():
+            import shutil
+            shutil.rmtree(staging, ignore_errors=True)
+
+    @staticmethod
+    def size(directory: Path) -> int:
+        total = 0
+        for root, _, files in os.walk(directory):
+            for file in files:
+                try:
+                    total += os.lstat(os.path.join(root, file)).st_size
+                except OSError:
+                    pass
+        return total
+
+    @staticmethod
+    def prune(options: CacheOptions) -> List[Path]:
+        '''
+        Remove local caches of images not built within the maximum age, and the least recently built caches
+        while the total size is above the maximum size. Returns the removed cache directories
+        '''
+        root = options.root()
+        if options.type != "local" or not root.is_dir():
+            return []
+
+        import shutil
+
+        caches = sorted((directory for directory in root.iterdir() if directory.is_dir()), key=lambda directory: directory.stat().st_mtime)
+        removed = []
+
+        if options.max_age_days > 0:
+            cutoff = time.time() - options.max_age_days * 24 * 60 * 60
+            for directory in list(caches):
+                if directory.stat().st_mtime < cutoff:
+                    shutil.rmtree(directory, ignore_errors=True)
+                    caches.remove(directory)
+                    removed.append(directory)
+
+        if options.max_size_mb > 0:
+            sizes = {directory: BuildCache.size(directory) for directory in caches}
+            total = sum(sizes.values())
+            limit = options.max_size_mb * 1024 * 1024
+            for directory in caches:
+                if total <= limit:
+                    break
+                shutil.rmtree(directory, ignore_errors=True)
+                total -= sizes[directory]
+                removed.append(directory)
+
+        return removed
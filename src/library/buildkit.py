@@ -0,0 +1,235 @@
+import re
+import json
+import base64
+import binascii
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from .utils import Utils
+
+# Longest line of raw JSON progress that is parsed. Log output of a step is sent base64 encoded, so lines can be long
+MAX_PROGRESS_LINE_BYTES = 8 * 1024 * 1024
+
+# Number of slowest steps kept in the summary of a build
+SLOWEST_STEPS = 5
+
+# Steps of the Dockerfile are named like "[2/5] RUN make" or "[builder 2/5] RUN make", internal steps like "[internal] load .dockerignore"
+DOCKERFILE_STEP = re.compile(r"^\[(?:[^\]]+ )?\d+/\d+\] ")
+
+# Status of the upload of the build context to the builder
+CONTEXT_STATUS = "transferring context"
+
+# RFC 3339 timestamp, split into the date and time, the optional fraction of a second, and the time zone
+RFC3339_TIMESTAMP = re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d+))?(Z|[+-]\d{2}:\d{2})?$", re.IGNORECASE)
+
+@dataclass
+class BuildStep:
+    name: str
+    started: Optional[datetime] = None
+    completed: Optional[datetime] = None
+    cached: bool = False
+    error: Optional[str] = None
+
+    def duration(self) -> Optional[float]:
+        if self.started is None or self.completed is None:
+            return None
+        return max((self.completed - self.started).total_seconds(), 0.0)
+
+    def dockerfile_step(self) -> bool:
+        return DOCKERFILE_STEP.match(self.name) is not None
+
+class BuildProgress:
+    '''
+    Parser of the raw JSON progress of BuildKit ('--progress=rawjson'): a JSON object per line with updates of the vertexes of the build
+    (the steps of the Dockerfile, and internal steps such as loading the build context), their statuses and their logs.
+
+    The lines are turned into readable output like the plain progress of BuildKit, while the start, end and cache status of
+    every step is collected for a summary of the build. Lines that are not JSON, such as errors printed by the CLI, are passed on as is.
+    '''
+    def __init__(self):
+        self.steps: Dict[str, BuildStep] = {}
+        self.numbers: Dict[str, int] = {}
+        self.context_bytes: Optional[int] = None
+        self.logs: Dict[str, bytes] = {}
+        self.completed: Set[Tuple[str, str]] = set()
+        self.pending = b""
+        self.skipping = False
+
+    @staticmethod
+    def timestamp(value) -> Optional[datetime]:
+        '''
+        Parse an RFC 3339 timestamp of Go, which has up to nanosecond precision and drops trailing zeros of the fraction.
+        Before Python 3.11, fromisoformat only accepts fractions of 3 or 6 digits, and no "Z" suffix
+        '''
+        if not isinstance(value, str) or value.startswith("0001-"):
+            return None
+        match = RFC3339_TIMESTAMP.match(value.strip())
+        if match is None:
+            return None
+        moment, fraction, zone = match.groups()
+        if fraction:
+            moment += "." + fraction[:6].ljust(6, "0")
+        if zone:
+            moment += "+00:00" if zone.upper() == "Z" else zone
+        try:
+            return datetime.fromisoformat(moment)
+        except ValueError:
+            return None
+
+    def number(self, digest: str) -> int:
+        return self.numbers.setdefault(digest, len(self.numbers) + 1)
+
+    def feed(self, chunk: bytes) -> List[str]:
+        '''
+        Parse a chunk of output, returning the lines to print for the lines it completes
+        '''
+        *lines, self.pending = (self.pending + chunk).split(b"\n")
+        output = []
+        for line in lines:
+            if self.skipping:
+                self.skipping = False
+                continue
+            output += self.line(line)
+        if len(self.pending) > MAX_PROGRESS_LINE_BYTES:
+            # The rest of an overlong line is dropped, instead of being passed on as output
+            output.append("(overlong progress update skipped)")
+            self.pending = b""
+            self.skipping = True
+        return output
+
+    def line(self, line: bytes) -> List[str]:
+        try:
+            update = json.loads(line)
+        except ValueError:
+            update = None
+        if not isinstance(update, dict):
+            return [line.decode(errors="replace").rstrip("\r")]
+
+        output = []
+        for vertex in update.get("vertexes") or []:
+            output += self.vertex(vertex)
+        for status in update.get("statuses") or []:
+            output += self.status(status)
+        for log in update.get("logs") or []:
+            output += self.log(log)
+        for warning in update.get("warnings") or []:
+            if isinstance(warning, dict):
+                output.append(f"WARNING: {BuildProgress.decode(warning.get('short')) or 'warning'}")
+        return output
+
+    def vertex(self, vertex) -> List[str]:
+        if not isinstance(vertex, dict) or not vertex.get("digest"):
+            return []
+
+        digest = vertex["digest"]
+        new = digest not in self.steps
+        step = self.steps.setdefault(digest, BuildStep(str(vertex.get("name") or digest)))
+        number = self.number(digest)
+        output = [f"#{number} {step.name}"] if new else []
+
+        started = BuildProgress.timestamp(vertex.get("started"))
+        completed = BuildProgress.timestamp(vertex.get("completed"))
+        # Updates of a vertex repeat its fields, the first start and the last completion are kept
+        if started is not None and (step.started is None or started < step.started):
+            step.started = started
+        if vertex.get("cached") and not step.cached:
+            step.cached = True
+            output.append(f"#{number} CACHED")
+        if vertex.get("error") and step.error is None:
+            step.error = str(vertex["error"])
+            output.append(f"#{number} ERROR: {step.error}")
+        if completed is not None and step.completed is None:
+            step.completed = completed
+            if not step.cached and step.error is None:
+                output.append(f"#{number} DONE {step.duration() or 0.0:.1f}s")
+        return output
+
+    def status(self, status) -> List[str]:
+        if not isinstance(status, dict):
+            return []
+        if status.get("id") == CONTEXT_STATUS and isinstance(status.get("current"), int):
+            self.context_bytes = max(self.context_bytes or 0, status["current"])
+        # Progress of statuses is sent many times a second, only completed statuses are printed, once
+        key = (status.get("vertex"), status.get("id"))
+        if status.get("completed") and status.get("vertex") and key not in self.completed:
+            self.completed.add(key)
+            current = status.get("current")
+            size = f" {Utils.format_size(current)}" if isinstance(current, int) and current else ""
+            return [f"#{self.number(status['vertex'])} {status.get('id') or status.get('name')}:{size} done"]
+        return []
+
+    def log(self, log) -> List[str]:
+        if not isinstance(log, dict) or not log.get("vertex"):
+            return []
+        try:
+            data = base64.b64decode(log.get("data") or "")
+        except (binascii.Error, ValueError):
+            return []
+
+        digest = log["vertex"]
+        *lines, pending = (self.logs.get(digest, b"") + data).split(b"\n")
+        self.logs[digest] = pending[-MAX_PROGRESS_LINE_BYTES:]
+        return [f"#{self.number(digest)} {line.decode(errors='replace').rstrip(chr(13))}" for line in lines]
+
+    def flush(self) -> List[str]:
+        '''
+        Lines for the output that did not end with a newline
+        '''
+        output = self.line(self.pending) if self.pending and not self.skipping else []
+        self.pending = b""
+        output += [f"#{self.number(digest)} {pending.decode(errors='replace')}" for digest, pending in self.logs.items() if pending]
+        self.logs.clear()
+        return output
+
+    @staticmethod
+    def decode(value) -> str:
+        try:
+            return base64.b64decode(value).decode(errors="replace") if value else ""
+        except (binascii.Error, ValueError):
+            return str(value)
+
+    def summary(self, slowest: int = SLOWEST_STEPS) -> dict:
+        '''
+        Summary of the build: the number of Dockerfile steps and how many were cached, the size of the build context,
+        the failed step and the slowest steps, including internal steps
+        '''
+        dockerfile_steps = [step for step in self.steps.values() if step.dockerfile_step()]
+        cached = sum(1 for step in dockerfile_steps if step.cached)
+        starts = [step.started for step in self.steps.values() if step.started is not None]
+        ends = [step.completed for step in self.steps.values() if step.completed is not None]
+        timed = sorted((step for step in self.steps.values() if step.duration() is not None), key=lambda step: -step.duration())
+        failed = next((step.name for step in self.steps.values() if step.error), None)
+
+        return {
+            "steps": len(dockerfile_steps),
+            "cached_steps": cached,
+            "cache_hit_ratio": cached / len(dockerfile_steps) if dockerfile_steps else None,
+            "context_bytes": self.context_bytes,
+            "duration": (max(ends) - min(starts)).total_seconds() if starts and ends else None,
+            "failed_step": failed,
+            "slowest": [{"name": step.name, "duration": step.duration(), "cached": step.cached} for step in timed[:slowest]],
+        }
+
+    @staticmethod
+    def describe(summary: dict) -> List[str]:
+        '''
+        Lines describing a summary, printed after the build
+        '''
+        if not summary["steps"] and not summary["slowest"]:
+            return ["No build steps reported"]
+
+        line = f"Build steps: {summary['steps']}, {summary['cached_steps']} cached"
+        if summary["cache_hit_ratio"] is not None:
+            line += f" ({summary['cache_hit_ratio']:.0%})"
+        if summary["context_bytes"] is not None:
+            line += f", build context {Utils.format_size(summary['context_bytes'])}"
+        lines = [line]
+        if summary["failed_step"]:
+            lines.append(f"Failed step: {summary['failed_step']}")
+        if summary["slowest"]:
+            lines.append("Slowest steps:")
+            for step in summary["slowest"]:
+                lines.append(f"  {step['duration']:6.1f}s  {step['name']}" + (" (cached)" if step["cached"] else ""))
+        return lines
@@ -0,0 +1,107 @@
+import os
+import json
+import hashlib
+
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from .utils import Utils
+from .data import Challenge
+
+# Bump when the rendered output changes for identical inputs, to invalidate existing manifests
+RENDER_CACHE_VERSION = 1
+
+class RenderCache:
+    '''
+    Incremental render cache for a challenge.
+
+    The digest of every input of a render is stored in a manifest in the k8s directory of the challenge.
+    When the digest of a new render matches the manifest, and the outputs still exist, the render can be skipped.
+    '''
+    manifest_name = ".render-cache.json"
+
+    def __init__(self, challenge: Challenge):
+        self.challenge = challenge
+        self.k8s_dir = Utils.get_k8s_dir(challenge.category, challenge.slug)
+        self.manifest_path = self.k8s_dir.joinpath(self.manifest_name)
+
+    @staticmethod
+    def hash_file(digest, path: Path, name: str):
+        digest.update(name.encode())
+        digest.update(b"\0")
+        if not path.is_file():
+            digest.update(b"missing\0")
+            return
+
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        digest.update(b"\0")
+
+    def input_files(self) -> List[Path]:
+        challenge_dir = self.challenge.get_path()
+        files = []
+
+        # Challenge definition
+        if challenge_dir.is_dir():
+            files.extend(sorted(file for file in challenge_dir.iterdir() if file.is_file() and file.suffix in [".yml", ".yaml", ".json"]))
+
+        files.append(challenge_dir.joinpath("template", "k8s.yml"))
+        files.append(challenge_dir.joinpath(self.challenge.description_location))
+        files.append(challenge_dir.joinpath("version"))
+
+        # Shared templates in the repository
+        template_dir = Utils.get_template_dir()
+        if template_dir.is_dir():
+            files.extend(sorted(file for file in template_dir.rglob("*") if file.is_file()))
+
+        return files
+
+    def digest(self, renderer: str, args: Dict[str, object]) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{RENDER_CACHE_VERSION}:{renderer}\0".encode())
+        digest.update(json.dumps(args, sort_keys=True).encode())
+
+        repo_dir = Utils.get_repo_dir()
+        for file in self.input_files():
+            try:
+                name = str(file.relative_to(repo_dir))
+            except ValueError:
+                name = str(file)
+            self.hash_file(digest, file, name)
+
+        return digest.hexdigest()
+
+    def load_manifest(self) -> Dict[str, dict]:
+        if not self.manifest_path.is_file():
+            return {}
+
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        return manifest if isinstance(manifest, dict) else {}
+
+    def is_fresh(self, renderer: str, digest: str) -> bool:
+        entry = self.load_manifest().get(renderer)
+        if not isinstance(entry, dict) or entry.get("digest") != digest:
+            return False
+
+        # Outputs may have been removed since the last render
+        return all(self.k8s_dir.joinpath(output).is_file() for output in entry.get("outputs", []))
+
+    def store(self, renderer: str, digest: str, outputs: Iterable[str]):
+        manifest = self.load_manifest()
+        manifest[renderer] = {
+            "digest": digest,
+            "outputs": sorted(str(Path(output).relative_to(self.k8s_dir)) for output in outputs),
+        }
+
+        os.makedirs(self.k8s_dir, exist_ok=True)
+        temp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        with open(temp_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.write("\n")
+        os.replace(temp_path, self.manifest_path)
@@ -3,6 +3,9 @@ from pathlib import Path
 # Path to the root of the challenge repository
 CHALLENGE_REPO_ROOT = Path.cwd() # Default to the directory where the command is run from
 
+# Directory within the challenge repository, used for caches kept between runs
+CACHE_DIR_NAME = ".ctf-cache"
+
 # Challenge and Page schema URLs
 CHALLENGE_SCHEMA = "https://raw.githubusercontent.com/ctfpilot/challenge-schema/refs/heads/main/schema.json"
 PAGE_SCHEMA = "https://raw.githubusercontent.com/ctfpilot/page-schema/refs/heads/main/schema.json"
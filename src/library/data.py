@@ -1,6 +1,5 @@
 import re
 import json as _json
-import yaml as _yaml
 
 from dataclasses import dataclass, field
 from typing import List, Optional, Union
@@ -8,6 +7,7 @@ from pathlib import Path
 
 
 from .utils import Utils
+from .version import VersionFile
 from .config import CHALL_TYPES, DIFFICULTIES, CATEGORIES, TAG_FORMAT, INSTANCED_TYPES, FLAG_FORMAT, DEFAULT
 
 @dataclass
@@ -378,20 +378,14 @@ class Challenge:
         
         self.prerequisites.append(prerequisite)
         
+    def version_file(self) -> VersionFile:
+        return VersionFile(self.get_path(), f"challenge-{Utils.slugify(self.category)}-{self.slug}")
+
     def get_version(self):
-        file = self.get_path().joinpath('version')
-        
-        if not file.exists():
-            return 0
-        
-        with open(file, 'r') as f:
-            return int(f.read())
+        return self.version_file().read()
 
     def save_version(self, version: int):
-        file = self.get_path().joinpath('version')
-        
-        with open(file, 'w') as f:
-            f.write(str(version))
+        self.version_file().write(version)
     
     def get_path(self):
         return Utils.get_challenge_dir(self.category, self.slug)
@@ -439,7 +433,7 @@ class Challenge:
         # Remove $schema from dict for yaml, as it will be added as a comment
         schema = data.pop("$schema", None)
         yml_str = f"# yaml-language-server: $schema={schema}\n\n"
-        yml_str += _yaml.dump(data, sort_keys=False, allow_unicode=True)
+        yml_str += Utils.dump_yaml(data)
         return yml_str
      
     def str_json(self, schema_location: str):
@@ -530,15 +524,15 @@ class Challenge:
     @staticmethod
     def load_dir(directory: Path):
         # Check for yml or json file
-        path = Path(directory)
-        for file in path.iterdir():
-            if file.is_file():
-                if file.name.endswith(".yml") or file.name.endswith(".yaml"):
-                    print("Loading from yml file")
-                    return Challenge.load_from_yaml(Utils.load_yaml(file))
-                elif file.name.endswith(".json"):
-                    print("Loading from json file")
-                    return Challenge.load_from_json(Utils.load_json(file))
+        file = Utils.find_definition_file(directory)
+        if file is None:
+            return None
+
+        if file.name.endswith(".json"):
+            print("Loading from json file")
+            return Challenge.load_from_json(Utils.load_json(file))
+        print("Loading from yml file")
+        return Challenge.load_from_yaml(Utils.load_yaml(file))
 
 @dataclass
 class Page:
@@ -613,20 +607,14 @@ class Page:
     def set_draft(self, draft: Optional[bool]):
         self.draft = draft if draft is not None else False
         
+    def version_file(self) -> VersionFile:
+        return VersionFile(self.get_path(), f"page-{self.slug}")
+
     def get_version(self):
-        file = self.get_path().joinpath('version')
-        
-        if not file.exists():
-            return 0
-        
-        with open(file, 'r') as f:
-            return int(f.read())
+        return self.version_file().read()
 
     def save_version(self, version: int):
-        file = self.get_path().joinpath('version')
-        
-        with open(file, 'w') as f:
-            f.write(str(version))
+        self.version_file().write(version)
     
     def get_path(self):
         return Utils.get_page_dir(self.slug)
@@ -648,7 +636,7 @@ class Page:
         data = self.generate_dict(schema_location)
         schema = data.pop("$schema", None)
         yml_str = f"# yaml-language-server: $schema={schema}\n\n"
-        yml_str += _yaml.dump(data, sort_keys=False, allow_unicode=True)
+        yml_str += Utils.dump_yaml(data)
         return yml_str
 
     def str_json(self, schema_location: str):
@@ -700,13 +688,13 @@ class Page:
     @staticmethod
     def load_dir(directory: Path):
         # Check for yml or json file
-        path = Path(directory)
-        for file in path.iterdir():
-            if file.is_file():
-                if file.name.endswith(".yml") or file.name.endswith(".yaml"):
-                    print("Loading from yml file")
-                    return Page.load_from_yaml(Utils.load_yaml(file))
-                elif file.name.endswith(".json"):
-                    print("Loading from json file")
-                    return Page.load_from_json(Utils.load_json(file))
+        file = Utils.find_definition_file(directory)
+        if file is None:
+            return None
+
+        if file.name.endswith(".json"):
+            print("Loading from json file")
+            return Page.load_from_json(Utils.load_json(file))
+        print("Loading from yml file")
+        return Page.load_from_yaml(Utils.load_yaml(file))
                 
\ No newline at end of file
@@ -0,0 +1,287 @@
+import sys
+import time
+import asyncio
+import subprocess
+
+from collections import deque
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Deque, List, Optional, TypeVar, Union
+
+from .utils import Utils
+
+if TYPE_CHECKING:
+    from .buildkit import BuildProgress
+
+# Size of the chunks read from the output of a command. Lines are split manually, as the line length
+# of the asyncio stream reader is limited and docker can print very long lines
+READ_SIZE = 64 * 1024
+
+# Seconds a stopped command gets to exit after SIGTERM, before it is killed
+STOP_GRACE_SECONDS = 5.0
+
+# Longer lines are cut, so memory use is bounded even if a command never prints a newline
+MAX_LINE_BYTES = 64 * 1024
+
+LOG_MODES = ["stream", "quiet", "tail"]
+
+# Seconds between progress summaries of commands whose output is spooled to a log file
+SUMMARY_INTERVAL_SECONDS = 30.0
+
+T = TypeVar("T")
+
+class DockerRunner:
+    '''
+    Runs docker commands as asyncio subprocesses, so several commands can run and stream their output at the same time.
+
+    Output is passed on a line at a time, so lines of concurrent commands are never interleaved.
+    Commands that fail raise subprocess.CalledProcessError, and commands running longer than the timeout
+    are stopped and raise subprocess.TimeoutExpired. Cancelling a running command stops its process.
+
+    In the quiet and tail log modes, output of commands given a log file is written to the file as raw bytes
+    instead, and only progress summaries are passed on. In tail mode, the last lines are passed on if the command fails.
+    Blocking functions, such as requests to the Docker Engine API, run in worker threads with the same output handling.
+    '''
+    def __init__(self, binary: str = "docker", timeout: Optional[float] = None, output: Optional[Callable[[str, str], None]] = None, log_mode: str = "stream", tail_lines: int = 50, summary_interval: float = SUMMARY_INTERVAL_SECONDS):
+        self.binary = binary
+        self.timeout = timeout
+        self.output = output or DockerRunner.print_line
+        self.log_mode = log_mode
+        self.tail_lines = tail_lines
+        self.summary_interval = summary_interval
+    
+    def spools(self) -> bool:
+        return self.log_mode != "stream"
+
+    @staticmethod
+    def print_line(line: str, prefix: str = ""):
+        print(f"{prefix}{line}", flush=True)
+
+    def command(self, arguments: List[str]) -> List[str]:
+        return [self.binary, *arguments]
+
+    async def run(self, arguments: List[str], prefix: str = "", timeout: Optional[float] = None, log: Optional[Path] = None, progress: Optional["BuildProgress"] = None):
+        '''
+        Run a command. With a log file, and a log mode other than stream, output is appended to the log file.
+        With progress, the output is parsed as raw JSON build progress, and the rendered progress is passed on instead
+        '''
+        command = self.command(arguments)
+        timeout = timeout if timeout is not None else self.timeout
+
+        process = await asyncio.create_subprocess_exec(*command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        sink = OutputSink(self, prefix, log, progress)
+        try:
+            try:
+                await asyncio.wait_for(self.read(process, sink), timeout)
+            except asyncio.TimeoutError:
+                await DockerRunner.stop(process)
+                sink.failed()
+                raise subprocess.TimeoutExpired(command, timeout)
+            except asyncio.CancelledError:
+                await DockerRunner.stop(process)
+                raise
+
+            if process.returncode != 0:
+                sink.failed()
+                raise subprocess.CalledProcessError(process.returncode, command)
+            sink.finished()
+        finally:
+            sink.close()
+
+    async def read(self, process: asyncio.subprocess.Process, sink: "OutputSink"):
+        while process.stdout is not None:
+            try:
+                chunk = await asyncio.wait_for(process.stdout.read(READ_SIZE), self.summary_interval if sink.spooling() else None)
+            except asyncio.TimeoutError:
+                sink.tick()
+                continue
+            if not chunk:
+                break
+            sink.feed(chunk)
+        await process.wait()
+
+    async def run_thread(self, function: Callable[[Callable[[bytes], None]], T], cancel: Callable[[], None], command: List[str], prefix: str = "", timeout: Optional[float] = None, log: Optional[Path] = None) -> T:
+        '''
+        Run a blocking function in a worker thread, like a command: the function is given a callback writing its output,
+        which is handled in the event loop like the output of a command. cancel is called from the event loop to stop
+        the function on a timeout or cancellation, and must make it return or raise soon after
+        '''
+        loop = asyncio.get_running_loop()
+        timeout = timeout if timeout is not None else self.timeout
+        sink = OutputSink(self, prefix, log)
+
+        def write(chunk: bytes):
+            loop.call_soon_threadsafe(sink.feed, chunk)
+
+        future = loop.run_in_executor(None, function, write)
+        try:
+            try:
+                result = await asyncio.wait_for(self.watch(future, sink), timeout)
+            except asyncio.TimeoutError:
+                cancel()
+                sink.failed()
+                await asyncio.gather(future, return_exceptions=True)
+                raise subprocess.TimeoutExpired(command, timeout)
+            except asyncio.CancelledError:
+                cancel()
+                raise
+            except Exception:
+                # Output is handed to the event loop before the result, so it has all been handled by now
+                sink.failed()
+                raise
+            sink.finished()
+            return result
+        finally:
+            sink.close()
+
+    async def watch(self, future: "asyncio.Future", sink: "OutputSink"):
+        while True:
+            done, _ = await asyncio.wait([future], timeout=self.summary_interval if sink.spooling() else None)
+            if done:
+                return future.result()
+            sink.tick()
+
+    @staticmethod
+    def decode(line: bytes) -> str:
+        return line[:MAX_LINE_BYTES].decode(errors="replace").rstrip("\r")
+
+    def print_tail(self, tail: Deque[bytes], log: Path, prefix: str):
+        if tail:
+            self.output(f"Last {len(tail)} lines of output:", prefix)
+            for line in tail:
+                self.output(DockerRunner.decode(line), prefix)
+        self.output(f"Full output written to {log}", prefix)
+
+    @staticmethod
+    async def stop(process: asyncio.subprocess.Process, grace: float = STOP_GRACE_SECONDS):
+        '''
+        Terminate a process, killing it if it does not exit within the grace period
+        '''
+        if process.returncode is not None:
+            return
+        try:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), grace)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+        except ProcessLookupError:
+            pass
+
+    @staticmethod
+    def describe_error(error: Exception) -> str:
+        if isinstance(error, subprocess.TimeoutExpired):
+            return f"Command timed out after {error.timeout:g}s"
+        if isinstance(error, subprocess.CalledProcessError):
+            return f"Command failed with exit code {error.returncode}"
+        return str(error)
+
+    @staticmethod
+    def report_error(error: Exception, prefix: str = ""):
+        command = getattr(error, "cmd", None)
+        print(f"{prefix}Error: {DockerRunner.describe_error(error)}" + (f": {command}" if command else ""), file=sys.stderr)
+
+    def run_sync(self, arguments: List[str], prefix: str = "", timeout: Optional[float] = None, log: Optional[Path] = None):
+        '''
+        Run a single command, outside of an event loop
+        '''
+        asyncio.run(self.run(arguments, prefix, timeout, log))
+
+class OutputSink:
+    '''
+    Output of a single command: passed on a line at a time or, when spooled, written to the log file as raw bytes
+    while only the last lines are kept, to be passed on if the command fails. Raw JSON build progress is rendered first
+    '''
+    def __init__(self, runner: DockerRunner, prefix: str, log: Optional[Path], progress: Optional["BuildProgress"] = None):
+        self.runner = runner
+        self.progress = progress
+        self.prefix = prefix
+        self.log = log if log is not None and runner.spools() else None
+        self.tail: Deque[bytes] = deque(maxlen=runner.tail_lines if runner.log_mode == "tail" else 0)
+        self.pending = b""
+        self.size = 0
+        self.start = time.monotonic()
+        self.last_summary = self.start
+        self.file = None
+        self.closed = False
+        if self.log is not None:
+            self.log.parent.mkdir(parents=True, exist_ok=True)
+            self.file = open(self.log, "ab")
+
+    def spooling(self) -> bool:
+        return self.log is not None
+
+    def feed(self, chunk: bytes):
+        # Late output, for example of a worker thread that is being stopped, is dropped
+        if self.closed:
+            return
+        if self.progress is not None:
+            self.write(self.progress.feed(chunk))
+        else:
+            self.write(chunk)
+
+    def write(self, chunk: Union[bytes, List[str]]):
+        if isinstance(chunk, list):
+            chunk = "".join(f"{line}\n" for line in chunk).encode()
+        if not chunk:
+            return
+        if self.file is None:
+            self.stream(chunk)
+            return
+
+        self.file.write(chunk)
+        self.size += len(chunk)
+        if self.tail.maxlen:
+            *lines, self.pending = (self.pending + chunk).split(b"\n")
+            self.tail.extend(line[:MAX_LINE_BYTES] for line in lines[-self.tail.maxlen:])
+            # Only the end of an overlong line is kept
+            self.pending = self.pending[-MAX_LINE_BYTES:]
+        self.tick()
+
+    def stream(self, chunk: bytes):
+        *lines, self.pending = (self.pending + chunk).split(b"\n")
+        # Overlong lines are passed on in pieces
+        while len(self.pending) > MAX_LINE_BYTES:
+            lines.append(self.pending[:MAX_LINE_BYTES])
+            self.pending = self.pending[MAX_LINE_BYTES:]
+        for line in lines:
+            for start in range(0, max(len(line), 1), MAX_LINE_BYTES):
+                self.runner.output(DockerRunner.decode(line[start:start + MAX_LINE_BYTES]), self.prefix)
+
+    def tick(self):
+        '''
+        Pass on a progress summary, if the output is spooled and the last summary is older than the summary interval
+        '''
+        now = time.monotonic()
+        if self.log is not None and now - self.last_summary >= self.runner.summary_interval:
+            self.last_summary = now
+            self.runner.output(f"Still running after {now - self.start:.0f}s, {Utils.format_size(self.size)} of output", self.prefix)
+
+    def close(self):
+        '''
+        Pass on, or keep, the last unterminated line, and close the log file. Output fed afterwards is dropped
+        '''
+        if self.closed:
+            return
+        if self.progress is not None:
+            self.write(self.progress.flush())
+        self.closed = True
+        if self.pending:
+            if self.log is None:
+                self.runner.output(DockerRunner.decode(self.pending), self.prefix)
+            else:
+                self.tail.append(self.pending)
+            self.pending = b""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def finished(self):
+        self.close()
+        if self.log is not None:
+            self.runner.output(f"Finished in {time.monotonic() - self.start:.1f}s, {Utils.format_size(self.size)} of output written to {self.log}", self.prefix)
+
+    def failed(self):
+        self.close()
+        if self.log is not None:
+            self.runner.print_tail(self.tail, self.log, self.prefix)
@@ -0,0 +1,418 @@
+import os
+import json
+import stat
+import base64
+import codecs
+import socket
+import tarfile
+import threading
+import http.client
+
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import quote, urlencode
+
+from .fingerprint import DockerIgnore, context_files
+
+DEFAULT_SOCKET = "/var/run/docker.sock"
+
+# Size of the chunks the build context is sent in, and the response is read in
+CHUNK_SIZE = 64 * 1024
+
+# Idle connections kept open for the next request
+MAX_IDLE_CONNECTIONS = 8
+
+# Longest incomplete JSON message buffered from a response, so a broken response cannot use unbounded memory
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024
+
+# Name of a Dockerfile outside of the build context, within the archive sent to the daemon
+EXTERNAL_DOCKERFILE = ".ctfpilot.Dockerfile"
+
+Body = Union[None, bytes, Callable[[], Iterable[bytes]]]
+
+class EngineError(Exception):
+    '''
+    Error reported by the Docker Engine, or failure of the connection to it
+    '''
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    '''
+    HTTP connection over a unix socket
+    '''
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+class EngineOperation:
+    '''
+    Request in progress, which can be stopped from another thread by shutting down its connection.
+    The daemon cancels a build when the connection of the client is closed
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connection: Optional[UnixHTTPConnection] = None
+        self.cancelled = False
+
+    def attach(self, connection: UnixHTTPConnection):
+        with self.lock:
+            if self.cancelled:
+                raise EngineError("Request was cancelled")
+            self.connection = connection
+
+    def detach(self):
+        with self.lock:
+            self.connection = None
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            if self.connection is not None and self.connection.sock is not None:
+                try:
+                    self.connection.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+class BuildContext:
+    '''
+    Tar archive of a build context, generated a chunk at a time while it is sent, so the context is never held in memory.
+    Files excluded by .dockerignore are left out, like the Docker CLI does. A Dockerfile outside of the context is added to the archive
+    '''
+    def __init__(self, context: Path, dockerfile: Path):
+        self.context = Path(context)
+        self.dockerfile = Path(dockerfile)
+
+    def dockerfile_name(self) -> str:
+        '''
+        Path of the Dockerfile within the archive
+        '''
+        try:
+            return self.dockerfile.resolve().relative_to(self.context.resolve()).as_posix()
+        except ValueError:
+            return EXTERNAL_DOCKERFILE
+
+    def entries(self) -> List[str]:
+        entries = context_files(self.context, DockerIgnore.load(self.context, self.dockerfile), directories=True)
+        # The daemon reads the Dockerfile and .dockerignore from the archive, so they are sent even if they are excluded
+        for name in [self.dockerfile_name(), ".dockerignore"]:
+            if name != EXTERNAL_DOCKERFILE and name not in entries and self.context.joinpath(name).is_file():
+                entries.append(name)
+        return entries
+
+    @staticmethod
+    def header(name: str, status: os.stat_result) -> Optional[tarfile.TarInfo]:
+        info = tarfile.TarInfo(name)
+        info.mode = stat.S_IMODE(status.st_mode)
+        info.mtime = int(status.st_mtime)
+        if stat.S_ISLNK(status.st_mode):
+            info.type = tarfile.SYMTYPE
+        elif stat.S_ISDIR(status.st_mode):
+            info.type = tarfile.DIRTYPE
+        elif stat.S_ISREG(status.st_mode):
+            info.size = status.st_size
+        else:
+            # Sockets, pipes and devices cannot be copied into an image
+            return None
+        return info
+
+    @staticmethod
+    def encode(info: tarfile.TarInfo) -> bytes:
+        return info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+
+    @staticmethod
+    def padding(size: int) -> bytes:
+        return b"\0" * (-size % tarfile.BLOCKSIZE)
+
+    def chunks(self) -> Iterator[bytes]:
+        try:
+            yield from self.archive()
+        except OSError as e:
+            raise EngineError(f"Could not read build context {self.context}: {e}") from e
+
+    def archive(self) -> Iterator[bytes]:
+        buffer = bytearray()
+        for name in self.entries():
+            path = self.context.joinpath(name)
+            try:
+                info = BuildContext.header(name, os.lstat(path))
+            except FileNotFoundError:
+                # Removed since the context was listed
+                continue
+            if info is None:
+                continue
+            if info.type == tarfile.SYMTYPE:
+                info.linkname = os.readlink(path)
+
+            buffer += BuildContext.encode(info)
+            if info.isreg():
+                with open(path, "rb") as f:
+                    remaining = info.size
+                    while remaining > 0:
+                        if len(buffer) >= CHUNK_SIZE:
+                            yield bytes(buffer)
+                            buffer.clear()
+                        data = f.read(min(CHUNK_SIZE, remaining))
+                        if not data:
+                            # The file shrunk while it was sent, the size in the header is kept
+                            data = b"\0" * remaining
+                        buffer += data
+                        remaining -= len(data)
+                buffer += BuildContext.padding(info.size)
+            if len(buffer) >= CHUNK_SIZE:
+                yield bytes(buffer)
+                buffer.clear()
+
+        if self.dockerfile_name() == EXTERNAL_DOCKERFILE:
+            content = self.dockerfile.read_bytes()
+            info = tarfile.TarInfo(EXTERNAL_DOCKERFILE)
+            info.size = len(content)
+            info.mode = 0o644
+            info.mtime = int(self.dockerfile.stat().st_mtime)
+            buffer += BuildContext.encode(info) + content + BuildContext.padding(len(content))
+
+        buffer += b"\0" * (2 * tarfile.BLOCKSIZE)
+        yield bytes(buffer)
+
+class EngineClient:
+    '''
+    Client of the Docker Engine HTTP API over its unix socket. Connections are kept open and reused between requests,
+    and can be used from several threads at the same time, each request taking its own connection from the pool.
+
+    Responses of builds and pushes are streams of JSON messages, which are passed on as output while they arrive.
+    '''
+    def __init__(self, host: Optional[str] = None, timeout: Optional[float] = None, max_idle: int = MAX_IDLE_CONNECTIONS):
+        self.path = EngineClient.socket_path(host)
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.idle: List[UnixHTTPConnection] = []
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def socket_path(host: Optional[str] = None) -> str:
+        '''
+        Path of the socket of the daemon, from a unix:// address or path, falling back to DOCKER_HOST and the default socket
+        '''
+        if not host:
+            host = os.environ.get("DOCKER_HOST") or DEFAULT_SOCKET
+        if host.startswith("unix://"):
+            return host[len("unix://"):]
+        if "://" in host:
+            raise ValueError(f"Only unix sockets are supported by the engine backend, not {host}")
+        return host
+
+    def connection(self) -> UnixHTTPConnection:
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        return UnixHTTPConnection(self.path, self.timeout)
+
+    def release(self, connection: UnixHTTPConnection, response: Optional[http.client.HTTPResponse]):
+        '''
+        Return a connection to the pool, if its response was read completely and the daemon keeps it open
+        '''
+        if response is not None and response.isclosed() and not response.will_close:
+            with self.lock:
+                if len(self.idle) < self.max_idle:
+                    self.idle.append(connection)
+                    return
+        connection.close()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            connection.close()
+
+    def send(self, method: str, target: str, body: Body, headers: Dict[str, str], operation: Optional[EngineOperation]) -> Tuple[UnixHTTPConnection, http.client.HTTPResponse]:
+        # A connection from the pool may have been closed by the daemon in the meantime, the request is then sent again on a new one
+        retry = True
+        while True:
+            connection = self.connection()
+            reused = connection.sock is not None
+            try:
+                if operation is not None:
+                    operation.attach(connection)
+                connection.request(method, target, body=body() if callable(body) else body, headers=headers)
+                return connection, connection.getresponse()
+            except EngineError:
+                connection.close()
+                raise
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                if operation is not None:
+                    operation.detach()
+                    if operation.cancelled:
+                        raise EngineError("Request was cancelled") from e
+                if reused and retry and isinstance(e, (ConnectionError, http.client.BadStatusLine)):
+                    retry = False
+                    continue
+                raise EngineError(f"Could not connect to the Docker Engine at {self.path}: {e}") from e
+
+    def request(self, method: str, path: str, params: Optional[List[Tuple[str, str]]] = None, body: Body = None, headers: Optional[Dict[str, str]] = None, operation: Optional[EngineOperation] = None) -> Iterator[dict]:
+        '''
+        Send a request, and yield the JSON messages of the response as they arrive.
+        A body that is generated while it is sent is given as a function returning the chunks
+        '''
+        target = path + (f"?{urlencode(params)}" if params else "")
+        connection, response = self.send(method, target, body, headers or {}, operation)
+        try:
+            if response.status >= 400:
+                raise EngineError(EngineClient.error_message(response))
+            yield from EngineClient.messages(response)
+        except (OSError, http.client.HTTPException) as e:
+            if operation is not None and operation.cancelled:
+                raise EngineError("Request was cancelled") from e
+            raise EngineError(f"Connection to the Docker Engine at {self.path} failed: {e}") from e
+        finally:
+            if operation is not None:
+                operation.detach()
+            self.release(connection, response)
+
+    @staticmethod
+    def error_message(response: http.client.HTTPResponse) -> str:
+        content = response.read()
+        try:
+            message = json.loads(content)["message"]
+        except (ValueError, KeyError, TypeError):
+            message = content.decode(errors="replace").strip()
+        return f"Docker Engine returned {response.status} {response.reason}: {message}"
+
+    @staticmethod
+    def messages(response: http.client.HTTPResponse) -> Iterator[dict]:
+        '''
+        Decode the stream of JSON messages of a response, which are not guaranteed to be split on newlines
+        '''
+        decoder = json.JSONDecoder()
+        text = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        buffer = ""
+        while True:
+            chunk = response.read1(CHUNK_SIZE)
+            buffer += text.decode(chunk, final=not chunk)
+            while True:
+                buffer = buffer.lstrip()
+                if not buffer:
+                    break
+                try:
+                    message, end = decoder.raw_decode(buffer)
+                except ValueError:
+                    break
+                buffer = buffer[end:]
+                if isinstance(message, dict):
+                    yield message
+            if not chunk:
+                break
+            if len(buffer) > MAX_MESSAGE_BYTES:
+                raise EngineError("Docker Engine sent an invalid response")
+        if buffer:
+            raise EngineError("Docker Engine sent an incomplete response")
+
+    @staticmethod
+    def raise_error(message: dict):
+        if message.get("error") or message.get("errorDetail"):
+            detail = message.get("errorDetail") or {}
+            raise EngineError(detail.get("message") or message.get("error") or "Unknown error")
+
+    @staticmethod
+    def status_line(message: dict) -> Optional[bytes]:
+        '''
+        Line of output for a status message. Progress updates are left out, as they are sent many times a second
+        '''
+        if "status" not in message or message.get("progressDetail"):
+            return None
+        line = f"{message['id']}: {message['status']}" if message.get("id") else message["status"]
+        return f"{line}\n".encode()
+
+    def build(self, context: Path, dockerfile: Path, tags: List[str], labels: Optional[Dict[str, str]] = None, write: Optional[Callable[[bytes], None]] = None, operation: Optional[EngineOperation] = None) -> str:
+        '''
+        Build an image from a build context directory, which is sent to the daemon as a tar archive. Returns the ID of the image
+        '''
+        if not Path(context).is_dir():
+            raise EngineError(f"Build context {context} is not a directory")
+        archive = BuildContext(context, dockerfile)
+        params = [("t", tag) for tag in tags] + [("dockerfile", archive.dockerfile_name()), ("rm", "1"), ("forcerm", "1")]
+        if labels:
+            params.append(("labels", json.dumps(labels)))
+
+        image_id = None
+        for message in self.request("POST", "/build", params, archive.chunks, {"Content-Type": "application/x-tar"}, operation):
+            EngineClient.raise_error(message)
+            if write is not None and isinstance(message.get("stream"), str):
+                write(message["stream"].encode())
+            elif write is not None and EngineClient.status_line(message):
+                write(EngineClient.status_line(message))
+            aux = message.get("aux")
+            if isinstance(aux, dict) and aux.get("ID"):
+                image_id = aux["ID"]
+
+        if image_id is None:
+            raise EngineError("Docker Engine did not report the ID of the built image")
+        return image_id
+
+    def push(self, image: str, tag: str, auth: Optional[dict] = None, write: Optional[Callable[[bytes], None]] = None, operation: Optional[EngineOperation] = None) -> Optional[str]:
+        '''
+        Push a tag of an image. Returns the digest of the pushed manifest, if the daemon reports it
+        '''
+        if auth is None:
+            auth = EngineClient.credentials(EngineClient.registry(image))
+        headers = {"X-Registry-Auth": EngineClient.encode_auth(auth)}
+
+        digest = None
+        for message in self.request("POST", f"/images/{quote(image, safe='/:')}/push", [("tag", tag)], None, headers, operation):
+            EngineClient.raise_error(message)
+            if write is not None and EngineClient.status_line(message):
+                write(EngineClient.status_line(message))
+            aux = message.get("aux")
+            if isinstance(aux, dict) and aux.get("Digest"):
+                digest = aux["Digest"]
+        return digest
+
+    @staticmethod
+    def registry(image: str) -> str:
+        first, _, rest = image.partition("/")
+        if rest and ("." in first or ":" in first or first == "localhost"):
+            return first
+        return "docker.io"
+
+    @staticmethod
+    def config_path() -> Path:
+        return Path(os.environ.get("DOCKER_CONFIG") or Path.home().joinpath(".docker")).joinpath("config.json")
+
+    @staticmethod
+    def credentials(registry: str, config: Optional[Path] = None) -> dict:
+        '''
+        Credentials of a registry stored in the configuration of the Docker CLI by 'docker login'.
+        Credential helpers are not supported, pushes to registries using them are sent without credentials
+        '''
+        try:
+            with open(config or EngineClient.config_path(), "r") as f:
+                auths = json.load(f).get("auths") or {}
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+        hosts = [registry] + (["index.docker.io", "registry-1.docker.io"] if registry == "docker.io" else [])
+        for address, entry in auths.items():
+            host = address.split("://")[-1].split("/")[0]
+            if host not in hosts or not isinstance(entry, dict):
+                continue
+            if entry.get("identitytoken"):
+                return {"identitytoken": entry["identitytoken"], "serveraddress": address}
+            if entry.get("auth"):
+                try:
+                    username, _, password = base64.b64decode(entry["auth"]).decode().partition(":")
+                except ValueError:
+                    continue
+                return {"username": username, "password": password, "serveraddress": address}
+        return {}
+
+    @staticmethod
+    def encode_auth(auth: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(auth).encode()).decode()
@@ -0,0 +1,223 @@
+import os
+import re
+import json
+import hashlib
+
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from .utils import Utils
+from .version import file_lock
+
+# Bump when the way fingerprints are computed changes, to invalidate stored fingerprints
+FINGERPRINT_VERSION = 1
+
+# Image label the fingerprint of the build context is stored in
+FINGERPRINT_LABEL = "ctfpilot.context-fingerprint"
+
+class DockerIgnore:
+    '''
+    Matcher for .dockerignore patterns, following the semantics of the Docker CLI.
+
+    Patterns are matched against paths relative to the build context. A path is excluded if the last
+    pattern matching it, or one of its parent directories, is not an exception (prefixed with "!").
+    '''
+    def __init__(self, lines: List[str]):
+        self.patterns: List[Tuple[re.Pattern, bool]] = []
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            exception = line.startswith("!")
+            if exception:
+                line = line[1:].strip()
+
+            pattern = os.path.normpath(line).replace(os.sep, "/").lstrip("/")
+            if pattern in ["", "."]:
+                continue
+            self.patterns.append((DockerIgnore.compile(pattern), exception))
+
+        self.has_exceptions = any(exception for _, exception in self.patterns)
+
+    @staticmethod
+    def load(context: Path, dockerfile: Optional[Path] = None) -> "DockerIgnore":
+        '''
+        Load the ignore file of a build context. A "<Dockerfile>.dockerignore" file next to the Dockerfile takes precedence
+        '''
+        candidates = [context.joinpath(".dockerignore")]
+        if dockerfile is not None:
+            candidates.insert(0, dockerfile.with_name(f"{dockerfile.name}.dockerignore"))
+
+        for candidate in candidates:
+            if candidate.is_file():
+                return DockerIgnore(candidate.read_text().splitlines())
+        return DockerIgnore([])
+
+    @staticmethod
+    def compile(pattern: str) -> re.Pattern:
+        expression = ""
+        i = 0
+        while i < len(pattern):
+            char = pattern[i]
+            if char == "*":
+                if pattern[i + 1:i + 2] == "*":
+                    i += 1
+                    if pattern[i + 1:i + 2] == "/":
+                        # "**/" matches zero or more directories
+                        i += 1
+                        expression += "(?:.*/)?"
+                    else:
+                        expression += ".*"
+                else:
+                    expression += "[^/]*"
+            elif char == "?":
+                expression += "[^/]"
+            elif char == "[":
+                end = pattern.find("]", i + 1)
+                if end == -1:
+                    expression += re.escape(char)
+                else:
+                    content = pattern[i + 1:end]
+                    if content.startswith("!") or content.startswith("^"):
+                        content = "^" + content[1:]
+                    expression += f"[{content}]"
+                    i = end
+            elif char == "\\" and i + 1 < len(pattern):
+                i += 1
+                expression += re.escape(pattern[i])
+            else:
+                expression += re.escape(char)
+            i += 1
+        return re.compile(f"^{expression}$")
+
+    def matches(self, path: str) -> bool:
+        '''
+        Check if a path, relative to the context and separated by "/", is excluded
+        '''
+        parents = []
+        parts = path.split("/")
+        for index in range(1, len(parts)):
+            parents.append("/".join(parts[:index]))
+
+        excluded = False
+        for pattern, exception in self.patterns:
+            if pattern.match(path) or any(pattern.match(parent) for parent in parents):
+                excluded = not exception
+        return excluded
+
+def context_files(context: Path, ignore: DockerIgnore, directories: bool = False) -> List[str]:
+    '''
+    List the files of a build context that are sent to Docker, relative to the context and sorted.
+    With directories, directories that are not excluded are listed as well
+    '''
+    files = []
+    for root, subdirectories, names in os.walk(context):
+        relative_root = Path(root).relative_to(context).as_posix()
+        prefix = "" if relative_root == "." else f"{relative_root}/"
+
+        if not ignore.has_exceptions:
+            # Without exceptions, nothing within an excluded directory can be included again
+            subdirectories[:] = [directory for directory in subdirectories if not ignore.matches(prefix + directory)]
+
+        for name in names:
+            if not ignore.matches(prefix + name):
+                files.append(prefix + name)
+        # Symbolic links to directories are sent as links, and not followed
+        for directory in subdirectories:
+            if (directories or os.path.islink(os.path.join(root, directory))) and not ignore.matches(prefix + directory):
+                files.append(prefix + directory)
+    return sorted(files)
+
+def context_fingerprint(dockerfile: Path, context: Path, exclude: Optional[Set[Path]] = None) -> str:
+    '''
+    Fingerprint of a Docker build: the Dockerfile, and the path, mode and content of every file in the context
+    that is not excluded by .dockerignore. Files in exclude are left out, even if they are in the context
+    '''
+    digest = hashlib.sha256()
+    digest.update(f"ctfpilot-fingerprint-{FINGERPRINT_VERSION}\0".encode())
+
+    digest.update(b"dockerfile\0")
+    with open(dockerfile, "rb") as f:
+        digest.update(hashlib.sha256(f.read()).digest())
+
+    if not context.is_dir():
+        digest.update(b"missing-context\0")
+        return digest.hexdigest()
+
+    excluded = {path.resolve() for path in exclude or set()}
+    for file in context_files(context, DockerIgnore.load(context, dockerfile)):
+        path = context.joinpath(file)
+        if path.resolve() in excluded:
+            continue
+
+        digest.update(file.encode())
+        digest.update(b"\0")
+        if path.is_symlink():
+            digest.update(b"link\0")
+            digest.update(os.readlink(path).encode())
+        else:
+            # Only the executable bit is meaningful for the content of an image
+            digest.update(b"x\0" if os.access(path, os.X_OK) else b"f\0")
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class BuildState:
+    '''
+    Fingerprints of the last successful build of each image, stored in the cache directory of the repository.
+
+    Concurrent runs share the file, so only the images recorded by this run are merged into it when saving
+    '''
+    file_name = "pipeline-state.json"
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path is not None else Utils.get_cache_dir().joinpath(self.file_name)
+        self.recorded: Dict[str, dict] = {}
+        self.images = self.read()
+
+    def lock_path(self) -> Path:
+        return self.path.parent.joinpath("locks", f"{self.path.stem}.lock")
+
+    def read(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data["images"] if isinstance(data, dict) and isinstance(data.get("images"), dict) else {}
+
+    def unchanged(self, fingerprints: Dict[str, str]) -> bool:
+        '''
+        Check if every image was last built successfully from the same fingerprint
+        '''
+        return bool(fingerprints) and all(
+            self.images.get(image, {}).get("fingerprint") == fingerprint for image, fingerprint in fingerprints.items()
+        )
+
+    def record(self, image: str, fingerprint: str, version: int, duration: Optional[float] = None):
+        self.images[image] = {"fingerprint": fingerprint, "version": version}
+        if duration is not None:
+            self.images[image]["duration"] = round(duration, 3)
+        self.recorded[image] = self.images[image]
+
+    def duration(self, image: str) -> Optional[float]:
+        '''
+        Seconds the last successful build and push of an image took, if known
+        '''
+        duration = self.images.get(image, {}).get("duration")
+        return float(duration) if isinstance(duration, (int, float)) else None
+
+    def save(self):
+        '''
+        Merge the images recorded by this run into the images saved by other runs since the state was read
+        '''
+        with file_lock(self.lock_path()):
+            self.images = {**self.read(), **self.recorded}
+            temporary = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with open(temporary, "w") as f:
+                json.dump({"version": FINGERPRINT_VERSION, "images": self.images}, f, indent=2, sort_keys=True)
+                f.write("\n")
+            os.replace(temporary, self.path)
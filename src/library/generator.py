@@ -7,6 +7,7 @@ from pathlib import Path
 from .data import Challenge, Page
 from .utils import Utils
 from .config import CHALLENGE_SCHEMA
+from .template import TemplateCache
 
 class Generator:
     challenge: Challenge
@@ -259,8 +260,8 @@ This file should contain the steps to solve the challenge.""")
         return True
     
     def instanced_template_source_file_exists(self):
-        return self.check_if_dir_exists(os.path.join(Utils.get_template_dir(), "instanced-web-k8s.yml")) and \
-               self.check_if_dir_exists(os.path.join(Utils.get_template_dir(), "instanced-tcp-k8s.yml"))
+        return TemplateCache.exists(os.path.join(Utils.get_template_dir(), "instanced-web-k8s.yml")) and \
+               TemplateCache.exists(os.path.join(Utils.get_template_dir(), "instanced-tcp-k8s.yml"))
     
     def instanced_template_file_exists(self):
         return self.check_if_dir_exists(os.path.join(self.dir_template, "k8s.yml"))
@@ -290,9 +291,7 @@ This file should contain the steps to solve the challenge.""")
             return False
 
         output_file = os.path.join(self.dir_template, "k8s.yml")
-        with open(source_file, "r") as f:
-            with open(output_file, "w") as of:
-                of.write(f.read())
+        self.write_file(output_file, TemplateCache.get(source_file).source)
         
         print(f"File created: {output_file}")
         
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import hashlib
+
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .utils import Utils
+from .data import Challenge, Page
+from .config import CHALLENGE_SCHEMA, PAGE_SCHEMA
+
+# Bump when the stored data changes format, to invalidate existing indexes
+INDEX_VERSION = 1
+
+# Files modified this recently may still change without a visible change in modification time
+RACY_SECONDS = 2
+
+class ChallengeIndex:
+    '''
+    Persistent index of the parsed challenge and page definitions in the repository.
+
+    The validated data of every definition file is stored in the cache directory of the repository,
+    keyed by the directory of the challenge or page. An entry is reused while the modification time and size
+    of the file are unchanged, or when its content hash still matches, so only changed files are parsed again.
+    '''
+    file_name = "index.json"
+    instances: Dict[str, "ChallengeIndex"] = {}
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path is not None else Utils.get_cache_dir().joinpath(self.file_name)
+        self.entries: Dict[str, dict] = {}
+        self.changed = False
+        self.load()
+
+    @staticmethod
+    def shared() -> "ChallengeIndex":
+        '''
+        Get the index of the current repository, loaded once per process
+        '''
+        path = Utils.get_cache_dir().joinpath(ChallengeIndex.file_name)
+        key = str(path)
+        if key not in ChallengeIndex.instances:
+            ChallengeIndex.instances[key] = ChallengeIndex(path)
+        return ChallengeIndex.instances[key]
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if isinstance(data, dict) and data.get("version") == INDEX_VERSION and isinstance(data.get("entries"), dict):
+            self.entries = data["entries"]
+
+    def save(self):
+        '''
+        Write the index if it changed. The index is only a cache, so failing to write it is not an error
+        '''
+        if not self.changed:
+            return
+
+        temporary = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(temporary, "w") as f:
+                json.dump({"version": INDEX_VERSION, "entries": self.entries}, f, separators=(",", ":"))
+            # Atomic, so parallel processes never read a partially written index
+            os.replace(temporary, self.path)
+            self.changed = False
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+
+    @staticmethod
+    def hash_file(path: Path) -> str:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    @staticmethod
+    def stat_key(stat: os.stat_result) -> int:
+        '''
+        Modification time to store for a file. Recently modified files are stored without one, so they are always hashed
+        '''
+        if time.time_ns() - stat.st_mtime_ns < RACY_SECONDS * 1_000_000_000:
+            return 0
+        return stat.st_mtime_ns
+
+    @staticmethod
+    def parse(kind: str, file: Path) -> dict:
+        '''
+        Parse and validate a definition file, returning the normalized data of it
+        '''
+        if kind == "page":
+            loader, schema = Page, PAGE_SCHEMA
+        else:
+            loader, schema = Challenge, CHALLENGE_SCHEMA
+
+        if file.name.endswith(".json"):
+            loaded = loader.load_from_json(Utils.load_json(file))
+        else:
+            loaded = loader.load_from_yaml(Utils.load_yaml(file))
+        return loaded.generate_dict(schema)
+
+    def lookup(self, kind: str, directory: Path) -> Optional[dict]:
+        '''
+        Get the data of a challenge or page directory, parsing the definition file only if it changed
+        '''
+        directory = Path(directory)
+        try:
+            key = f"{kind}:{directory.relative_to(Utils.get_repo_dir()).as_posix()}"
+        except ValueError:
+            key = f"{kind}:{directory.absolute().as_posix()}"
+
+        file = Utils.find_definition_file(directory)
+        if file is None:
+            if self.entries.pop(key, None) is not None:
+                self.changed = True
+            return None
+
+        stat = file.stat()
+        entry = self.entries.get(key)
+        if entry is not None and entry["file"] == file.name:
+            if entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                return entry["data"]
+
+            # Content may be unchanged, for example after a checkout
+            sha256 = self.hash_file(file)
+            if entry["sha256"] == sha256:
+                mtime_ns = self.stat_key(stat)
+                if entry["mtime_ns"] != mtime_ns or entry["size"] != stat.st_size:
+                    entry["mtime_ns"], entry["size"] = mtime_ns, stat.st_size
+                    self.changed = True
+                return entry["data"]
+        else:
+            sha256 = self.hash_file(file)
+
+        data = self.parse(kind, file)
+        self.entries[key] = {
+            "file": file.name,
+            "mtime_ns": self.stat_key(stat),
+            "size": stat.st_size,
+            "sha256": sha256,
+            "data": data,
+        }
+        self.changed = True
+        return data
+
+    def challenge(self, directory: Path) -> Optional[Challenge]:
+        data = self.lookup("challenge", directory)
+        self.save()
+        return Challenge.load_from_json(data) if data is not None else None
+
+    def page(self, directory: Path) -> Optional[Page]:
+        data = self.lookup("page", directory)
+        self.save()
+        return Page.load_from_json(data) if data is not None else None
+
+    def refresh(self, challenges: Optional[List[str]] = None, pages: Optional[List[str]] = None) -> Dict[str, str]:
+        '''
+        Bring the entries of the given challenges and pages up to date, and write the index once.
+        Defaults to every challenge and page in the repository. Returns the errors of invalid definitions by name
+        '''
+        errors = {}
+        for challenge in Utils.list_challenges() if challenges is None else challenges:
+            directory = Utils.get_challenges_dir().joinpath(challenge)
+            if not directory.is_dir():
+                continue
+            try:
+                self.lookup("challenge", directory)
+            except Exception as e:
+                errors[challenge] = str(e) or e.__class__.__name__
+
+        for page in Utils.list_pages() if pages is None else pages:
+            directory = Utils.get_pages_dir().joinpath(page)
+            if not directory.is_dir():
+                continue
+            try:
+                self.lookup("page", directory)
+            except Exception as e:
+                errors[page] = str(e) or e.__class__.__name__
+
+        self.save()
+        return errors
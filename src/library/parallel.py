@@ -0,0 +1,83 @@
+import io
+import os
+import traceback
+
+from contextlib import redirect_stdout, redirect_stderr
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Tuple
+
+@dataclass
+class Task:
+    name: str
+    function: Callable
+    args: Tuple = field(default_factory=tuple)
+
+@dataclass
+class TaskResult:
+    name: str
+    success: bool
+    value: Any = None
+    output: str = ""
+    error: Optional[str] = None
+
+def default_jobs() -> int:
+    return os.cpu_count() or 1
+
+def run_task(task: Task, capture: bool = True) -> TaskResult:
+    '''
+    Run a single task, catching errors and exits so one task cannot stop the others.
+    When capture is enabled, stdout and stderr of the task are collected into the result.
+    '''
+    buffer = io.StringIO()
+    value = None
+    error = None
+
+    try:
+        if capture:
+            with redirect_stdout(buffer), redirect_stderr(buffer):
+                value = task.function(*task.args)
+        else:
+            value = task.function(*task.args)
+    except SystemExit as e:
+        if e.code is not None and e.code != 0:
+            error = f"Exited with code {e.code}"
+    except Exception as e:
+        if capture:
+            buffer.write(traceback.format_exc())
+        error = str(e) or e.__class__.__name__
+
+    return TaskResult(task.name, error is None, value, buffer.getvalue(), error)
+
+class ParallelExecutor:
+    '''
+    Run independent tasks in a process pool.
+
+    Output of each task is captured and printed in submission order once the task
+    is done, so logs are deterministic regardless of how the tasks are scheduled.
+    '''
+    def __init__(self, jobs: Optional[int] = None):
+        self.jobs = max(1, jobs or default_jobs())
+
+    def run(self, tasks: List[Task]) -> List[TaskResult]:
+        if self.jobs == 1 or len(tasks) <= 1:
+            # No need for a pool, run in-process and let output stream directly
+            return [run_task(task, capture=False) for task in tasks]
+
+        # Imported on first use, as the pool is only needed when running in parallel
+        from concurrent.futures import ProcessPoolExecutor
+
+        results = []
+        with ProcessPoolExecutor(max_workers=min(self.jobs, len(tasks))) as pool:
+            futures = [pool.submit(run_task, task) for task in tasks]
+            for task, future in zip(tasks, futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker itself failed, for example if it was killed
+                    result = TaskResult(task.name, False, error=f"Worker failed: {e}")
+
+                if result.output:
+                    print(result.output, end="" if result.output.endswith("\n") else "\n", flush=True)
+                results.append(result)
+
+        return results
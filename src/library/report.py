@@ -0,0 +1,133 @@
+import os
+import json
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+REPORT_VERSION = 1
+
+# Prefix of every metric in the OpenMetrics output
+METRIC_PREFIX = "ctfpilot_pipeline"
+
+class RunReport:
+    '''
+    Timings and outcome of a pipeline run: monotonic durations of each phase of the run, and the result of every image,
+    written as a JSON report or an OpenMetrics textfile, for tracking build times across CI runs
+    '''
+    def __init__(self):
+        self.started_at = time.time()
+        self.start = time.monotonic()
+        self.status = "running"
+        self.phases: Dict[str, float] = {}
+        self.challenges: Dict[str, dict] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        '''
+        Time a phase of the run. Phases entered more than once add up
+        '''
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.monotonic() - start
+
+    def challenge(self, key: str) -> dict:
+        return self.challenges.setdefault(key, {"challenge": key, "status": "running", "version": None, "images": []})
+
+    def add_image(self, key: str, image: dict):
+        self.challenge(key)["images"].append(image)
+
+    def duration(self) -> float:
+        return time.monotonic() - self.start
+
+    def to_dict(self) -> dict:
+        return {
+            "version": REPORT_VERSION,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration": self.duration(),
+            "phases": dict(self.phases),
+            "challenges": list(self.challenges.values()),
+        }
+
+    @staticmethod
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    @staticmethod
+    def number(value: float) -> str:
+        '''
+        Render a sample value without losing precision, such as the fraction of an epoch timestamp
+        '''
+        if isinstance(value, int) or float(value).is_integer():
+            return str(int(value))
+        return repr(float(value))
+
+    @staticmethod
+    def sample(name: str, labels: Dict[str, object], value: float) -> str:
+        rendered = ",".join(f"{key}=\"{RunReport.escape(label)}\"" for key, label in labels.items())
+        number = RunReport.number(value)
+        return f"{METRIC_PREFIX}_{name}{{{rendered}}} {number}" if rendered else f"{METRIC_PREFIX}_{name} {number}"
+
+    def openmetrics(self) -> str:
+        families: Dict[str, List[str]] = {}
+        units = {}
+        helps = {}
+
+        def add(name: str, help: str, labels: Dict[str, object], value: Optional[float], unit: Optional[str] = None):
+            if value is None:
+                return
+            helps[name] = help
+            if unit:
+                units[name] = unit
+            families.setdefault(name, []).append(RunReport.sample(name, labels, value))
+
+        add("run_timestamp_seconds", "Start of the pipeline run", {}, self.started_at, "seconds")
+        add("run_duration_seconds", "Duration of the pipeline run", {"status": self.status}, self.duration(), "seconds")
+        for phase, duration in self.phases.items():
+            add("phase_duration_seconds", "Duration of a phase of the pipeline run", {"phase": phase}, duration, "seconds")
+
+        for key, challenge in self.challenges.items():
+            add("challenge_success", "Whether the challenge was built and pushed, or unchanged", {"challenge": key}, 1 if challenge["status"] in ["success", "unchanged"] else 0)
+            add("challenge_version", "Version the images of the challenge are tagged with", {"challenge": key}, challenge["version"])
+            for image in challenge["images"]:
+                labels = {"challenge": key, "identifier": image["identifier"], "image": image["image"]}
+                add("image_success", "Whether the image was built and pushed", labels, 1 if image["success"] else 0)
+                add("image_exit_code", "Exit code of the failed docker command of the image", labels, image.get("exit_code"))
+                for phase in ["build", "push"]:
+                    add("image_phase_duration_seconds", "Duration of building or pushing the image", {**labels, "phase": phase}, image.get(f"{phase}_duration"), "seconds")
+                add("image_duration_seconds", "Duration of building and pushing the image", labels, image.get("duration"), "seconds")
+                stats = image.get("build_stats") or {}
+                add("image_cache_hit_ratio", "Share of the Dockerfile steps of the image that were cached", labels, stats.get("cache_hit_ratio"))
+                add("image_context_bytes", "Size of the build context sent to BuildKit", labels, stats.get("context_bytes"), "bytes")
+
+        lines = []
+        for name, samples in families.items():
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+            if name in units:
+                lines.append(f"# UNIT {METRIC_PREFIX}_{name} {units[name]}")
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {helps[name]}")
+            lines += samples
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def write(path: Path, content: str):
+        '''
+        Write a report atomically, so collectors never read a partial file
+        '''
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(temporary, "w") as f:
+            f.write(content)
+        os.replace(temporary, path)
+
+    def write_json(self, path: Path):
+        RunReport.write(path, json.dumps(self.to_dict(), indent=2) + "\n")
+
+    def write_openmetrics(self, path: Path):
+        RunReport.write(path, self.openmetrics())
@@ -0,0 +1,128 @@
+import os
+import re
+
+from typing import Dict, List, Optional, Tuple, Union
+
+# Variables may be written as "{{ KEY }}", "{{KEY}}", "{ { KEY } }" or "{ {KEY} }".
+# Blocks are written as "%%KEY%%", and are replaced including the indentation in front of them.
+# Every alternative starts with a literal character, so the pattern can skip ahead quickly to the next candidate.
+TOKEN_PATTERN = re.compile(
+    r'%%(?P<block_key>[A-Za-z0-9_]+)%%'
+    r'|\{\{ (?P<key_1>[A-Za-z0-9_]+) \}\}'
+    r'|\{\{(?P<key_2>[A-Za-z0-9_]+)\}\}'
+    r'|\{ \{ (?P<key_3>[A-Za-z0-9_]+) \} \}'
+    r'|\{ \{(?P<key_4>[A-Za-z0-9_]+)\} \}'
+)
+
+VARIABLE = 1
+BLOCK = 2
+
+# A token is either literal text, or a tuple of (kind, key, raw text)
+Token = Union[str, Tuple[int, str, str]]
+
+class Template:
+    '''
+    Template compiled into tokens once, which can then be rendered in a single pass.
+
+    Variables are replaced by their value. Blocks are replaced by their content, which should already be indented,
+    and variables within block content are rendered as well. Unknown variables and blocks are left as is.
+    '''
+    def __init__(self, source: str):
+        self.source = source
+        self.tokens = Template.tokenize(source)
+
+    @staticmethod
+    def tokenize(source: str, blocks: bool = True) -> List[Token]:
+        tokens: List[Token] = []
+        position = 0
+
+        for match in TOKEN_PATTERN.finditer(source):
+            block_key = match.group("block_key")
+            if block_key is not None and not blocks:
+                continue
+
+            start = match.start()
+            if block_key is not None:
+                # The indentation in front of the block is part of the block
+                while start > position and source[start - 1] in " \t":
+                    start -= 1
+
+            if start > position:
+                tokens.append(source[position:start])
+
+            if block_key is not None:
+                tokens.append((BLOCK, block_key, source[start:match.end()]))
+            else:
+                key = match.group("key_1") or match.group("key_2") or match.group("key_3") or match.group("key_4")
+                tokens.append((VARIABLE, key, match.group(0)))
+            position = match.end()
+
+        if position < len(source):
+            tokens.append(source[position:])
+
+        return tokens
+
+    @staticmethod
+    def render_tokens(tokens: List[Token], values: Dict[str, str], blocks: Dict[str, str], parts: List[str]):
+        for token in tokens:
+            if isinstance(token, str):
+                parts.append(token)
+                continue
+
+            kind, key, raw = token
+            if kind == VARIABLE:
+                parts.append(values.get(key, raw))
+            elif key in blocks:
+                # Only variables are rendered within block content
+                Template.render_tokens(Template.tokenize(blocks[key], blocks=False), values, {}, parts)
+            else:
+                parts.append(raw)
+
+    def render(self, values: Dict[str, str], blocks: Optional[Dict[str, str]] = None) -> str:
+        parts: List[str] = []
+        Template.render_tokens(self.tokens, values, blocks or {}, parts)
+        return "".join(parts)
+
+    @staticmethod
+    def indent(content: str, indentation: str = "    ") -> str:
+        '''
+        Indent every line of content, for use as block content
+        '''
+        return "".join([indentation + line + "\n" for line in content.splitlines()])
+
+class TemplateCache:
+    '''
+    Process-wide cache of compiled template files.
+
+    Entries are keyed by the absolute path of the file, and are reloaded when the modification time or size of the file changes.
+    '''
+    entries: Dict[str, Tuple[int, int, Template]] = {}
+
+    @staticmethod
+    def get(path: Union[str, os.PathLike]) -> Template:
+        '''
+        Get the compiled template of a file. Raises OSError if the file cannot be read
+        '''
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+
+        entry = TemplateCache.entries.get(key)
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+
+        with open(key, "r") as f:
+            template = Template(f.read())
+        TemplateCache.entries[key] = (stat.st_mtime_ns, stat.st_size, template)
+        return template
+
+    @staticmethod
+    def exists(path: Union[str, os.PathLike]) -> bool:
+        try:
+            TemplateCache.get(path)
+        except OSError:
+            return False
+        return True
+
+    @staticmethod
+    def clear():
+        TemplateCache.entries.clear()
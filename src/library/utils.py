@@ -1,9 +1,19 @@
 from pathlib import Path
-from slugify import slugify
-import yaml
+from typing import List, Optional
+import re
 import json
 
-from .config import CHALLENGE_REPO_ROOT
+from .config import CHALLENGE_REPO_ROOT, CACHE_DIR_NAME
+
+# Strings with characters outside this set may be emitted differently by the libyaml and pure-Python dumpers,
+# as they can be emitted as double-quoted scalars, which the two dumpers fold differently.
+# This includes line breaks, control characters, the byte order mark and characters outside the basic multilingual plane.
+YAML_C_DUMPER_SAFE = re.compile('[\x20-\x7e\xa0-\u2027\u202a-\ud7ff\ue000-\ufefe\uff00-\ufffd]*')
+
+# Mapping keys are emitted as explicit "? key" entries by the pure-Python dumper when they are empty or at least 123 characters long,
+# counting the tag, and by the libyaml dumper when they are longer than 128 bytes once encoded.
+# Keys shorter than this many bytes are emitted as simple keys by both dumpers.
+YAML_C_DUMPER_SIMPLE_KEY_BYTES = 123
 
 class Utils:
     @staticmethod
@@ -53,12 +63,58 @@ class Utils:
     @staticmethod
     def get_template_dir() -> Path:
         return Utils.get_repo_dir().joinpath('template')
-        
+
+    @staticmethod
+    def get_cache_dir() -> Path:
+        return Utils.get_repo_dir().joinpath(CACHE_DIR_NAME)
+
+    @staticmethod
+    def find_definition_file(directory: Path) -> Optional[Path]:
+        '''
+        Find the yml or json definition file of a challenge or page directory
+        '''
+        for file in Path(directory).iterdir():
+            if file.is_file() and (file.name.endswith(".yml") or file.name.endswith(".yaml") or file.name.endswith(".json")):
+                return file
+        return None
+
+    @staticmethod
+    def list_challenges() -> List[str]:
+        '''
+        List all challenges in the repository, in the format 'category/slug'
+        '''
+        challenges_dir = Utils.get_challenges_dir()
+        if not challenges_dir.is_dir():
+            return []
+
+        challenges = []
+        for category in sorted(challenges_dir.iterdir()):
+            if not category.is_dir() or category.name.startswith("."):
+                continue
+            for challenge in sorted(category.iterdir()):
+                if challenge.is_dir() and not challenge.name.startswith("."):
+                    challenges.append(f"{category.name}/{challenge.name}")
+        return challenges
+
+    @staticmethod
+    def list_pages() -> List[str]:
+        '''
+        List all pages in the repository, by their slug
+        '''
+        pages_dir = Utils.get_pages_dir()
+        if not pages_dir.is_dir():
+            return []
+
+        return [page.name for page in sorted(pages_dir.iterdir()) if page.is_dir() and not page.name.startswith(".")]
+
     @staticmethod
     def slugify(text):
         if text is None:
             return None
         
+        # Imported on first use, as it is slow to import and not needed by every command
+        from slugify import slugify
+        
         return slugify(text.strip()).strip('-').strip('_').strip('.')
     
     @staticmethod
@@ -79,8 +135,51 @@ class Utils:
     
     @staticmethod
     def load_yaml(file):
+        # Imported on first use, as it is slow to import and not needed by every command
+        import yaml
+        
+        # Use libyaml when PyYAML was built with it
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
         with open(file, 'r') as f:
-            return yaml.safe_load(f)
+            return yaml.load(f, Loader=loader)
+    
+    @staticmethod
+    def yaml_c_dumper_safe(data) -> bool:
+        '''
+        Check if the libyaml dumper emits data identically to the pure-Python dumper
+        '''
+        if isinstance(data, str):
+            return YAML_C_DUMPER_SAFE.fullmatch(data) is not None
+        if isinstance(data, dict):
+            return all(Utils.yaml_c_dumper_safe_key(key) and Utils.yaml_c_dumper_safe(value) for key, value in data.items())
+        if isinstance(data, list):
+            return all(Utils.yaml_c_dumper_safe(item) for item in data)
+        return data is None or isinstance(data, (bool, int))
+    
+    @staticmethod
+    def yaml_c_dumper_safe_key(key) -> bool:
+        if not Utils.yaml_c_dumper_safe(key):
+            return False
+        return not isinstance(key, str) or 0 < len(key.encode("utf-8")) < YAML_C_DUMPER_SIMPLE_KEY_BYTES
+    
+    @staticmethod
+    def dump_yaml(data) -> str:
+        import yaml
+        
+        # Use libyaml when PyYAML was built with it, unless the output could differ from the pure-Python dumper
+        dumper = yaml.SafeDumper
+        if hasattr(yaml, "CSafeDumper") and Utils.yaml_c_dumper_safe(data):
+            dumper = yaml.CSafeDumper
+        
+        return yaml.dump(data, Dumper=dumper, sort_keys=False, allow_unicode=True)
+    
+    @staticmethod
+    def format_size(size: int) -> str:
+        for unit in ["B", "KiB", "MiB"]:
+            if size < 1024:
+                return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+            size /= 1024
+        return f"{size:.1f} GiB"
     
     @staticmethod
     def load_json(file):
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import socket
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator
+
+from .utils import Utils
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows, where versions are updated without a lock
+    fcntl = None
+
+# Reservations older than this are dropped, even if the process that made them cannot be checked
+RESERVATION_MAX_AGE_SECONDS = 24 * 60 * 60
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    '''
+    Hold an exclusive advisory lock on a lock file, shared by every process of the repository
+    '''
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+class VersionFile:
+    '''
+    Version file of a challenge or page, updated atomically under an advisory file lock.
+
+    The lock is a separate file in the cache directory, as the version file itself is replaced on every write.
+    A version can be reserved before it is committed, so concurrent runs never hand out the same version,
+    and a version is only written to the version file once the work using it succeeded.
+    '''
+    def __init__(self, directory: Path, key: str):
+        self.path = Path(directory).joinpath("version")
+        self.key = key
+
+    def lock_path(self) -> Path:
+        return Utils.get_cache_dir().joinpath("locks", f"{self.key}.lock")
+
+    def reservations_path(self) -> Path:
+        return Utils.get_cache_dir().joinpath("locks", f"{self.key}.reservations.json")
+
+    def lock(self):
+        return file_lock(self.lock_path())
+
+    def read(self) -> int:
+        if not self.path.exists():
+            return 0
+
+        with open(self.path, 'r') as f:
+            return int(f.read())
+
+    def write_unlocked(self, version: int):
+        temporary = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(temporary, 'w') as f:
+            f.write(str(version))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+
+    def write(self, version: int):
+        with self.lock():
+            self.write_unlocked(version)
+
+    def increment(self) -> int:
+        '''
+        Increment the version and write it right away
+        '''
+        with self.lock():
+            version = max(self.read(), *self.reservations(), 0) + 1
+            self.write_unlocked(version)
+            return version
+
+    def reservations(self) -> Dict[int, dict]:
+        '''
+        Versions reserved by runs that are still in progress. Must be called with the lock held
+        '''
+        try:
+            with open(self.reservations_path(), "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        reservations = {}
+        for version, owner in data.items() if isinstance(data, dict) else []:
+            if VersionFile.owner_alive(owner):
+                reservations[int(version)] = owner
+        return reservations
+
+    def save_reservations(self, reservations: Dict[int, dict]):
+        path = self.reservations_path()
+        if not reservations:
+            path.unlink(missing_ok=True)
+            return
+
+        temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temporary, "w") as f:
+            json.dump({str(version): owner for version, owner in sorted(reservations.items())}, f, indent=2)
+            f.write("\n")
+        os.replace(temporary, path)
+
+    @staticmethod
+    def owner_alive(owner: dict) -> bool:
+        if not isinstance(owner, dict) or time.time() - owner.get("time", 0) > RESERVATION_MAX_AGE_SECONDS:
+            return False
+        if owner.get("host") != socket.gethostname():
+            return True
+        try:
+            os.kill(int(owner.get("pid", 0)), 0)
+        except ProcessLookupError:
+            return False
+        except (PermissionError, ValueError):
+            pass
+        return True
+
+    def reserve(self) -> int:
+        '''
+        Reserve the next version, above the current version and every version reserved by other runs
+        '''
+        with self.lock():
+            reservations = self.reservations()
+            version = max(self.read(), *reservations, 0) + 1
+            reservations[version] = {"pid": os.getpid(), "host": socket.gethostname(), "time": time.time()}
+            self.save_reservations(reservations)
+            return version
+
+    def commit(self, version: int):
+        '''
+        Write a reserved version to the version file. A higher version committed in the meantime is kept
+        '''
+        with self.lock():
+            reservations = self.reservations()
+            reservations.pop(version, None)
+            self.save_reservations(reservations)
+            if version > self.read():
+                self.write_unlocked(version)
+
+    def release(self, version: int):
+        '''
+        Drop a reserved version without writing it, so the version can be used again
+        '''
+        with self.lock():
+            reservations = self.reservations()
+            reservations.pop(version, None)
+            self.save_reservations(reservations)
@@ -3,6 +3,24 @@ import io
 from contextlib import redirect_stdout
 
 from tests.library.dataTest import TestChallenge, TestChallengeFileLoad, TestChallengeFileWrite, TestPage
+from tests.library.parallelTest import TestParallelExecutor
+from tests.library.cacheTest import TestRenderCache
+from tests.library.indexTest import TestChallengeIndex
+from tests.library.utilsTest import TestYaml
+from tests.library.fingerprintTest import TestDockerIgnore, TestContextFingerprint, TestBuildState
+from tests.library.buildcacheTest import TestBuildCache
+from tests.library.dockerTest import TestDockerRunner, TestDockerRunnerLogModes
+from tests.library.engineTest import TestEngineClient
+from tests.library.buildkitTest import TestBuildProgress
+from tests.library.archiveTest import TestHandoutArchive, TestRawZipMembers
+from tests.library.versionTest import TestVersionFile
+from tests.library.reportTest import TestRunReport
+from tests.library.templateTest import TestTemplate, TestTemplateGolden, TestTemplateCache
+from tests.commands.changedTest import TestChanges
+from tests.commands.pipelineTest import TestDockerBuild
+from tests.commands.templateRendererTest import TestTemplateRenderer
+from tests.commands.pageTest import TestPageCommand
+from tests.startupTest import TestStartup
 
 if __name__ == '__main__':
     
@@ -0,0 +1,117 @@
+import os
+import json
+import unittest
+import sys
+import tempfile
+import subprocess
+
+from pathlib import Path
+from unittest import mock
+
+sys.path.append('..')
+
+from commands.changed import Changes, ChangedCommand
+
+class TestChanges(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repo = Path(self.temp_dir.name)
+        self.patch = mock.patch('library.utils.CHALLENGE_REPO_ROOT', self.repo)
+        self.patch.start()
+
+        for challenge, type in [("web/instanced", "instanced"), ("web/shared", "shared"), ("crypto/static", "static")]:
+            category, slug = challenge.split("/")
+            path = self.repo.joinpath("challenges", category, slug)
+            path.mkdir(parents=True)
+            path.joinpath("challenge.yml").write_text(
+                f"name: {slug}\nslug: {slug}\nauthor: Test\ncategory: {category}\ndifficulty: easy\ntype: {type}\nflag: ctf{{{slug}}}\n"
+            )
+        for page in ["rules", "about"]:
+            self.repo.joinpath("pages", page).mkdir(parents=True)
+
+    def tearDown(self):
+        self.patch.stop()
+        self.temp_dir.cleanup()
+
+    def changes(self, files):
+        changes = Changes()
+        for file in files:
+            changes.add_file(file)
+        changes.add_shared_templates()
+        return changes
+
+    def test_challenge_and_page_files(self):
+        changes = self.changes(["challenges/web/shared/description.md", "challenges/web/shared/src/app.py", "pages/rules/page.md", "README.md"])
+        self.assertEqual(changes.challenges, {"web/shared"})
+        self.assertEqual(changes.pages, {"rules"})
+
+    def test_files_outside_challenge_directories(self):
+        changes = self.changes(["challenges/README.md", "challenges/web/README.md", "pages/README.md"])
+        self.assertEqual(changes.challenges, set())
+        self.assertEqual(changes.pages, set())
+
+    def test_removed_challenge(self):
+        changes = self.changes(["challenges/web/deleted/challenge.yml"])
+        self.assertEqual(changes.challenges, set())
+        self.assertEqual(changes.removed_challenges, {"web/deleted"})
+
+    def test_challenge_configmap_template(self):
+        changes = self.changes(["template/challenge-configmap.yml"])
+        self.assertEqual(changes.challenges, {"web/instanced", "web/shared", "crypto/static"})
+        self.assertEqual(changes.pages, set())
+
+    def test_instanced_template(self):
+        changes = self.changes(["template/instanced-k8s-challenge.yml"])
+        self.assertEqual(changes.challenges, {"web/instanced"})
+
+    def test_page_template(self):
+        changes = self.changes(["template/page-configmap.yml"])
+        self.assertEqual(changes.challenges, set())
+        self.assertEqual(changes.pages, {"rules", "about"})
+
+    def test_create_templates(self):
+        changes = self.changes(["template/instanced-web-k8s.yml"])
+        self.assertEqual(changes.challenges, set())
+        self.assertEqual(changes.pages, set())
+
+    def test_unknown_template(self):
+        changes = self.changes(["template/other.yml"])
+        self.assertEqual(len(changes.challenges), 3)
+        self.assertEqual(len(changes.pages), 2)
+
+    def test_matrix(self):
+        matrix = ChangedCommand.matrix(["web/shared"], ["rules"])
+        self.assertEqual(matrix, {"include": [
+            {"type": "challenge", "name": "web/shared", "category": "web", "slug": "shared"},
+            {"type": "page", "name": "rules", "slug": "rules"},
+        ]})
+
+    def test_git_untracked_files(self):
+        git = lambda *command: subprocess.run(["git", "-c", "user.name=Test", "-c", "user.email=test@example.com"] + list(command), cwd=self.repo, check=True, stdout=subprocess.DEVNULL)
+        git("init", "-q")
+        git("add", "-A")
+        git("commit", "-q", "-m", "initial")
+        self.repo.joinpath("challenges", "web", "shared", "challenge.yml").write_text("changed: true\n")
+        new = self.repo.joinpath("challenges", "pwn", "new")
+        new.mkdir(parents=True)
+        new.joinpath("challenge.yml").write_text("name: new\n")
+        self.repo.joinpath(".gitignore").write_text("*.log\n")
+        self.repo.joinpath("challenges", "pwn", "new", "build.log").write_text("ignored")
+
+        files = Changes.git_changed_files("HEAD")
+        self.assertEqual(sorted(files), [".gitignore", "challenges/pwn/new/challenge.yml", "challenges/web/shared/challenge.yml"])
+        self.assertEqual(Changes.from_git("HEAD").challenges, {"pwn/new", "web/shared"})
+
+        # Untracked files are not part of a comparison between two refs
+        self.assertEqual(Changes.git_changed_files("HEAD", "HEAD"), [])
+
+    def test_github_output(self):
+        output = self.repo.joinpath("github_output")
+        with mock.patch.dict(os.environ, {"GITHUB_OUTPUT": str(output)}):
+            ChangedCommand.write_github_output(ChangedCommand.matrix([], []))
+            ChangedCommand.write_github_output(ChangedCommand.matrix(["web/shared"], []))
+
+        lines = output.read_text().splitlines()
+        self.assertEqual(lines[:2], ['matrix={"include": []}', "has-changes=false"])
+        self.assertEqual(json.loads(lines[2][len("matrix="):])["include"][0]["name"], "web/shared")
+        self.assertEqual(lines[3], "has-changes=true")
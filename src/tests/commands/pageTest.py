@@ -0,0 +1,103 @@
+import io
+import sys
+import shutil
+import unittest
+import tempfile
+
+from contextlib import redirect_stdout, redirect_stderr
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+sys.path.append('..')
+
+from commands.page import PageCommand
+from library.config import PAGE_SCHEMA
+from library.data import Page
+from tests.library.templateTest import render_replace
+
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent.parent.parent.joinpath("template")
+
+class TestPageCommand(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repo = Path(self.temp_dir.name).joinpath("sequential")
+        self.repo.mkdir()
+        self.patch = mock.patch('library.utils.CHALLENGE_REPO_ROOT', self.repo)
+        self.patch.start()
+        shutil.copytree(TEMPLATE_DIR, self.repo.joinpath("template"))
+
+    def tearDown(self):
+        self.patch.stop()
+        self.temp_dir.cleanup()
+
+    def add_page(self, slug: str, content: bool = True):
+        path = self.repo.joinpath("pages", slug)
+        path.mkdir(parents=True)
+        path.joinpath("page.yml").write_text(f"slug: {slug}\ntitle: {slug.capitalize()}\nroute: /{slug}\n")
+        if content:
+            path.joinpath("page.md").write_text(f"# {slug}\n")
+
+    def run_page(self, *arguments) -> str:
+        output = io.StringIO()
+        argv = ["page.py", *arguments, "--repo", "org/repo"]
+        try:
+            with mock.patch.object(sys, "argv", argv), redirect_stdout(output), redirect_stderr(output):
+                PageCommand().run()
+        finally:
+            self.output = output.getvalue()
+        return self.output
+
+    def snapshot(self, repo: Path) -> dict:
+        return {str(path.relative_to(repo)): path.read_bytes() for path in sorted(repo.joinpath("pages").rglob("*")) if path.is_file()}
+
+    def test_render_matches_replace(self):
+        self.add_page("about")
+        path = self.repo.joinpath("pages", "about")
+        path.joinpath("page.md").write_text("# About {{ PAGE_NAME }}\n\n  Indented {{PAGE_VERSION}} and {{ UNKNOWN }}\n")
+        with mock.patch("commands.page.datetime") as clock:
+            clock.now.return_value = datetime(2024, 5, 1, 10, 0, 0)
+            self.run_page("about")
+
+        page = Page.load_dir(path)
+        indent = lambda content: "".join(["    " + line + "\n" for line in content.splitlines()])
+        expected = render_replace(TEMPLATE_DIR.joinpath("page-configmap.yml").read_text(), {
+            "PAGE_SLUG": "about",
+            "PAGE_NAME": "about",
+            "PAGE_PATH": "pages/about",
+            "PAGE_REPO": "org/repo",
+            "PAGE_VERSION": str(page.get_version()),
+            "PAGE_ENABLED": str(page.enabled).lower(),
+            "CURRENT_DATE": "2024-05-01 10:00:00",
+        }, {
+            "PAGE": indent(page.str_json(PAGE_SCHEMA)),
+            "CONTENT": indent(path.joinpath("page.md").read_text()),
+        })
+        output = path.joinpath("k8s", "page.yml").read_text()
+        self.assertEqual(output, expected)
+        self.assertIn("    # About about\n    \n      Indented 1 and {{ UNKNOWN }}\n", output)
+
+    def test_jobs_match_sequential(self):
+        for slug in ["about", "faq", "missing", "rules"]:
+            self.add_page(slug, content=slug != "missing")
+        parallel_repo = self.repo.with_name("parallel")
+        shutil.copytree(self.repo, parallel_repo)
+
+        outputs = {}
+        with mock.patch("commands.page.datetime") as clock:
+            clock.now.return_value = datetime(2024, 5, 1, 10, 0, 0)
+            for repo, jobs in [(self.repo, "1"), (parallel_repo, "2")]:
+                with mock.patch('library.utils.CHALLENGE_REPO_ROOT', repo), self.assertRaises(SystemExit):
+                    self.run_page("--all", "--jobs", jobs)
+                outputs[jobs] = self.output.replace(str(repo), "<repo>")
+
+        self.assertEqual(self.snapshot(parallel_repo), self.snapshot(self.repo))
+        self.assertEqual(outputs["2"], outputs["1"])
+
+        summary = outputs["2"][outputs["2"].index("Summary:"):].splitlines()
+        self.assertEqual(summary, ["Summary:", "  Pages rendered: 3", "  Pages failed: 1", "  - missing: Exited with code 1"])
+
+        # The output of every page is printed as a whole, in the order the pages were given
+        starts = [outputs["2"].index(f"Rendering page {slug}\n") for slug in ["about", "faq", "missing", "rules"]]
+        self.assertEqual(starts, sorted(starts))
+        self.assertLess(outputs["2"].index("Content file page.md does not exist in page missing"), starts[3])
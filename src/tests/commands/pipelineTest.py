@@ -0,0 +1,505 @@
+import io
+import os
+import json
+import sys
+import unittest
+import tempfile
+
+from contextlib import redirect_stdout, redirect_stderr
+from pathlib import Path
+from unittest import mock
+
+sys.path.append('..')
+
+from library.data import Challenge, DockerfileLocation
+from commands.pipeline import Bake, Docker, DockerBuild
+from library.fingerprint import FINGERPRINT_LABEL
+from library.buildcache import BuildCache, CacheOptions
+
+# Stand-in for the docker CLI. Builds of a context containing "fail" fail immediately, every other build takes BUILD_SECONDS.
+# A local cache is exported before the build finishes, so failed builds leave a cache behind as well.
+# With FAKE_DOCKER_EVENTS, the start and end of every build and push are appended to the file, in the order they happen
+FAKE_DOCKER = '''#!{python}
+import os, sys, time
+def event(name):
+    if os.environ.get("FAKE_DOCKER_EVENTS"):
+        with open(os.environ["FAKE_DOCKER_EVENTS"], "a") as events:
+            events.write(name + "\\n")
+if os.environ.get("FAKE_DOCKER_LOG"):
+    with open(os.environ["FAKE_DOCKER_LOG"], "a") as log:
+        log.write(" ".join(sys.argv[1:]) + "\\n")
+command = sys.argv[1]
+if command == "build" or sys.argv[1:3] == ["buildx", "build"]:
+    context = sys.argv[-1]
+    identifier = os.path.basename(context.rstrip("/"))
+    event("build-start " + identifier)
+    for index, argument in enumerate(sys.argv):
+        if argument == "--cache-to" and sys.argv[index + 1].startswith("type=local,"):
+            # Export a local cache, as BuildKit would
+            dest = dict(option.split("=", 1) for option in sys.argv[index + 1].split(","))["dest"]
+            os.makedirs(dest, exist_ok=True)
+            with open(os.path.join(dest, "index.json"), "w") as index_file:
+                index_file.write(context)
+    if "--progress=rawjson" in sys.argv:
+        import json
+        print(json.dumps({{"vertexes": [{{"digest": "sha256:a", "name": "[1/2] FROM scratch", "started": "2024-05-01T10:00:00Z", "completed": "2024-05-01T10:00:00Z", "cached": True}}]}}), flush=True)
+        print(json.dumps({{"vertexes": [{{"digest": "sha256:b", "name": "[2/2] COPY . /", "started": "2024-05-01T10:00:00Z", "completed": "2024-05-01T10:00:01.5Z"}}]}}), flush=True)
+    print("step 1/2", flush=True)
+    if "fail" in context:
+        print("build failed", flush=True)
+        sys.exit(1)
+    time.sleep(float(os.environ.get("FAKE_DOCKER_BUILD_SECONDS", {seconds})))
+    print("step 2/2", flush=True)
+    event("build-end " + identifier)
+elif command == "push":
+    identifier = sys.argv[2].rsplit("-", 1)[-1]
+    event("push-start " + identifier)
+    time.sleep(float(os.environ.get("FAKE_DOCKER_PUSH_SECONDS", 0)))
+    print("pushed " + sys.argv[2], flush=True)
+    event("push-end " + identifier)
+elif command == "buildx" and sys.argv[2] == "bake":
+    print("baked " + " ".join(sys.argv[3:]), flush=True)
+'''
+
+BUILD_SECONDS = 0.4
+
+class TestDockerBuild(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repo = Path(self.temp_dir.name)
+        self.patch = mock.patch('library.utils.CHALLENGE_REPO_ROOT', self.repo)
+        self.patch.start()
+
+        bin_dir = self.repo.joinpath("bin")
+        bin_dir.mkdir()
+        docker = bin_dir.joinpath("docker")
+        docker.write_text(FAKE_DOCKER.format(python=sys.executable, seconds=BUILD_SECONDS))
+        docker.chmod(0o755)
+        self.path_patch = mock.patch.dict(os.environ, {"PATH": f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"})
+        self.path_patch.start()
+
+        self.challenge = Challenge(
+            name="Multi", slug="multi", author="Test", category="web", difficulty="easy", type="instanced", instanced_type="web", flag="ctf{x}"
+        )
+        self.challenge.get_path().mkdir(parents=True)
+        self.docker = Docker("registry.local", "ctf", "")
+
+    def tearDown(self):
+        self.path_patch.stop()
+        self.patch.stop()
+        self.temp_dir.cleanup()
+
+    def add_images(self, *identifiers):
+        for identifier in identifiers:
+            self.challenge.add_dockerfile_location([DockerfileLocation(f"src/{identifier}/Dockerfile", f"src/{identifier}/", identifier)])
+
+    def build(self, jobs):
+        output = io.StringIO()
+        with redirect_stdout(output), redirect_stderr(output):
+            results = self.docker.build_all(self.challenge, jobs)
+        return results, output.getvalue()
+
+    def build_events(self, jobs, push_seconds=0):
+        '''
+        Build the images, returning the position of each build and push start and end event
+        '''
+        events = self.repo.joinpath("events.log")
+        with mock.patch.dict(os.environ, {"FAKE_DOCKER_EVENTS": str(events), "FAKE_DOCKER_PUSH_SECONDS": str(push_seconds)}):
+            results, output = self.build(jobs)
+        lines = events.read_text().splitlines() if events.exists() else []
+        return results, output, {event: index for index, event in enumerate(lines)}
+
+    def test_image_name(self):
+        self.add_images("bot")
+        self.assertEqual(
+            Docker.image_name("ghcr.io", "Org/Repo", "staging", self.challenge, self.challenge.dockerfile_locations[0]),
+            "ghcr.io/org/repo-web-multi-bot-staging",
+        )
+
+    def test_concurrent_builds(self):
+        self.add_images("app", "bot", "db")
+        results, output, events = self.build_events(jobs=3)
+
+        self.assertTrue(all(result.success for result in results))
+        self.assertEqual([result.identifier for result in results], ["app", "bot", "db"])
+        self.assertTrue(all(result.duration >= BUILD_SECONDS for result in results))
+        # Every build started before the first one ended
+        first_end = min(events[f"build-end {identifier}"] for identifier in ["app", "bot", "db"])
+        self.assertTrue(all(events[f"build-start {identifier}"] < first_end for identifier in ["app", "bot", "db"]))
+        self.assertIn("[bot] step 2/2", output)
+        self.assertIn("[db ] pushed registry.local/ctf-web-multi-db", output)
+
+    def test_single_build_unprefixed(self):
+        self.add_images("app")
+        results, output = self.build(jobs=1)
+
+        self.assertTrue(results[0].success)
+        self.assertIn("\nstep 2/2\n", output)
+        self.assertNotIn("[app]", output)
+
+    def test_push_overlaps_next_build(self):
+        self.add_images("app", "bot", "db")
+        results, output, events = self.build_events(jobs=1, push_seconds=BUILD_SECONDS)
+
+        self.assertTrue(all(result.success for result in results))
+        # Builds run one at a time, and each push runs alongside the next build
+        for image, next_image in [("app", "bot"), ("bot", "db")]:
+            self.assertLess(events[f"build-end {image}"], events[f"build-start {next_image}"])
+            self.assertLess(events[f"push-start {image}"], events[f"build-end {next_image}"])
+            self.assertLess(events[f"build-start {next_image}"], events[f"push-end {image}"])
+        self.assertLess(output.index("[bot] step 1/2"), output.index("[app] pushed"))
+
+    def test_timeout(self):
+        self.add_images("app", "bot")
+        self.docker = Docker("registry.local", "ctf", "", timeout=BUILD_SECONDS / 4)
+        results, output, events = self.build_events(jobs=1)
+
+        self.assertFalse(results[0].success)
+        self.assertEqual(results[0].error, f"Command timed out after {BUILD_SECONDS / 4:g}s")
+        self.assertTrue(results[1].skipped)
+        self.assertNotIn("step 2/2", output)
+        # The build was stopped before it ended, and the next one was never started
+        self.assertEqual(list(events), ["build-start app"])
+
+    def test_docker_binary(self):
+        self.add_images("app")
+        binary = self.repo.joinpath("bin", "docker")
+        with mock.patch.dict(os.environ, {"PATH": os.defpath}):
+            self.docker = Docker("registry.local", "ctf", "", binary=str(binary))
+            results, output = self.build(jobs=1)
+        self.assertTrue(results[0].success)
+        self.assertIn("pushed registry.local/ctf-web-multi-app", output)
+
+        self.docker = Docker("registry.local", "ctf", "", binary=str(self.repo.joinpath("missing")))
+        results, output = self.build(jobs=1)
+        self.assertFalse(results[0].success)
+        self.assertIn("No such file or directory", results[0].error)
+
+    def test_failure_skips_pending_builds(self):
+        self.add_images("fail", "app", "bot")
+        results, output = self.build(jobs=2)
+
+        self.assertFalse(results[0].success)
+        self.assertFalse(results[0].skipped)
+        self.assertIn("[fail] build failed", output)
+        # The second build started alongside the failing one, the third was never started
+        self.assertTrue(results[1].success)
+        self.assertTrue(results[2].skipped)
+
+    def test_sequential_failure_skips_remaining(self):
+        self.add_images("fail", "app")
+        results, _ = self.build(jobs=1)
+
+        self.assertFalse(results[0].success)
+        self.assertTrue(results[1].skipped)
+
+    def test_bake_plan_matches_build(self):
+        self.add_images("app", "bot")
+        self.challenge.save_version(3)
+        plan = Bake.plan(Docker("ghcr.io", "org/repo", "staging"), [self.challenge])
+
+        self.assertEqual(plan["group"]["default"]["targets"], ["web-multi-app", "web-multi-bot"])
+        target = plan["target"]["web-multi-bot"]
+        self.assertEqual(target["tags"], ["ghcr.io/org/repo-web-multi-bot-staging:latest", "ghcr.io/org/repo-web-multi-bot-staging:3"])
+        self.assertEqual(target["dockerfile"], f"{self.challenge.get_path()}/src/bot/Dockerfile")
+        self.assertEqual(target["context"], f"{self.challenge.get_path()}/src/bot/")
+
+    def test_bake_plan_default_image(self):
+        self.challenge.add_dockerfile_location([DockerfileLocation("src/Dockerfile", "src/", None)])
+        plan = Bake.plan(self.docker, [self.challenge])
+        self.assertEqual(list(plan["target"]), ["web-multi"])
+        self.assertEqual(plan["target"]["web-multi"]["tags"][0], "registry.local/ctf-web-multi:latest")
+
+    def test_bake_run(self):
+        self.add_images("app")
+        file = self.repo.joinpath(".ctf-cache", "docker-bake.json")
+        Bake.write(Bake.plan(self.docker, [self.challenge]), file)
+        self.assertIn("web-multi-app", json.loads(file.read_text())["target"])
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            Bake.run(file)
+        self.assertEqual(output.getvalue(), f"baked --file {file} --push\n")
+
+    def run_pipeline(self, *options):
+        output = io.StringIO()
+        argv = ["pipeline.py", "web/multi", "registry.local", "ctf", *options]
+        try:
+            with mock.patch.object(sys, "argv", argv), redirect_stdout(output), redirect_stderr(output):
+                DockerBuild().run()
+        finally:
+            self.output = output.getvalue()
+        return self.output
+
+    def test_bake_plan_only(self):
+        self.add_images("app")
+        self.challenge.get_path().joinpath("challenge.yml").write_text(self.challenge.str_yml("-"))
+        self.challenge.save_version(4)
+        file = self.repo.joinpath("bake.json")
+        report = self.repo.joinpath("report.json")
+
+        output = self.run_pipeline("--bake", str(file), "--report", str(report))
+        self.assertIn("registry.local/ctf-web-multi-app:5", json.loads(file.read_text())["target"]["web-multi-app"]["tags"])
+        self.assertIn("web/multi: planned, version 5", output)
+        self.assertIn("\n1 challenge: 0 done, 0 unchanged, 1 planned, 0 failed\n", output)
+        self.assertNotIn("Docker process complete", output)
+        data = json.loads(report.read_text())
+        self.assertEqual((data["status"], data["challenges"][0]["status"], data["challenges"][0]["version"]), ("planned", "planned", 5))
+
+        # Nothing was built, so the version is not committed, and the reservation is released for the next run
+        self.assertEqual(self.challenge.get_version(), 4)
+        self.run_pipeline("--bake", str(file))
+        self.assertIn("registry.local/ctf-web-multi-app:5", json.loads(file.read_text())["target"]["web-multi-app"]["tags"])
+
+    def test_unchanged_context_skipped(self):
+        self.add_images("app")
+        self.challenge.get_path().joinpath("challenge.yml").write_text(self.challenge.str_yml("-"))
+        source = self.challenge.get_path().joinpath("src", "app")
+        source.mkdir(parents=True)
+        source.joinpath("Dockerfile").write_text("FROM scratch\n")
+        source.joinpath("app.py").write_text("print('hello')\n")
+        log = self.repo.joinpath("docker.log")
+
+        with mock.patch.dict(os.environ, {"FAKE_DOCKER_LOG": str(log)}):
+            self.run_pipeline()
+            self.assertEqual(self.challenge.get_version(), 1)
+            self.assertIn(f"--label {FINGERPRINT_LABEL}=", log.read_text())
+
+            output = self.run_pipeline()
+            self.assertIn("app: unchanged (registry.local/ctf-web-multi-app)", output)
+            self.assertEqual(self.challenge.get_version(), 1)
+            self.assertEqual(log.read_text().count("build "), 1)
+
+            self.run_pipeline("--force")
+            self.assertEqual(self.challenge.get_version(), 2)
+
+            source.joinpath("app.py").write_text("print('changed')\n")
+            self.run_pipeline()
+            self.assertEqual(self.challenge.get_version(), 3)
+            self.assertEqual(log.read_text().count("build "), 3)
+
+    def test_local_cache_rotation(self):
+        self.add_images("app", "fail")
+        log = self.repo.joinpath("docker.log")
+        cache = CacheOptions("local")
+        self.docker = Docker("registry.local", "ctf", "", cache)
+        app = BuildCache.directory(cache, "registry.local/ctf-web-multi-app")
+        fail = BuildCache.directory(cache, "registry.local/ctf-web-multi-fail")
+
+        with mock.patch.dict(os.environ, {"FAKE_DOCKER_LOG": str(log)}):
+            results, _ = self.build(jobs=2)
+            self.assertTrue(results[0].success)
+            self.assertFalse(results[1].success)
+            self.assertTrue(app.joinpath("index.json").is_file())
+            self.assertFalse(app.with_name(f"{app.name}-new").exists())
+            # The cache of a failed build is discarded
+            self.assertFalse(fail.exists())
+            self.assertFalse(fail.with_name(f"{fail.name}-new").exists())
+
+            self.build(jobs=1)
+        commands = [line for line in log.read_text().splitlines() if "ctf-web-multi-app:latest" in line]
+        self.assertTrue(commands[0].startswith("buildx build --load --cache-to "))
+        self.assertIn(f"--cache-from type=local,src={app} --cache-to type=local,dest={app}-new,mode=max", commands[-1])
+
+    def test_bake_plan_cache(self):
+        self.add_images("app")
+        plan = Bake.plan(Docker("registry.local", "ctf", "", CacheOptions("registry")), [self.challenge])
+        target = plan["target"]["web-multi-app"]
+        self.assertEqual(target["cache-from"], ["type=registry,ref=registry.local/ctf-web-multi-app:buildcache"])
+        self.assertEqual(target["cache-to"], ["type=registry,ref=registry.local/ctf-web-multi-app:buildcache,mode=max"])
+        self.assertNotIn("cache-from", Bake.plan(self.docker, [self.challenge])["target"]["web-multi-app"])
+
+    def test_failed_build_keeps_version(self):
+        self.add_images("app", "fail")
+        self.challenge.get_path().joinpath("challenge.yml").write_text(self.challenge.str_yml("-"))
+        self.challenge.save_version(4)
+        log = self.repo.joinpath("docker.log")
+
+        with mock.patch.dict(os.environ, {"FAKE_DOCKER_LOG": str(log)}), self.assertRaises(SystemExit):
+            self.run_pipeline("--force")
+        self.assertIn("-t registry.local/ctf-web-multi-app:5 ", log.read_text())
+        self.assertEqual(self.challenge.get_version(), 4)
+        self.assertIn("\n1 challenge: 0 done, 0 unchanged, 1 failed\n", self.output)
+        self.assertIn("Docker process failed for 1 of 1 challenge: web/multi\n", self.output)
+
+        # The version is used again by the next run
+        self.challenge.dockerfile_locations = self.challenge.dockerfile_locations[:1]
+        self.challenge.get_path().joinpath("challenge.yml").write_text(self.challenge.str_yml("-"))
+        with mock.patch.dict(os.environ, {"FAKE_DOCKER_LOG": str(log)}):
+            self.run_pipeline("--force")
+        self.assertEqual(log.read_text().count("-t registry.local/ctf-web-multi-app:5 "), 2)
+        self.assertEqual(self.challenge.get_version(), 5)
+
+    def test_report(self):
+        self.add_images("app", "fail")
+        self.challenge.get_path().joinpath("challenge.yml").write_text(self.challenge.str_yml("-"))
+        report = self.repo.joinpath("report.json")
+        metrics = self.repo.joinpath("metrics.prom")
+
+        with self.assertRaises(SystemExit):
+            self.run_pipeline("--report", str(report), "--metrics", str(metrics))
+
+        data = json.loads(report.read_text())
+        self.assertEqual(data["status"], "failed")
+        self.assertEqual(list(data["phases"]), ["load", "fingerprint", "version", "build", "commit"])
+        challenge = data["challenges"][0]
+        self.assertEqual((challenge["challenge"], challenge["status"], challenge["version"]), ("web/multi", "failed", None))
+        app, fail = challenge["images"]
+        self.assertEqual((app["status"], app["exit_code"], app["image"]), ("done", 0, "registry.local/ctf-web-multi-app"))
+        self.assertGreaterEqual(app["build_duration"], BUILD_SECONDS)
+        self.assertIsNotNone(app["push_duration"])
+        self.assertEqual((fail["status"], fail["exit_code"], fail["push_duration"]), ("failed", 1, None))
+
+        self.assertIn('ctfpilot_pipeline_image_success{challenge="web/multi",identifier="fail",image="registry.local/ctf-web-multi-fail"} 0', metrics.read_text())
+        self.assertTrue(metrics.read_text().endswith("# EOF\n"))
+
+    def test_report_unchanged(self):
+        self.add_images("app")
+        self.challenge.get_path().joinpath("challenge.yml").write_text(self.challenge.str_yml("-"))
+        source = self.challenge.get_path().joinpath("src", "app")
+        source.mkdir(parents=True)
+        source.joinpath("Dockerfile").write_text("FROM scratch\n")
+        report = self.repo.joinpath("report.json")
+
+        self.run_pipeline("--report", str(report))
+        data = json.loads(report.read_text())
+        self.assertEqual((data["status"], data["challenges"][0]["status"], data["challenges"][0]["version"]), ("success", "success", 1))
+        self.assertIn("commit", data["phases"])
+
+        self.run_pipeline("--report", str(report))
+        data = json.loads(report.read_text())
+        self.assertEqual(data["challenges"][0]["status"], "unchanged")
+        self.assertEqual(data["challenges"][0]["images"][0]["status"], "unchanged")
+
+    def test_log_mode_tail(self):
+        self.add_images("app", "fail")
+        self.docker = Docker("registry.local", "ctf", "", log_mode="tail", log_tail=1)
+        results, output = self.build(jobs=2)
+
+        self.assertTrue(results[0].success)
+        self.assertNotIn("step 2/2", output)
+        log = self.repo.joinpath(".ctf-cache", "logs", "registry-local-ctf-web-multi-app.log")
+        self.assertEqual(log.read_text(), "step 1/2\nstep 2/2\npushed registry.local/ctf-web-multi-app\n")
+        self.assertIn("[app ] Finished in", output)
+
+        self.assertIn("[fail] Last 1 lines of output:\n[fail] build failed\n", output)
+        self.assertNotIn("[fail] step 1/2", output)
+
+    def test_engine_backend(self):
+        from tests.library.engineTest import FakeEngine
+        
+        self.add_images("app", "bot")
+        self.challenge.get_path().joinpath("challenge.yml").write_text(self.challenge.str_yml("-"))
+        for identifier in ["app", "bot"]:
+            source = self.challenge.get_path().joinpath("src", identifier)
+            source.mkdir(parents=True)
+            source.joinpath("Dockerfile").write_text(f"FROM scratch\nCOPY {identifier}.txt /\n")
+            source.joinpath(f"{identifier}.txt").write_text(identifier)
+        engine = FakeEngine(self.repo.joinpath("docker.sock"))
+        self.addCleanup(engine.stop)
+        report = self.repo.joinpath("report.json")
+
+        output = self.run_pipeline("--backend", "engine", "--docker-host", f"unix://{self.repo.joinpath('docker.sock')}", "--jobs", "2", "--report", str(report))
+
+        self.assertIn("[app] Step 2/2 : COPY . /", output)
+        self.assertIn(f"[bot] 1: digest: sha256:{'2' * 64} size: 527", output)
+        self.assertEqual(self.challenge.get_version(), 1)
+        builds = {request["query"]["t"][0]: request for request in engine.requests if request["path"] == "/build"}
+        app = builds["registry.local/ctf-web-multi-app:latest"]
+        self.assertEqual(app["query"]["t"], ["registry.local/ctf-web-multi-app:latest", "registry.local/ctf-web-multi-app:1"])
+        self.assertEqual(set(app["files"]), {"Dockerfile", "app.txt"})
+        self.assertIn(FINGERPRINT_LABEL, json.loads(app["query"]["labels"][0]))
+        pushes = sorted((request["path"], request["query"]["tag"][0]) for request in engine.requests if request["path"].endswith("/push"))
+        self.assertEqual(pushes, [(f"/images/registry.local/ctf-web-multi-{identifier}/push", tag) for identifier in ["app", "bot"] for tag in ["1", "latest"]])
+        
+        images = json.loads(report.read_text())["challenges"][0]["images"]
+        self.assertEqual([(image["status"], image["image_id"], image["digest"]) for image in images], [("done", "sha256:" + "1" * 64, "sha256:" + "2" * 64)] * 2)
+
+    def test_engine_backend_without_buildkit(self):
+        self.add_images("app")
+        self.challenge.get_path().joinpath("challenge.yml").write_text(self.challenge.str_yml("-"))
+        with self.assertRaises(SystemExit):
+            self.run_pipeline("--backend", "engine", "--cache-type", "local")
+        self.assertEqual(self.challenge.get_version(), 0)
+
+    def test_build_stats(self):
+        self.add_images("app")
+        self.challenge.get_path().joinpath("challenge.yml").write_text(self.challenge.str_yml("-"))
+        report = self.repo.joinpath("report.json")
+        calls = self.repo.joinpath("calls.log")
+
+        with mock.patch.dict(os.environ, {"FAKE_DOCKER_LOG": str(calls)}):
+            output = self.run_pipeline("--build-stats", "--report", str(report))
+
+        self.assertIn("build --progress=rawjson -t registry.local/ctf-web-multi-app:latest", calls.read_text())
+        self.assertIn("\n#1 [1/2] FROM scratch\n#1 CACHED\n#2 [2/2] COPY . /\n#2 DONE 1.5s\nstep 1/2\n", output)
+        self.assertIn("Build steps: 2, 1 cached (50%)\nSlowest steps:\n     1.5s  [2/2] COPY . /\n", output)
+        self.assertIn("    app: done in ", output)
+        self.assertIn(", 50% of steps cached (registry.local/ctf-web-multi-app)", output)
+        stats = json.loads(report.read_text())["challenges"][0]["images"][0]["build_stats"]
+        self.assertEqual((stats["steps"], stats["cached_steps"], stats["cache_hit_ratio"]), (2, 1, 0.5))
+
+    def add_challenge(self, category, slug, *identifiers):
+        challenge = Challenge(
+            name=slug.title(), slug=slug, author="Test", category=category, difficulty="easy", type="instanced", instanced_type="web", flag="ctf{x}"
+        )
+        for identifier in identifiers:
+            challenge.add_dockerfile_location([DockerfileLocation(f"src/{identifier}/Dockerfile", f"src/{identifier}/", identifier)])
+        challenge.get_path().mkdir(parents=True, exist_ok=True)
+        challenge.get_path().joinpath("challenge.yml").write_text(challenge.str_yml("-"))
+        return challenge
+
+    def test_schedule_longest_first(self):
+        self.add_images("a", "b", "c", "d")
+        build_jobs = self.docker.build_jobs_of(self.challenge)
+        for job, duration in zip(build_jobs, [5.0, None, 30.0, 10.0]):
+            job.expected_duration = duration
+        # Unknown durations first, then the longest
+        self.assertEqual(Docker.schedule(build_jobs), [1, 2, 3, 0])
+
+    def test_multiple_challenges(self):
+        self.add_challenge("web", "alpha", "app", "fail")
+        self.add_challenge("web", "beta", "app")
+        self.add_challenge("crypto", "gamma", "app")
+        challenges = self.repo.joinpath("challenges.txt")
+        challenges.write_text("# Changed challenges\nweb/beta\n\ncrypto/gamma\nweb/alpha\n")
+        argv = ["pipeline.py", "web/alpha", "web/missing", "registry.local", "ctf", "--from-file", str(challenges), "--jobs", "2"]
+
+        output = io.StringIO()
+        with mock.patch.object(sys, "argv", argv), redirect_stdout(output), redirect_stderr(output), self.assertRaises(SystemExit):
+            DockerBuild().run()
+        output = output.getvalue()
+
+        # A failing challenge does not stop the other challenges
+        self.assertIn("[web/alpha/fail  ] build failed", output)
+        self.assertIn("[web/beta/app    ] pushed registry.local/ctf-web-beta-app", output)
+        self.assertIn("  web/alpha: failed\n", output)
+        self.assertIn("    app: done in", output)
+        self.assertIn("  web/beta: done, version 1\n", output)
+        self.assertIn("  web/missing: failed - Challenge web/missing does not exist\n", output)
+        self.assertIn("4 challenges: 2 done, 0 unchanged, 2 failed", output)
+        self.assertIn("Docker process failed for 2 of 4 challenges: web/missing, web/alpha", output)
+
+        # The failed challenge keeps its version
+        self.assertFalse(self.repo.joinpath("challenges", "web", "alpha", "version").exists())
+        self.assertEqual(self.repo.joinpath("challenges", "web", "beta", "version").read_text(), "1")
+        self.assertEqual(self.repo.joinpath("challenges", "crypto", "gamma", "version").read_text(), "1")
+
+    def test_all_challenges(self):
+        self.add_images("app")
+        self.challenge.get_path().joinpath("challenge.yml").write_text(self.challenge.str_yml("-"))
+        self.add_challenge("web", "alpha", "app")
+        self.add_challenge("web", "beta", "app")
+        log = self.repo.joinpath("docker.log")
+
+        argv = ["pipeline.py", "registry.local", "ctf", "--all"]
+        with mock.patch.dict(os.environ, {"FAKE_DOCKER_LOG": str(log)}), mock.patch.object(sys, "argv", argv), redirect_stdout(io.StringIO()):
+            DockerBuild().run()
+        pushes = [line for line in log.read_text().splitlines() if line.startswith("push ")]
+        self.assertEqual(sorted(pushes), [f"push registry.local/ctf-web-{slug}-app --all-tags" for slug in ["alpha", "beta", "multi"]])
+
+    def test_no_challenges(self):
+        output = io.StringIO()
+        with mock.patch.object(sys, "argv", ["pipeline.py", "registry.local", "ctf"]), redirect_stdout(output), self.assertRaises(SystemExit):
+            DockerBuild().run()
+        self.assertIn("No challenges given", output.getvalue())
@@ -0,0 +1,219 @@
+import io
+import os
+import sys
+import shutil
+import unittest
+import tempfile
+import collections
+
+from contextlib import redirect_stdout, redirect_stderr
+from pathlib import Path
+from unittest import mock
+from datetime import datetime
+
+sys.path.append('..')
+
+from commands.template_renderer import TemplateRenderer
+from library.config import CHALLENGE_SCHEMA
+from library.data import Challenge
+from tests.library.templateTest import render_replace
+
+DATA_DIR = Path(__file__).resolve().parent.parent.joinpath("data")
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent.parent.parent.joinpath("template")
+
+class TestTemplateRenderer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repo = Path(self.temp_dir.name)
+        self.patch = mock.patch('library.utils.CHALLENGE_REPO_ROOT', self.repo)
+        self.patch.start()
+        shutil.copytree(TEMPLATE_DIR, self.repo.joinpath("template"))
+
+    def tearDown(self):
+        self.patch.stop()
+        self.temp_dir.cleanup()
+
+    def add_challenge(self, slug: str, data: str = "full-example.yml") -> Path:
+        '''
+        Challenge in the web category, defined by a file of the test data with another slug
+        '''
+        path = self.repo.joinpath("challenges", "web", slug)
+        path.joinpath("template").mkdir(parents=True)
+        path.joinpath("demo").mkdir()
+        definition = DATA_DIR.joinpath(data).read_text().replace('slug: "example-challenge"', f'slug: "{slug}"')
+        path.joinpath("challenge.yml").write_text(definition)
+        path.joinpath("template", "k8s.yml").write_text("kind: Deployment\nmetadata:\n  name: {{ CHALLENGE_NAME }}\n")
+        path.joinpath("demo", "description.md").write_text(f"# {slug}\n")
+        return path
+
+    def run_template(self, *arguments) -> str:
+        '''
+        Run the template command, returning its output. The output is also kept when the command exits
+        '''
+        output = io.StringIO()
+        argv = ["template_renderer.py", *arguments, "--repo", "org/repo"]
+        try:
+            with mock.patch.object(sys, "argv", argv), redirect_stdout(output), redirect_stderr(output):
+                TemplateRenderer().run()
+        finally:
+            self.output = output.getvalue()
+        return self.output
+
+    def test_incremental_after_plain_render(self):
+        path = self.add_challenge("d")
+        values = path.joinpath("k8s", "challenge", "values.yaml")
+
+        self.run_template("k8s", "web/d", "--incremental")
+        self.assertIn("expires: 3600\n", values.read_text())
+
+        # A render without --incremental updates the stored digest as well
+        self.run_template("k8s", "web/d", "--expires", "99")
+        self.assertIn("expires: 99\n", values.read_text())
+
+        output = self.run_template("k8s", "web/d", "--incremental")
+        self.assertNotIn("up to date", output)
+        self.assertIn("expires: 3600\n", values.read_text())
+
+        output = self.run_template("k8s", "web/d", "--incremental")
+        self.assertIn("up to date, skipping render", output)
+
+    def test_incremental_configmap_after_plain_render(self):
+        path = self.add_challenge("d")
+        values = path.joinpath("k8s", "config", "values.yaml")
+
+        self.run_template("configmap", "web/d", "--incremental")
+        self.run_template("configmap", "web/d", "--expires", "99")
+        self.assertIn("expires: 99\n", values.read_text())
+
+        output = self.run_template("configmap", "web/d", "--incremental")
+        self.assertNotIn("up to date", output)
+        self.assertIn("expires: 3600\n", values.read_text())
+
+    def add_instanced_challenge(self, slug: str) -> Path:
+        path = self.add_challenge(slug)
+        definition = path.joinpath("challenge.yml").read_text()
+        definition = definition.replace('type: "static"', 'type: "instanced"').replace('instanced_type: "none"', 'instanced_type: "web"')
+        path.joinpath("challenge.yml").write_text(definition)
+        shutil.copyfile(TEMPLATE_DIR.joinpath("instanced-web-k8s.yml"), path.joinpath("template", "k8s.yml"))
+        path.joinpath("demo", "description.md").write_text("# {{ CHALLENGE_NAME }}\n\nAvailable at {{HOST}}.\n")
+        return path
+
+    def test_k8s_matches_replace(self):
+        path = self.add_instanced_challenge("e")
+        self.run_template("k8s", "web/e", "--expires", "120", "--available", "5")
+
+        challenge = Challenge.load_dir(path)
+        k8s = path.joinpath("template", "k8s.yml").read_text()
+        expected = render_replace(TEMPLATE_DIR.joinpath("instanced-k8s-challenge.yml").read_text(), {
+            "CHALLENGE_NAME": "e",
+            "CHALLENGE_CATEGORY": "web",
+            "CHALLENGE_TYPE": "web",
+            "CHALLENGE_VERSION": str(challenge.get_version()),
+            "CHALLENGE_EXPIRES": "120",
+            "CHALLENGE_AVAILABLE_AT": "5",
+            "CHALLENGE_REPO": "org/repo",
+            "DOCKER_IMAGE": "web-e",
+        }, {
+            "TEMPLATE": "\n".join(["    " + line for line in k8s.splitlines()]),
+        })
+        self.assertEqual(path.joinpath("k8s", "challenge", "k8s.yml").read_text(), expected)
+
+    def test_configmap_matches_replace(self):
+        path = self.add_instanced_challenge("e")
+        with mock.patch("commands.template_renderer.datetime") as clock:
+            clock.now.return_value = datetime(2024, 5, 1, 10, 0, 0)
+            self.run_template("configmap", "web/e")
+
+        challenge = Challenge.load_dir(path)
+        indent = lambda content: "".join(["    " + line + "\n" for line in content.splitlines()])
+        expected = render_replace(TEMPLATE_DIR.joinpath("challenge-configmap.yml").read_text(), {
+            "CHALLENGE_NAME": "e",
+            "CHALLENGE_PATH": "challenges/web/e",
+            "CHALLENGE_REPO": "org/repo",
+            "CHALLENGE_CATEGORY": "web",
+            "CHALLENGE_TYPE": "web",
+            "CHALLENGE_VERSION": str(challenge.get_version()),
+            "CHALLENGE_ENABLED": "true",
+            "HOST": "{{ .Values.kubectf.host }}",
+            "CURRENT_DATE": "2024-05-01 10:00:00",
+        }, {
+            "CONFIG": indent(challenge.str_json(CHALLENGE_SCHEMA)),
+            "DESCRIPTION": indent(challenge.get_description()),
+        })
+        output = path.joinpath("k8s", "config", "templates", "k8s.yml").read_text()
+        self.assertEqual(output, expected)
+        self.assertIn("    # e\n", output)
+        self.assertIn("    Available at {{ .Values.kubectf.host }}.\n", output)
+
+    def add_handout(self, path: Path):
+        path.joinpath("handouts").mkdir()
+        path.joinpath("handouts", "notes.txt").write_text("notes\n")
+
+    def test_batch_collects_failures(self):
+        self.add_handout(self.add_challenge("a-full-disk"))
+        self.add_challenge("b-valid")
+        invalid = self.repo.joinpath("challenges", "web", "c-invalid")
+        invalid.mkdir(parents=True)
+        invalid.joinpath("challenge.yml").write_text("name: [\n")
+
+        # Only the challenge with a handout archives anything, and finds no free space for it
+        usage = collections.namedtuple("usage", ["total", "used", "free"])(0, 0, 0)
+        with mock.patch("shutil.disk_usage", return_value=usage), self.assertRaises(SystemExit) as exit:
+            self.run_template("all", "--jobs", "1")
+        self.assertEqual(exit.exception.code, 1)
+
+        output = self.output
+        summary = output[output.index("Summary:"):].splitlines()
+        self.assertEqual(summary[:4], ["Summary:", "  Challenges: 3", "  Renders succeeded: 5", "  Renders failed: 4"])
+        self.assertEqual(summary[4], "  - web/a-full-disk (handout): Renderer exited with code 1")
+        # The challenge that cannot be loaded fails every renderer
+        self.assertEqual([line.split(":")[0] for line in summary if line.startswith("  - web/c-invalid")], [
+            "  - web/c-invalid (k8s)", "  - web/c-invalid (configmap)", "  - web/c-invalid (handout)",
+        ])
+
+        # Challenges after the failing one are still rendered
+        self.assertIn("Not enough free space to write web_a-full-disk.zip", output)
+        for renderer in ["challenge", "config"]:
+            self.assertTrue(self.repo.joinpath("challenges", "web", "b-valid", "k8s", renderer, "values.yaml").is_file())
+        self.assertTrue(self.repo.joinpath("challenges", "web", "a-full-disk", "k8s", "config", "values.yaml").is_file())
+
+    def test_batch_success(self):
+        self.add_handout(self.add_challenge("a"))
+        self.add_challenge("b")
+
+        self.run_template("all", "web/a", "web/b", "--renderers", "k8s,handout", "--jobs", "1")
+        summary = self.output[self.output.index("Summary:"):].splitlines()
+        self.assertEqual(summary, ["Summary:", "  Challenges: 2", "  Renders succeeded: 4", "  Renders failed: 0"])
+        self.assertTrue(self.repo.joinpath("challenges", "web", "a", "k8s", "files", "web_a.zip").is_file())
+        # The handout renderer exits with code 0 when a challenge has no handout, which is not a failure
+        self.assertIn("Handout directory handouts does not exist for challenge b", self.output)
+
+    def snapshot(self, repo: Path) -> dict:
+        '''
+        Content of every file in the challenges of a repository, by path
+        '''
+        return {str(path.relative_to(repo)): path.read_bytes() for path in sorted(repo.joinpath("challenges").rglob("*")) if path.is_file()}
+
+    def test_batch_jobs_match_sequential(self):
+        for slug in ["a", "b", "c", "d"]:
+            self.add_handout(self.add_challenge(slug))
+        parallel_repo = self.repo.parent.joinpath(self.repo.name + "-parallel")
+        shutil.copytree(self.repo, parallel_repo)
+        self.addCleanup(shutil.rmtree, parallel_repo)
+
+        outputs = {}
+        with mock.patch("commands.template_renderer.datetime") as clock:
+            clock.now.return_value = datetime(2024, 5, 1, 10, 0, 0)
+            for repo, jobs in [(self.repo, "1"), (parallel_repo, "2")]:
+                with mock.patch('library.utils.CHALLENGE_REPO_ROOT', repo):
+                    outputs[jobs] = self.run_template("all", "--jobs", jobs, "--reproducible").replace(str(repo), "<repo>")
+
+        self.assertEqual(self.snapshot(parallel_repo), self.snapshot(self.repo))
+        self.assertEqual(outputs["2"], outputs["1"])
+
+        # The output of every challenge is printed as a whole, in the order the challenges were given
+        starts = [outputs["2"].index(f"Rendering challenge web/{slug} ") for slug in ["a", "b", "c", "d"]]
+        self.assertEqual(starts, sorted(starts))
+        for slug, next_start in zip(["a", "b", "c"], starts[1:]):
+            self.assertLess(outputs["2"].index(f"Handout rendered successfully for challenge: {slug}\n"), next_start)
+        self.assertIn("  Renders succeeded: 12\n", outputs["2"])
@@ -0,0 +1,449 @@
+import io
+import os
+import sys
+import shutil
+import zlib
+import hashlib
+import tarfile
+import zipfile
+import unittest
+import tempfile
+import contextlib
+
+from pathlib import Path
+from unittest import mock
+
+sys.path.append('..')
+
+from library.archive import ArchiveError, ArchiveProgress, HandoutArchive, HandoutEntry, RawZipMembers, SourceReader, ZIP_EPOCH
+
+class TestHandoutArchive(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.handout = self.root.joinpath("handout")
+        self.handout.joinpath("src", "lib").mkdir(parents=True)
+        self.handout.joinpath("empty").mkdir()
+        self.handout.joinpath("README.md").write_text("readme\n")
+        self.handout.joinpath("src", "main.c").write_text("int main() {}\n")
+        self.handout.joinpath("src", "lib", ".gitkeep").write_text("")
+        self.handout.joinpath(".gitkeep").write_text("")
+        self.handout.joinpath(".gitignore").write_text("*.o\n")
+        self.root.joinpath("flag.txt").write_text("flag")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def names(self, path: Path):
+        with zipfile.ZipFile(path) as archive:
+            return archive.namelist()
+
+    def test_write(self):
+        destination = self.root.joinpath("web_example.zip")
+        HandoutArchive(self.handout, "web_example").write(destination)
+
+        self.assertEqual(self.names(destination), [
+            "web_example/",
+            "web_example/README.md",
+            "web_example/empty/",
+            "web_example/src/",
+            "web_example/src/lib/",
+            "web_example/src/lib/.gitkeep",
+            "web_example/src/main.c",
+        ])
+        with zipfile.ZipFile(destination) as archive:
+            self.assertEqual(archive.read("web_example/src/main.c"), b"int main() {}\n")
+            self.assertEqual(archive.getinfo("web_example/README.md").compress_type, zipfile.ZIP_DEFLATED)
+            self.assertIsNone(archive.testzip())
+        # Only the archive is left behind
+        self.assertEqual(sorted(path.name for path in self.root.iterdir()), ["flag.txt", "handout", "web_example.zip"])
+
+    def test_symlinks(self):
+        self.handout.joinpath("flag.txt").symlink_to(self.root.joinpath("flag.txt"))
+        self.handout.joinpath("src", "flag.txt").symlink_to(self.root.joinpath("flag.txt"))
+        self.handout.joinpath("src", "outside").symlink_to(self.root, target_is_directory=True)
+        self.handout.joinpath("src", "loop").symlink_to(self.handout.joinpath("src"), target_is_directory=True)
+        self.handout.joinpath("main.c").symlink_to(self.handout.joinpath("src", "main.c"))
+
+        entries = [entry.name for entry in HandoutArchive(self.handout, "web_example").entries()]
+
+        # Links within the handout directory are followed, the rest is skipped, also below the top level
+        self.assertIn("web_example/main.c", entries)
+        self.assertFalse([name for name in entries if "flag" in name or "outside" in name or "loop" in name])
+
+    def test_large_file_streamed(self):
+        content = bytes(range(256)) * 3 * 1024
+        self.handout.joinpath("large.bin").write_bytes(content)
+        destination = self.root.joinpath("web_example.zip")
+
+        # Files are read in chunks, and never as a whole
+        with mock.patch("library.archive.CHUNK_SIZE", 64 * 1024):
+            reads = []
+            original = open
+            def tracked_open(*args, **kwargs):
+                file = original(*args, **kwargs)
+                if str(args[0]).endswith("large.bin"):
+                    read = file.read
+                    file.read = lambda size=-1: reads.append(size) or read(size)
+                return file
+            with mock.patch("builtins.open", tracked_open):
+                HandoutArchive(self.handout, "web_example").write(destination)
+
+        self.assertTrue(reads)
+        self.assertLessEqual(max(reads), 64 * 1024)
+        with zipfile.ZipFile(destination) as archive:
+            self.assertEqual(archive.read("web_example/large.bin"), content)
+
+    def test_failed_write_keeps_previous_archive(self):
+        destination = self.root.joinpath("web_example.zip")
+        destination.write_bytes(b"previous")
+        self.handout.joinpath("unreadable").write_text("data")
+
+        with mock.patch("library.archive.HandoutArchive.compress_file", side_effect=OSError("read error")):
+            with self.assertRaises(OSError):
+                HandoutArchive(self.handout, "web_example").write(destination)
+
+        self.assertEqual(destination.read_bytes(), b"previous")
+        self.assertEqual(sorted(path.name for path in self.root.iterdir()), ["flag.txt", "handout", "web_example.zip"])
+
+    def test_empty(self):
+        empty = self.root.joinpath("empty")
+        empty.mkdir()
+        empty.joinpath(".gitkeep").write_text("")
+        self.assertEqual(HandoutArchive(empty, "web_example").entries(), [])
+
+    def test_reproducible(self):
+        copy = self.root.joinpath("copy")
+        shutil.copytree(self.handout, copy)
+        # Same content, with other timestamps and permissions, created in another order
+        os.utime(copy.joinpath("README.md"), (1_000_000_000, 1_000_000_000))
+        os.chmod(copy.joinpath("src", "main.c"), 0o600)
+        os.chmod(self.handout.joinpath("src", "main.c"), 0o664)
+        copy.joinpath("src", "run.sh").write_text("#!/bin/sh\n")
+        self.handout.joinpath("src", "run.sh").write_text("#!/bin/sh\n")
+        os.chmod(copy.joinpath("src", "run.sh"), 0o700)
+        os.chmod(self.handout.joinpath("src", "run.sh"), 0o775)
+
+        digests = []
+        for source in [self.handout, copy]:
+            destination = self.root.joinpath(f"{source.name}.zip")
+            HandoutArchive(source, "web_example", reproducible=True).write(destination)
+            digests.append(hashlib.sha256(destination.read_bytes()).hexdigest())
+        self.assertEqual(digests[0], digests[1])
+
+        with zipfile.ZipFile(self.root.joinpath("copy.zip")) as archive:
+            self.assertEqual({info.date_time for info in archive.infolist()}, {ZIP_EPOCH})
+            self.assertEqual(archive.getinfo("web_example/src/main.c").external_attr >> 16 & 0o777, 0o644)
+            self.assertEqual(archive.getinfo("web_example/src/run.sh").external_attr >> 16 & 0o777, 0o755)
+            self.assertEqual(archive.getinfo("web_example/src/").external_attr >> 16 & 0o777, 0o755)
+            self.assertEqual(archive.read("web_example/src/run.sh"), b"#!/bin/sh\n")
+
+    def test_source_date(self):
+        self.assertEqual(HandoutArchive.source_date(None), ZIP_EPOCH)
+        self.assertEqual(HandoutArchive.source_date("1700000000"), (2023, 11, 14, 22, 13, 20))
+        # Dates before 1980 cannot be stored
+        self.assertEqual(HandoutArchive.source_date("0"), ZIP_EPOCH)
+
+        destination = self.root.joinpath("web_example.zip")
+        HandoutArchive(self.handout, "web_example", reproducible=True, date_time=HandoutArchive.source_date("1700000000")).write(destination)
+        with zipfile.ZipFile(destination) as archive:
+            # Zip files store timestamps with a resolution of two seconds
+            self.assertEqual({info.date_time for info in archive.infolist()}, {(2023, 11, 14, 22, 13, 20)})
+
+    def test_incremental_unchanged(self):
+        destination = self.root.joinpath("web_example.zip")
+        first = HandoutArchive(self.handout, "web_example").write(destination, incremental=True)
+        self.assertEqual((first.files, first.compressed, first.reused, first.unchanged), (3, 3, 0, False))
+        self.assertTrue(self.root.joinpath(".web_example.manifest.json").is_file())
+        inode = destination.stat().st_ino
+
+        second = HandoutArchive(self.handout, "web_example").write(destination, incremental=True)
+        self.assertTrue(second.unchanged)
+        self.assertEqual(destination.stat().st_ino, inode)
+
+        # Full writes remove the manifest, as it is only kept up to date by incremental writes
+        HandoutArchive(self.handout, "web_example").write(destination)
+        self.assertFalse(self.root.joinpath(".web_example.manifest.json").exists())
+
+    def test_incremental_reuses_members(self):
+        self.handout.joinpath("large.bin").write_bytes(os.urandom(512 * 1024))
+        destination = self.root.joinpath("web_example.zip")
+        HandoutArchive(self.handout, "web_example", reproducible=True).write(destination, incremental=True)
+
+        self.handout.joinpath("README.md").write_text("changed readme\n")
+        self.handout.joinpath("src", "new.c").write_text("int x;\n")
+        with mock.patch("library.archive.HandoutArchive.compress_file", autospec=True, side_effect=HandoutArchive.compress_file) as compress_file:
+            result = HandoutArchive(self.handout, "web_example", reproducible=True).write(destination, incremental=True)
+
+        self.assertEqual((result.files, result.compressed, result.reused), (5, 2, 3))
+        self.assertEqual(sorted(call.args[1].name for call in compress_file.call_args_list), ["web_example/README.md", "web_example/src/new.c"])
+
+        # The archive is identical to one written from scratch
+        full = self.root.joinpath("full.zip")
+        HandoutArchive(self.handout, "web_example", reproducible=True).write(full)
+        self.assertEqual(destination.read_bytes(), full.read_bytes())
+        with zipfile.ZipFile(destination) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.read("web_example/README.md"), b"changed readme\n")
+
+    def test_incremental_touched_files(self):
+        destination = self.root.joinpath("web_example.zip")
+        HandoutArchive(self.handout, "web_example", reproducible=True).write(destination, incremental=True)
+
+        # A fresh checkout gives every file a new modification time, which only matters when the content changed
+        for path in [self.handout.joinpath("README.md"), self.handout.joinpath("src", "main.c")]:
+            os.utime(path, (1_000_000_000, 1_000_000_000))
+        self.assertTrue(HandoutArchive(self.handout, "web_example", reproducible=True).write(destination, incremental=True).unchanged)
+
+        # The manifest is updated with the new modification times, so the files are not hashed again
+        with mock.patch("library.archive.HandoutArchive.hash_file") as hash_file:
+            self.assertTrue(HandoutArchive(self.handout, "web_example", reproducible=True).write(destination, incremental=True).unchanged)
+        hash_file.assert_not_called()
+
+        # Without reproducible archives, the modification time is part of the archive
+        HandoutArchive(self.handout, "web_example").write(destination, incremental=True)
+        os.utime(self.handout.joinpath("README.md"), (1_100_000_000, 1_100_000_000))
+        result = HandoutArchive(self.handout, "web_example").write(destination, incremental=True)
+        self.assertEqual((result.unchanged, result.compressed, result.reused), (False, 0, 3))
+
+    def test_incremental_replaced_archive(self):
+        destination = self.root.joinpath("web_example.zip")
+        HandoutArchive(self.handout, "web_example").write(destination, incremental=True)
+        manifest = self.root.joinpath(".web_example.manifest.json").read_text()
+
+        # An archive written by something else, with the same size, is not trusted
+        size = destination.stat().st_size
+        with zipfile.ZipFile(destination, "w") as archive:
+            archive.writestr("web_example/README.md", b"x" * 10)
+        with open(destination, "ab") as f:
+            f.write(b"\0" * (size - destination.stat().st_size))
+        self.root.joinpath(".web_example.manifest.json").write_text(manifest)
+
+        result = HandoutArchive(self.handout, "web_example").write(destination, incremental=True)
+        self.assertEqual((result.unchanged, result.compressed, result.reused), (False, 3, 0))
+        with zipfile.ZipFile(destination) as archive:
+            self.assertEqual(archive.read("web_example/README.md"), b"readme\n")
+
+    def test_incompressible_files_stored(self):
+        self.handout.joinpath("capture.pcap.gz").write_bytes(b"a" * 10000)
+        self.handout.joinpath("random.bin").write_bytes(os.urandom(256 * 1024))
+        self.handout.joinpath("text.bin").write_bytes(b"compressible " * 20000)
+        destination = self.root.joinpath("web_example.zip")
+        result = HandoutArchive(self.handout, "web_example").write(destination)
+
+        self.assertEqual((result.files, result.stored), (6, 2))
+        with zipfile.ZipFile(destination) as archive:
+            self.assertEqual(archive.getinfo("web_example/capture.pcap.gz").compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(archive.getinfo("web_example/random.bin").compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(archive.getinfo("web_example/text.bin").compress_type, zipfile.ZIP_DEFLATED)
+            self.assertIsNone(archive.testzip())
+
+        # Level 0 stores every file
+        result = HandoutArchive(self.handout, "web_example", compress_level=0).write(destination)
+        self.assertEqual(result.stored, 6)
+
+    def test_entropy(self):
+        self.assertEqual(HandoutArchive.entropy(b""), 0.0)
+        self.assertEqual(HandoutArchive.entropy(b"aaaa"), 0.0)
+        self.assertAlmostEqual(HandoutArchive.entropy(bytes(range(256)) * 4), 8.0)
+
+    def test_parallel_compression(self):
+        for index in range(12):
+            self.handout.joinpath("src", f"file{index}.txt").write_bytes(f"line {index}\n".encode() * (index * 10000 + 1))
+        self.handout.joinpath("random.bin").write_bytes(os.urandom(256 * 1024))
+
+        digests = []
+        for jobs in [1, 4]:
+            destination = self.root.joinpath(f"jobs{jobs}.zip")
+            HandoutArchive(self.handout, "web_example", reproducible=True, compress_level=9, jobs=jobs).write(destination)
+            digests.append(hashlib.sha256(destination.read_bytes()).hexdigest())
+
+        # The archive does not depend on the number of threads, as members are written in order
+        self.assertEqual(digests[0], digests[1])
+        with zipfile.ZipFile(self.root.joinpath("jobs4.zip")) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.read("web_example/src/file3.txt"), b"line 3\n" * 30001)
+
+    def test_parallel_compression_failure(self):
+        for index in range(8):
+            self.handout.joinpath(f"file{index}.txt").write_text("content\n" * 1000)
+        destination = self.root.joinpath("web_example.zip")
+        original = HandoutArchive.compress_file
+
+        def compress_file(archive, entry, info, spool_dir):
+            if entry.name.endswith("file5.txt"):
+                raise OSError("read error")
+            return original(archive, entry, info, spool_dir)
+
+        with mock.patch("library.archive.HandoutArchive.compress_file", autospec=True, side_effect=compress_file):
+            with self.assertRaises(OSError):
+                HandoutArchive(self.handout, "web_example", jobs=3).write(destination)
+        self.assertEqual(sorted(path.name for path in self.root.iterdir()), ["flag.txt", "handout"])
+
+    def test_tar_gz(self):
+        self.handout.joinpath("src", "run.sh").write_text("#!/bin/sh\n")
+        os.chmod(self.handout.joinpath("src", "run.sh"), 0o700)
+        digests = []
+        for name in ["first", "second"]:
+            destination = self.root.joinpath(f"{name}.tar.gz")
+            result = HandoutArchive(self.handout, "web_example", reproducible=True).write_tar(destination, "tar.gz")
+            digests.append(hashlib.sha256(destination.read_bytes()).hexdigest())
+            os.utime(self.handout.joinpath("README.md"), (1_000_000_000, 1_000_000_000))
+
+        self.assertEqual(result.files, 4)
+        self.assertEqual(digests[0], digests[1])
+        with tarfile.open(self.root.joinpath("first.tar.gz")) as archive:
+            self.assertEqual(archive.getnames(), ["web_example", "web_example/README.md", "web_example/empty", "web_example/src", "web_example/src/lib", "web_example/src/lib/.gitkeep", "web_example/src/main.c", "web_example/src/run.sh"])
+            self.assertEqual(archive.extractfile("web_example/src/main.c").read(), b"int main() {}\n")
+            member = archive.getmember("web_example/src/run.sh")
+            self.assertEqual((member.mode, member.mtime, member.uid, member.uname), (0o755, 315532800, 0, ""))
+
+    def test_tar_zst_without_zstandard(self):
+        with mock.patch("library.archive.zstd_module", return_value=None):
+            with self.assertRaises(ArchiveError):
+                HandoutArchive(self.handout, "web_example").write_tar(self.root.joinpath("web_example.tar.zst"), "tar.zst")
+        self.assertEqual(sorted(path.name for path in self.root.iterdir()), ["flag.txt", "handout"])
+
+    def test_large_files_streamed_with_zip64(self):
+        self.handout.joinpath("disk.img").write_bytes(b"sector data " * 50000)
+        destination = self.root.joinpath("web_example.zip")
+        HandoutArchive(self.handout, "web_example", reproducible=True, jobs=2).write(destination)
+
+        # Large files are compressed by the writer instead of the threads, which gives the same archive
+        streamed = self.root.joinpath("streamed.zip")
+        with mock.patch("library.archive.STREAMED_FILE_SIZE", 1024):
+            HandoutArchive(self.handout, "web_example", reproducible=True, jobs=2).write(streamed)
+        self.assertEqual(destination.read_bytes(), streamed.read_bytes())
+
+        with mock.patch("library.archive.ZIP64_FILE_SIZE", 1024):
+            HandoutArchive(self.handout, "web_example", reproducible=True).write(destination, incremental=True)
+            self.handout.joinpath("README.md").write_text("changed readme\n")
+            HandoutArchive(self.handout, "web_example", reproducible=True).write(destination, incremental=True)
+            HandoutArchive(self.handout, "web_example", reproducible=True).write(streamed)
+        self.assertEqual(destination.read_bytes(), streamed.read_bytes())
+        with zipfile.ZipFile(destination) as archive:
+            self.assertIsNone(archive.testzip())
+            # ZIP64 extensions need version 4.5 to extract
+            self.assertEqual(archive.getinfo("web_example/disk.img").extract_version, 45)
+            self.assertEqual(archive.getinfo("web_example/README.md").extract_version, 20)
+            self.assertEqual(archive.read("web_example/disk.img"), b"sector data " * 50000)
+
+    @unittest.skipUnless(hasattr(os, "SEEK_HOLE"), "Sparse files are not supported")
+    def test_sparse_file(self):
+        path = self.handout.joinpath("disk.img")
+        with open(path, "wb") as f:
+            f.truncate(16 * 1024 * 1024)
+            f.seek(5 * 1024 * 1024 + 3)
+            f.write(b"partition")
+            f.seek(16 * 1024 * 1024 - 4)
+            f.write(b"tail")
+        content = bytearray(16 * 1024 * 1024)
+        content[5 * 1024 * 1024 + 3:5 * 1024 * 1024 + 12] = b"partition"
+        content[-4:] = b"tail"
+
+        with SourceReader(path) as reader:
+            if not reader.sparse:
+                self.skipTest("The filesystem does not create sparse files")
+            chunks = list(reader.chunks())
+        self.assertEqual(b"".join(chunks), bytes(content))
+        self.assertTrue(all(len(chunk) == 1024 * 1024 for chunk in chunks))
+
+        destination = self.root.joinpath("web_example.zip")
+        HandoutArchive(self.handout, "web_example").write(destination)
+        with zipfile.ZipFile(destination) as archive:
+            self.assertEqual(archive.read("web_example/disk.img"), bytes(content))
+        # Holes are counted as the space they take on disk when checking the free space
+        self.assertLess(HandoutArchive.estimate_size([HandoutEntry(path, "web_example/disk.img")]), 1024 * 1024)
+
+    def test_progress(self):
+        lines = []
+        with mock.patch("library.archive.time.monotonic", side_effect=[100.0, 102.0, 102.5, 104.0]):
+            progress = ArchiveProgress("web_example.zip", 1024 * 1024, interval=1.0, output=lines.append)
+            progress.advance(512 * 1024)
+            progress.advance(128 * 1024)
+            progress.advance(128 * 1024)
+
+        # Lines are printed at most once per interval
+        self.assertEqual(lines, [
+            "Archiving web_example.zip: 512.0 KiB of 1.0 MiB (50%), 256.0 KiB/s, ETA 2s",
+            "Archiving web_example.zip: 768.0 KiB of 1.0 MiB (75%), 192.0 KiB/s, ETA 1s",
+        ])
+        self.assertEqual(ArchiveProgress.format_duration(3725), "1h 02m 05s")
+        self.assertEqual(ArchiveProgress.format_duration(130), "2m 10s")
+
+    def test_progress_of_write(self):
+        self.handout.joinpath("large.txt").write_bytes(b"line\n" * 500000)
+        output = io.StringIO()
+        with mock.patch("library.archive.PROGRESS_INTERVAL_SECONDS", 0.0), contextlib.redirect_stdout(output):
+            HandoutArchive(self.handout, "web_example").write(self.root.joinpath("web_example.zip"))
+        lines = output.getvalue().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(lines[-1].startswith("Archiving web_example.zip: 2.4 MiB of 2.4 MiB (100%)"))
+
+    def test_not_enough_space(self):
+        destination = self.root.joinpath("web_example.zip")
+        destination.write_bytes(b"previous")
+        usage = shutil.disk_usage(self.root)._replace(free=10)
+        with mock.patch("library.archive.shutil.disk_usage", return_value=usage):
+            with self.assertRaises(ArchiveError) as context:
+                HandoutArchive(self.handout, "web_example").write(destination)
+            with self.assertRaises(ArchiveError):
+                HandoutArchive(self.handout, "web_example").write_tar(self.root.joinpath("web_example.tar.gz"), "tar.gz")
+
+        self.assertIn("Not enough free space to write web_example.zip", str(context.exception))
+        self.assertEqual(destination.read_bytes(), b"previous")
+        self.assertEqual(sorted(path.name for path in self.root.iterdir()), ["flag.txt", "handout", "web_example.zip"])
+
+class TestRawZipMembers(unittest.TestCase):
+    DATA = b"raw member data " * 4096
+
+    def written(self, zip64: bool, raw: bool) -> bytes:
+        '''
+        Archive with a single member, written by ZipFile.open, or deflated ahead of time and appended
+        '''
+        output = io.BytesIO()
+        info = zipfile.ZipInfo("data.bin", ZIP_EPOCH)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = HandoutArchive.attributes(0o644, False)
+        if zip64:
+            HandoutArchive.set_zip64_version(info)
+        with zipfile.ZipFile(output, "w") as archive:
+            if raw:
+                compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+                compressed = compressor.compress(self.DATA) + compressor.flush()
+                info.CRC = zlib.crc32(self.DATA)
+                info.file_size = len(self.DATA)
+                info.compress_size = len(compressed)
+                RawZipMembers.append(archive, info, io.BytesIO(compressed), zip64)
+            else:
+                RawZipMembers.set_compress_level(info, 9)
+                with archive.open(info, "w", force_zip64=zip64) as target:
+                    target.write(self.DATA)
+        return output.getvalue()
+
+    def test_append_matches_open(self):
+        for zip64 in [False, True]:
+            with self.subTest(zip64=zip64):
+                written = self.written(zip64, raw=False)
+                self.assertEqual(self.written(zip64, raw=True), written)
+                with zipfile.ZipFile(io.BytesIO(written)) as archive:
+                    self.assertIsNone(archive.testzip())
+                    self.assertEqual(archive.getinfo("data.bin").extract_version, 45 if zip64 else 20)
+                    self.assertEqual(archive.read("data.bin"), self.DATA)
+
+    def test_data_offset(self):
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, "w") as archive:
+            archive.writestr("first.txt", b"first")
+            info = zipfile.ZipInfo("second.txt", ZIP_EPOCH)
+            info.extra = b"\xfe\xca\x04\x00abcd"
+            archive.writestr(info, b"second")
+        with zipfile.ZipFile(output) as archive:
+            info = archive.getinfo("second.txt")
+        output.seek(0)
+        offset = RawZipMembers.data_offset(output, info)
+        self.assertEqual(output.getvalue()[offset:offset + len(b"second")], b"second")
+
+        info.header_offset += 1
+        with self.assertRaises(zipfile.BadZipFile):
+            RawZipMembers.data_offset(output, info)
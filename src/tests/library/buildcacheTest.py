@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import unittest
+import tempfile
+
+from pathlib import Path
+from unittest import mock
+
+sys.path.append('..')
+
+from library.buildcache import BuildCache, CacheOptions
+
+class TestBuildCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repo = Path(self.temp_dir.name)
+        self.patch = mock.patch('library.utils.CHALLENGE_REPO_ROOT', self.repo)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        self.temp_dir.cleanup()
+
+    def test_cache_arguments(self):
+        image = "registry.local/ctf-web-multi-app"
+        self.assertEqual(BuildCache.arguments(CacheOptions(), image), [])
+        self.assertEqual(BuildCache.arguments(CacheOptions("registry"), image), [
+            "--cache-from", f"type=registry,ref={image}:buildcache",
+            "--cache-to", f"type=registry,ref={image}:buildcache,mode=max",
+        ])
+        self.assertEqual(BuildCache.arguments(CacheOptions("inline"), image), [
+            "--cache-from", f"type=registry,ref={image}:latest",
+            "--cache-to", "type=inline",
+        ])
+
+        # Nothing to import from before the first build
+        directory = BuildCache.directory(CacheOptions("local"), image)
+        self.assertEqual(directory, self.repo.joinpath(".ctf-cache", "buildkit", "registry-local-ctf-web-multi-app"))
+        self.assertEqual(BuildCache.arguments(CacheOptions("local"), image), [
+            "--cache-to", f"type=local,dest={directory}-new,mode=max",
+        ])
+
+    def test_local_cache_prune(self):
+        cache = CacheOptions("local", max_age_days=1, max_size_mb=1)
+        root = cache.root()
+        for name, size, age in [("old", 10, 2), ("large", 600 * 1024, 0.5), ("recent", 600 * 1024, 0)]:
+            directory = root.joinpath(name)
+            directory.mkdir(parents=True)
+            directory.joinpath("blob").write_bytes(b"x" * size)
+            timestamp = time.time() - age * 24 * 60 * 60
+            os.utime(directory, (timestamp, timestamp))
+
+        removed = BuildCache.prune(cache)
+        self.assertEqual([directory.name for directory in removed], ["old", "large"])
+        self.assertEqual([directory.name for directory in root.iterdir()], ["recent"])
+        # Only local caches are pruned
+        self.assertEqual(BuildCache.prune(CacheOptions("registry", directory=root, max_age_days=0.0001)), [])
@@ -0,0 +1,117 @@
+import sys
+import json
+import base64
+import unittest
+
+from unittest import mock
+
+sys.path.append('..')
+
+from library.buildkit import BuildProgress
+
+CONTEXT = "sha256:context"
+BASE = "sha256:base"
+INSTALL = "sha256:install"
+COPY = "sha256:copy"
+
+# Raw JSON progress of a build with a cached base image and install step, and a slow copy, as printed by 'docker build --progress=rawjson'
+UPDATES = [
+    {"vertexes": [{"digest": CONTEXT, "name": "[internal] load build context", "started": "2024-05-01T10:00:00.000000000Z"}]},
+    {"statuses": [{"id": "transferring context", "vertex": CONTEXT, "current": 1024, "timestamp": "2024-05-01T10:00:00.100Z", "started": "2024-05-01T10:00:00Z"}]},
+    {"statuses": [{"id": "transferring context", "vertex": CONTEXT, "current": 3 * 1024 * 1024, "timestamp": "2024-05-01T10:00:00.500Z", "started": "2024-05-01T10:00:00Z", "completed": "2024-05-01T10:00:00.500Z"}]},
+    {"vertexes": [{"digest": CONTEXT, "name": "[internal] load build context", "started": "2024-05-01T10:00:00.000000000Z", "completed": "2024-05-01T10:00:00.512345678Z"}]},
+    {"vertexes": [
+        {"digest": BASE, "name": "[1/3] FROM docker.io/library/python:3.11", "started": "2024-05-01T10:00:00.6Z", "completed": "2024-05-01T10:00:00.6Z", "cached": True},
+        {"digest": INSTALL, "name": "[2/3] RUN pip install -r requirements.txt", "inputs": [BASE], "started": "2024-05-01T10:00:00.6Z", "completed": "2024-05-01T10:00:00.6Z", "cached": True},
+    ]},
+    {"vertexes": [{"digest": COPY, "name": "[3/3] COPY . /app", "inputs": [INSTALL], "started": "2024-05-01T10:00:01Z"}]},
+    {"logs": [{"vertex": COPY, "stream": 1, "data": base64.b64encode(b"copying files\ncopy").decode(), "timestamp": "2024-05-01T10:00:02Z"}]},
+    {"logs": [{"vertex": COPY, "stream": 1, "data": base64.b64encode(b"ing done\n").decode(), "timestamp": "2024-05-01T10:00:03Z"}]},
+    {"vertexes": [{"digest": COPY, "name": "[3/3] COPY . /app", "inputs": [INSTALL], "started": "2024-05-01T10:00:01Z", "completed": "2024-05-01T10:00:05.250Z"}]},
+]
+
+class TestBuildProgress(unittest.TestCase):
+    def feed(self, progress, updates, piece=17):
+        # Chunks do not line up with lines, as they are read from a pipe
+        data = b"".join(json.dumps(update).encode() + b"\n" for update in updates)
+        lines = []
+        for start in range(0, len(data), piece):
+            lines += progress.feed(data[start:start + piece])
+        return lines + progress.flush()
+
+    def test_output(self):
+        lines = self.feed(BuildProgress(), UPDATES)
+        self.assertEqual(lines, [
+            "#1 [internal] load build context",
+            "#1 transferring context: 3.0 MiB done",
+            "#1 DONE 0.5s",
+            "#2 [1/3] FROM docker.io/library/python:3.11",
+            "#2 CACHED",
+            "#3 [2/3] RUN pip install -r requirements.txt",
+            "#3 CACHED",
+            "#4 [3/3] COPY . /app",
+            "#4 copying files",
+            "#4 copying done",
+            "#4 DONE 4.2s",
+        ])
+
+    def test_summary(self):
+        progress = BuildProgress()
+        self.feed(progress, UPDATES)
+        summary = progress.summary(slowest=2)
+
+        self.assertEqual((summary["steps"], summary["cached_steps"]), (3, 2))
+        self.assertAlmostEqual(summary["cache_hit_ratio"], 2 / 3)
+        self.assertEqual(summary["context_bytes"], 3 * 1024 * 1024)
+        self.assertAlmostEqual(summary["duration"], 5.25)
+        self.assertIsNone(summary["failed_step"])
+        self.assertEqual([step["name"] for step in summary["slowest"]], ["[3/3] COPY . /app", "[internal] load build context"])
+        self.assertAlmostEqual(summary["slowest"][0]["duration"], 4.25)
+
+        self.assertEqual(BuildProgress.describe(summary), [
+            "Build steps: 3, 2 cached (67%), build context 3.0 MiB",
+            "Slowest steps:",
+            "     4.2s  [3/3] COPY . /app",
+            "     0.5s  [internal] load build context",
+        ])
+
+    def test_failed_step(self):
+        progress = BuildProgress()
+        lines = self.feed(progress, UPDATES[:5] + [
+            {"vertexes": [{"digest": COPY, "name": "[builder 3/3] RUN make", "started": "2024-05-01T10:00:01Z", "completed": "2024-05-01T10:00:02Z", "error": "process \"/bin/sh -c make\" did not complete successfully: exit code: 2"}]},
+        ])
+        lines += progress.feed(b"ERROR: failed to solve: process did not complete successfully\n")
+
+        self.assertIn("#4 ERROR: process \"/bin/sh -c make\" did not complete successfully: exit code: 2", lines)
+        self.assertNotIn("#4 DONE 1.0s", lines)
+        self.assertEqual(lines[-1], "ERROR: failed to solve: process did not complete successfully")
+        summary = progress.summary()
+        self.assertEqual(summary["failed_step"], "[builder 3/3] RUN make")
+        self.assertEqual((summary["steps"], summary["cached_steps"]), (3, 2))
+
+    def test_timestamp(self):
+        self.assertEqual(BuildProgress.timestamp("2024-05-01T10:00:00.123456789Z").microsecond, 123456)
+        self.assertEqual(BuildProgress.timestamp("2024-05-01T12:00:00+02:00"), BuildProgress.timestamp("2024-05-01T10:00:00Z"))
+        self.assertIsNone(BuildProgress.timestamp("0001-01-01T00:00:00Z"))
+        self.assertIsNone(BuildProgress.timestamp(None))
+
+    def test_timestamp_short_fraction(self):
+        self.assertEqual(BuildProgress.timestamp("2024-05-01T10:00:05.5Z").microsecond, 500000)
+        self.assertEqual(BuildProgress.timestamp("2024-05-01T10:00:05.12345Z").microsecond, 123450)
+        self.assertEqual(BuildProgress.timestamp("2024-05-01T10:00:05.5+02:00"), BuildProgress.timestamp("2024-05-01T08:00:05.500Z"))
+        self.assertEqual(BuildProgress.timestamp("2024-05-01T10:00:05Z").microsecond, 0)
+        self.assertIsNone(BuildProgress.timestamp("yesterday"))
+
+    def test_empty_build(self):
+        progress = BuildProgress()
+        self.assertEqual(progress.feed(b"#0 building with \"default\" instance\n"), ["#0 building with \"default\" instance"])
+        summary = progress.summary()
+        self.assertEqual((summary["steps"], summary["cache_hit_ratio"], summary["context_bytes"]), (0, None, None))
+        self.assertEqual(BuildProgress.describe(summary), ["No build steps reported"])
+
+    def test_overlong_line_skipped(self):
+        progress = BuildProgress()
+        with mock.patch("library.buildkit.MAX_PROGRESS_LINE_BYTES", 100):
+            lines = progress.feed(b"{" + b"x" * 150)
+            lines += progress.feed(b"x" * 50 + b"}\n" + json.dumps(UPDATES[0]).encode() + b"\n")
+        self.assertEqual(lines, ["(overlong progress update skipped)", "#1 [internal] load build context"])
@@ -0,0 +1,84 @@
+import unittest
+import sys
+import tempfile
+
+from pathlib import Path
+from unittest import mock
+
+sys.path.append('..')
+
+from library.data import Challenge
+from library.cache import RenderCache
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repo = Path(self.temp_dir.name)
+        self.patch = mock.patch('library.utils.CHALLENGE_REPO_ROOT', self.repo)
+        self.patch.start()
+
+        self.challenge = Challenge(
+            name="Cache Challenge",
+            slug="cache-challenge",
+            author="Test Author",
+            category="web",
+            difficulty="easy",
+            type="shared",
+            flag="ctfpilot{cache}",
+        )
+        self.challenge_dir = self.challenge.get_path()
+        self.challenge_dir.joinpath("template").mkdir(parents=True)
+        self.challenge_dir.joinpath("challenge.yml").write_text(self.challenge.str_yml("-"))
+        self.challenge_dir.joinpath("template", "k8s.yml").write_text("kind: Deployment\n")
+        self.challenge_dir.joinpath("description.md").write_text("# Cache Challenge\n")
+        self.repo.joinpath("template").mkdir()
+        self.repo.joinpath("template", "challenge-configmap.yml").write_text("kind: ConfigMap\n")
+
+        self.output = self.challenge_dir.joinpath("k8s", "config", "k8s.yml")
+        self.output.parent.mkdir(parents=True)
+        self.output.write_text("rendered\n")
+
+        self.args = {"expires": 3600, "available": 0, "repo": "owner/repo"}
+
+    def tearDown(self):
+        self.patch.stop()
+        self.temp_dir.cleanup()
+
+    def store(self):
+        cache = RenderCache(self.challenge)
+        digest = cache.digest("configmap", self.args)
+        cache.store("configmap", digest, [str(self.output)])
+        return cache
+
+    def test_unchanged_inputs_are_fresh(self):
+        cache = self.store()
+        self.assertTrue(cache.is_fresh("configmap", cache.digest("configmap", self.args)))
+
+    def test_renderers_are_cached_separately(self):
+        cache = self.store()
+        self.assertFalse(cache.is_fresh("k8s", cache.digest("k8s", self.args)))
+
+    def test_changed_description(self):
+        cache = self.store()
+        self.challenge_dir.joinpath("description.md").write_text("# Changed\n")
+        self.assertFalse(cache.is_fresh("configmap", cache.digest("configmap", self.args)))
+
+    def test_changed_version(self):
+        cache = self.store()
+        self.challenge.save_version(2)
+        self.assertFalse(cache.is_fresh("configmap", cache.digest("configmap", self.args)))
+
+    def test_changed_shared_template(self):
+        cache = self.store()
+        self.repo.joinpath("template", "challenge-configmap.yml").write_text("kind: Changed\n")
+        self.assertFalse(cache.is_fresh("configmap", cache.digest("configmap", self.args)))
+
+    def test_changed_args(self):
+        cache = self.store()
+        args = dict(self.args, expires=7200)
+        self.assertFalse(cache.is_fresh("configmap", cache.digest("configmap", args)))
+
+    def test_missing_output(self):
+        cache = self.store()
+        self.output.unlink()
+        self.assertFalse(cache.is_fresh("configmap", cache.digest("configmap", self.args)))
@@ -0,0 +1,191 @@
+import sys
+import time
+import asyncio
+import unittest
+import tempfile
+import threading
+import subprocess
+
+from pathlib import Path
+
+sys.path.append('..')
+
+from library.docker import DockerRunner, MAX_LINE_BYTES
+
+# Prints lines in two halves, flushing in between, so the reader sees partial lines
+SPLIT_LINES = '''
+import sys, time
+for i in range(20):
+    sys.stdout.write(f"{sys.argv[1]} line {i} ")
+    sys.stdout.flush()
+    time.sleep(0.005)
+    sys.stdout.write("done\\n")
+    sys.stdout.flush()
+sys.stdout.write("no newline")
+'''
+
+# Prints 100 numbered lines, one invalid UTF-8 line, then fails
+NOISY_FAILURE = '''
+import sys, time
+for i in range(100):
+    print(f"line {i}", flush=True)
+sys.stdout.buffer.write(b"raw \\xff bytes\\n")
+sys.stdout.flush()
+time.sleep(0.3)
+sys.exit(1)
+'''
+
+class TestDockerRunner(unittest.TestCase):
+    def runner(self, lines, timeout=None, **kwargs):
+        # The Python interpreter stands in for the docker binary
+        return DockerRunner(sys.executable, timeout, lambda line, prefix: lines.append(prefix + line), **kwargs)
+
+    def test_concurrent_output_lines(self):
+        lines = []
+        runner = self.runner(lines)
+
+        async def run_both():
+            await asyncio.gather(
+                runner.run(["-c", SPLIT_LINES, "a"], "[a] "),
+                runner.run(["-c", SPLIT_LINES, "b"], "[b] "),
+            )
+        asyncio.run(run_both())
+
+        for name in ["a", "b"]:
+            own = [line for line in lines if line.startswith(f"[{name}] ")]
+            self.assertEqual(own, [f"[{name}] {name} line {i} done" for i in range(20)] + [f"[{name}] no newline"])
+        self.assertEqual(len(lines), 42)
+
+    def test_exit_code(self):
+        runner = self.runner([])
+        with self.assertRaises(subprocess.CalledProcessError) as context:
+            runner.run_sync(["-c", "import sys; sys.exit(3)"])
+        self.assertEqual(context.exception.returncode, 3)
+        self.assertEqual(context.exception.cmd, [sys.executable, "-c", "import sys; sys.exit(3)"])
+        self.assertEqual(DockerRunner.describe_error(context.exception), "Command failed with exit code 3")
+
+    def test_timeout(self):
+        lines = []
+        runner = self.runner(lines, timeout=0.3)
+        start = time.monotonic()
+        with self.assertRaises(subprocess.TimeoutExpired):
+            runner.run_sync(["-c", "import time; print('started', flush=True); time.sleep(30)"])
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(lines, ["started"])
+
+    def test_cancel(self):
+        runner = self.runner([])
+
+        async def cancel_running():
+            task = asyncio.ensure_future(runner.run(["-c", "import time; time.sleep(30)"]))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        start = time.monotonic()
+        asyncio.run(cancel_running())
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_run_thread(self):
+        lines = []
+        runner = self.runner(lines)
+
+        def work(write):
+            write(b"first line\nsecond ")
+            write(b"line\nno newline")
+            return "result"
+
+        result = asyncio.run(runner.run_thread(work, lambda: None, ["work"], "[a] "))
+        self.assertEqual(result, "result")
+        self.assertEqual(lines, ["[a] first line", "[a] second line", "[a] no newline"])
+
+    def test_run_thread_timeout(self):
+        lines = []
+        runner = self.runner(lines, timeout=0.3)
+        stopped = threading.Event()
+
+        def work(write):
+            write(b"started\n")
+            stopped.wait(10)
+            write(b"after stop\n")
+            raise OSError("stopped")
+
+        start = time.monotonic()
+        with self.assertRaises(subprocess.TimeoutExpired) as context:
+            asyncio.run(runner.run_thread(work, stopped.set, ["work"]))
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(context.exception.cmd, ["work"])
+        self.assertEqual(lines, ["started"])
+
+    def test_missing_binary(self):
+        runner = DockerRunner("/nonexistent/docker")
+        with self.assertRaises(OSError):
+            runner.run_sync(["version"])
+
+class TestDockerRunnerLogModes(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.log = Path(self.temp_dir.name).joinpath("logs", "image.log")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def run_noisy(self, log_mode, **kwargs):
+        lines = []
+        runner = DockerRunner(sys.executable, None, lambda line, prefix: lines.append(prefix + line), log_mode=log_mode, **kwargs)
+        with self.assertRaises(subprocess.CalledProcessError):
+            runner.run_sync(["-c", NOISY_FAILURE], "[app] ", log=self.log)
+        return lines
+
+    def test_tail(self):
+        lines = self.run_noisy("tail", tail_lines=5, summary_interval=0.1)
+
+        # The raw output is written to the log file, without decoding
+        self.assertTrue(self.log.read_bytes().endswith(b"line 99\nraw \xff bytes\n"))
+        self.assertTrue(any(line.startswith("[app] Still running after") for line in lines))
+        self.assertNotIn("[app] line 50", lines)
+        output = [line for line in lines if not line.startswith("[app] Still running")]
+        self.assertEqual(output, [
+            "[app] Last 5 lines of output:",
+            "[app] line 96",
+            "[app] line 97",
+            "[app] line 98",
+            "[app] line 99",
+            "[app] raw \ufffd bytes",
+            f"[app] Full output written to {self.log}",
+        ])
+
+    def test_quiet(self):
+        lines = self.run_noisy("quiet")
+        self.assertEqual(lines, [f"[app] Full output written to {self.log}"])
+
+        # Output of following commands is appended
+        DockerRunner(sys.executable, log_mode="quiet", output=lambda line, prefix: None).run_sync(["-c", "print('pushed')"], log=self.log)
+        self.assertTrue(self.log.read_bytes().endswith(b"bytes\npushed\n"))
+
+    def test_run_thread_failure(self):
+        lines = []
+        runner = DockerRunner(sys.executable, None, lambda line, prefix: lines.append(prefix + line), log_mode="tail", tail_lines=2)
+
+        def work(write):
+            write(b"step 1\nstep 2\nstep 3\n")
+            raise OSError("build failed")
+
+        with self.assertRaises(OSError):
+            asyncio.run(runner.run_thread(work, lambda: None, ["work"], "[app] ", log=self.log))
+        self.assertEqual(self.log.read_bytes(), b"step 1\nstep 2\nstep 3\n")
+        self.assertEqual(lines, ["[app] Last 2 lines of output:", "[app] step 2", "[app] step 3", f"[app] Full output written to {self.log}"])
+
+    def test_stream_without_log(self):
+        lines = []
+        DockerRunner(sys.executable, output=lambda line, prefix: lines.append(line), log_mode="tail").run_sync(["-c", "print('hello')"])
+        self.assertEqual(lines, ["hello"])
+        self.assertFalse(self.log.exists())
+
+    def test_long_lines_bounded(self):
+        lines = []
+        runner = DockerRunner(sys.executable, output=lambda line, prefix: lines.append(line))
+        runner.run_sync(["-c", f"import sys; sys.stdout.write('x' * {MAX_LINE_BYTES * 3} + '\\n' + 'y' * {MAX_LINE_BYTES * 3})"])
+        self.assertTrue(all(len(line) <= MAX_LINE_BYTES for line in lines))
+        self.assertEqual("".join(lines), "x" * MAX_LINE_BYTES * 3 + "y" * MAX_LINE_BYTES * 3)
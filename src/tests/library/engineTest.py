@@ -0,0 +1,265 @@
+import io
+import sys
+import json
+import time
+import base64
+import tarfile
+import unittest
+import tempfile
+import threading
+import socketserver
+import http.server
+
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+sys.path.append('..')
+
+from library.engine import EngineClient, EngineError, EngineOperation, BuildContext, EXTERNAL_DOCKERFILE
+
+class FakeEngineHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def send_messages(self, messages, delay=0.0):
+        # Messages are sent in chunks that do not line up with the messages, as the daemon does not guarantee it either
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for message in messages:
+            payload = json.dumps(message).encode() + b"\r\n"
+            for start in range(0, len(payload), 7):
+                chunk = payload[start:start + 7]
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+            time.sleep(delay)
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def send_error_message(self, status, message):
+        content = json.dumps({"message": message}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        body = self.read_body()
+        request = {"path": url.path, "query": query, "headers": dict(self.headers)}
+        self.server.requests.append(request)
+
+        if url.path == "/build":
+            with tarfile.open(fileobj=io.BytesIO(body)) as archive:
+                request["files"] = {member.name: archive.extractfile(member).read() if member.isfile() else member.type for member in archive.getmembers()}
+            dockerfile = request["files"].get(query["dockerfile"][0], b"")
+            if b"fail" in dockerfile:
+                self.send_messages([{"stream": "Step 1/1 : RUN fail\n"}, {"errorDetail": {"code": 1, "message": "The command '/bin/sh -c fail' returned a non-zero code: 1"}, "error": "The command '/bin/sh -c fail' returned a non-zero code: 1"}])
+            elif b"slow" in dockerfile:
+                self.send_messages([{"stream": "Step 1/1 : RUN slow\n"}] * 20, delay=0.1)
+            else:
+                self.send_messages([
+                    {"stream": "Step 1/2 : FROM scratch\n"},
+                    {"stream": "Step 2/2 : COPY . /\n"},
+                    {"aux": {"ID": "sha256:" + "1" * 64}},
+                    {"stream": "Successfully built 111111111111\n"},
+                ])
+        elif url.path.startswith("/images/") and url.path.endswith("/push"):
+            name = url.path[len("/images/"):-len("/push")]
+            if name in self.server.missing:
+                self.send_error_message(404, f"An image does not exist locally with the tag: {name}")
+                return
+            tag = query["tag"][0]
+            self.send_messages([
+                {"status": f"The push refers to repository [{name}]"},
+                {"status": "Pushing", "progressDetail": {"current": 512, "total": 1024}, "id": "abc"},
+                {"status": "Pushed", "progressDetail": {}, "id": "abc"},
+                {"status": f"{tag}: digest: sha256:{'2' * 64} size: 527"},
+                {"progressDetail": {}, "aux": {"Tag": tag, "Digest": "sha256:" + "2" * 64, "Size": 527}},
+            ])
+        else:
+            self.send_error_message(404, "page not found")
+
+class FakeEngine(socketserver.ThreadingUnixStreamServer):
+    '''
+    Docker Engine API on a unix socket, building any context and pushing any image
+    '''
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(self, path: Path):
+        super().__init__(str(path), FakeEngineHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = []
+        self.missing = set()
+        self.thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    def handle_error(self, request, client_address):
+        # Clients close their connection when a request is cancelled
+        pass
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class TestEngineClient(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.engine = FakeEngine(self.root.joinpath("docker.sock"))
+        self.client = EngineClient(f"unix://{self.root.joinpath('docker.sock')}")
+
+        self.context = self.root.joinpath("context")
+        self.context.joinpath("app").mkdir(parents=True)
+        self.context.joinpath("empty").mkdir()
+        self.context.joinpath("Dockerfile").write_text("FROM scratch\nCOPY . /\n")
+        self.context.joinpath("app", "main.py").write_text("print('hello')\n")
+        self.context.joinpath("secret.txt").write_text("flag")
+        self.context.joinpath(".dockerignore").write_text("secret.txt\nDockerfile\n")
+
+    def tearDown(self):
+        self.client.close()
+        self.engine.stop()
+        self.temp_dir.cleanup()
+
+    def test_socket_path(self):
+        self.assertEqual(EngineClient.socket_path("unix:///run/docker.sock"), "/run/docker.sock")
+        self.assertEqual(EngineClient.socket_path("/tmp/docker.sock"), "/tmp/docker.sock")
+        with self.assertRaises(ValueError):
+            EngineClient.socket_path("tcp://127.0.0.1:2375")
+
+    def test_build(self):
+        output = []
+        image_id = self.client.build(self.context, self.context.joinpath("Dockerfile"), ["registry.local/app:latest", "registry.local/app:3"], {"label": "value"}, output.append)
+
+        self.assertEqual(image_id, "sha256:" + "1" * 64)
+        self.assertEqual(b"".join(output), b"Step 1/2 : FROM scratch\nStep 2/2 : COPY . /\nSuccessfully built 111111111111\n")
+        request = self.engine.requests[0]
+        self.assertEqual(request["query"]["t"], ["registry.local/app:latest", "registry.local/app:3"])
+        self.assertEqual(request["query"]["dockerfile"], ["Dockerfile"])
+        self.assertEqual(json.loads(request["query"]["labels"][0]), {"label": "value"})
+        self.assertEqual(request["headers"]["Transfer-Encoding"], "chunked")
+        # Excluded files are left out, except for the Dockerfile and .dockerignore, which the daemon reads
+        self.assertEqual(request["files"]["app/main.py"], b"print('hello')\n")
+        self.assertEqual(request["files"]["empty"], tarfile.DIRTYPE)
+        self.assertIn("Dockerfile", request["files"])
+        self.assertIn(".dockerignore", request["files"])
+        self.assertNotIn("secret.txt", request["files"])
+
+    def test_dockerfile_outside_context(self):
+        dockerfile = self.root.joinpath("Dockerfile.outside")
+        dockerfile.write_text("FROM scratch\n")
+        self.client.build(self.context.joinpath("app"), dockerfile, ["app:latest"])
+
+        request = self.engine.requests[0]
+        self.assertEqual(request["query"]["dockerfile"], [EXTERNAL_DOCKERFILE])
+        self.assertEqual(set(request["files"]), {"main.py", EXTERNAL_DOCKERFILE})
+        self.assertEqual(request["files"][EXTERNAL_DOCKERFILE], b"FROM scratch\n")
+
+    def test_large_file_streamed(self):
+        content = bytes(range(256)) * 4096 + b"end"
+        self.context.joinpath("app", "large.bin").write_bytes(content)
+        chunks = list(BuildContext(self.context, self.context.joinpath("Dockerfile")).chunks())
+
+        self.assertGreater(len(chunks), 1)
+        with tarfile.open(fileobj=io.BytesIO(b"".join(chunks))) as archive:
+            self.assertEqual(archive.extractfile("app/large.bin").read(), content)
+
+    def test_build_error(self):
+        self.context.joinpath("Dockerfile").write_text("FROM scratch\nRUN fail\n")
+        output = []
+        with self.assertRaises(EngineError) as context:
+            self.client.build(self.context, self.context.joinpath("Dockerfile"), ["app:latest"], write=output.append)
+
+        self.assertEqual(str(context.exception), "The command '/bin/sh -c fail' returned a non-zero code: 1")
+        self.assertEqual(output, [b"Step 1/1 : RUN fail\n"])
+
+    def test_push(self):
+        config = self.root.joinpath("config.json")
+        config.write_text(json.dumps({"auths": {"registry.local": {"auth": base64.b64encode(b"user:secret").decode()}}}))
+        output = []
+        digest = self.client.push("registry.local/app", "latest", EngineClient.credentials("registry.local", config), output.append)
+
+        self.assertEqual(digest, "sha256:" + "2" * 64)
+        # Progress updates are left out
+        self.assertEqual(b"".join(output).decode().splitlines(), ["The push refers to repository [registry.local/app]", "abc: Pushed", f"latest: digest: sha256:{'2' * 64} size: 527"])
+        request = self.engine.requests[0]
+        self.assertEqual((request["path"], request["query"]["tag"]), ("/images/registry.local/app/push", ["latest"]))
+        auth = json.loads(base64.urlsafe_b64decode(request["headers"]["X-Registry-Auth"]))
+        self.assertEqual(auth, {"username": "user", "password": "secret", "serveraddress": "registry.local"})
+
+    def test_registry(self):
+        self.assertEqual(EngineClient.registry("ghcr.io/ctfpilot/app"), "ghcr.io")
+        self.assertEqual(EngineClient.registry("localhost:5000/app"), "localhost:5000")
+        self.assertEqual(EngineClient.registry("ctfpilot/app"), "docker.io")
+
+    def test_http_error(self):
+        self.engine.missing.add("registry.local/missing")
+        with self.assertRaises(EngineError) as context:
+            self.client.push("registry.local/missing", "latest", {})
+        self.assertIn("404", str(context.exception))
+        self.assertIn("An image does not exist locally", str(context.exception))
+
+    def test_connection_reused(self):
+        for _ in range(3):
+            self.client.push("registry.local/app", "latest", {})
+        self.client.build(self.context, self.context.joinpath("Dockerfile"), ["app:latest"])
+        self.engine.missing.add("registry.local/missing")
+        with self.assertRaises(EngineError):
+            self.client.push("registry.local/missing", "latest", {})
+        self.client.push("registry.local/app", "latest", {})
+
+        self.assertEqual(len(self.engine.requests), 6)
+        self.assertEqual(self.engine.connections, 1)
+
+    def test_concurrent_requests(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.client.push("registry.local/app", "latest", {}))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ["sha256:" + "2" * 64] * 4)
+        self.assertLessEqual(self.engine.connections, 4)
+
+    def test_missing_socket(self):
+        client = EngineClient(str(self.root.joinpath("missing.sock")))
+        with self.assertRaises(EngineError) as context:
+            client.push("registry.local/app", "latest", {})
+        self.assertIn("Could not connect to the Docker Engine", str(context.exception))
+
+    def test_cancel(self):
+        self.context.joinpath("Dockerfile").write_text("FROM scratch\nRUN slow\n")
+        operation = EngineOperation()
+        threading.Timer(0.3, operation.cancel).start()
+
+        start = time.monotonic()
+        with self.assertRaises(EngineError) as context:
+            self.client.build(self.context, self.context.joinpath("Dockerfile"), ["app:latest"], operation=operation)
+        self.assertEqual(str(context.exception), "Request was cancelled")
+        self.assertLess(time.monotonic() - start, 1.5)
@@ -0,0 +1,167 @@
+import os
+import unittest
+import sys
+import tempfile
+
+from pathlib import Path
+
+sys.path.append('..')
+
+from library.fingerprint import BuildState, DockerIgnore, context_files, context_fingerprint
+
+class TestDockerIgnore(unittest.TestCase):
+    def test_patterns(self):
+        ignore = DockerIgnore([
+            "# comment",
+            "",
+            "*.md",
+            "!README.md",
+            "**/*.log",
+            "/build",
+            "node_modules",
+            "tmp/**",
+            "secret?.txt",
+            "data/[a-c].bin",
+        ])
+        self.assertTrue(ignore.matches("notes.md"))
+        self.assertFalse(ignore.matches("README.md"))
+        self.assertFalse(ignore.matches("docs/notes.md"))
+        self.assertTrue(ignore.matches("app.log"))
+        self.assertTrue(ignore.matches("deep/in/tree/app.log"))
+        self.assertTrue(ignore.matches("build/output.js"))
+        self.assertFalse(ignore.matches("src/build/output.js"))
+        self.assertTrue(ignore.matches("node_modules/package/index.js"))
+        self.assertTrue(ignore.matches("tmp/a/b"))
+        self.assertTrue(ignore.matches("secret1.txt"))
+        self.assertFalse(ignore.matches("secret10.txt"))
+        self.assertTrue(ignore.matches("data/b.bin"))
+        self.assertFalse(ignore.matches("data/d.bin"))
+        self.assertFalse(ignore.matches("main.py"))
+
+    def test_last_match_wins(self):
+        ignore = DockerIgnore(["!keep.txt", "*.txt"])
+        self.assertTrue(ignore.matches("keep.txt"))
+
+        ignore = DockerIgnore(["*.txt", "!keep.txt"])
+        self.assertFalse(ignore.matches("keep.txt"))
+
+    def test_cleaned_patterns(self):
+        ignore = DockerIgnore(["./dist/", "a/../cache"])
+        self.assertTrue(ignore.matches("dist/bundle.js"))
+        self.assertTrue(ignore.matches("cache/file"))
+
+class TestContextFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.context = Path(self.temp_dir.name).joinpath("src")
+        self.context.mkdir()
+        self.dockerfile = self.context.joinpath("Dockerfile")
+        self.dockerfile.write_text("FROM scratch\nCOPY . /app\n")
+        self.context.joinpath("app.py").write_text("print('hello')\n")
+        self.context.joinpath("node_modules").mkdir()
+        self.context.joinpath("node_modules", "dependency.js").write_text("module.exports = 1\n")
+        self.context.joinpath(".dockerignore").write_text("node_modules\n*.log\n")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def fingerprint(self, **kwargs):
+        return context_fingerprint(self.dockerfile, self.context, **kwargs)
+
+    def test_stable(self):
+        self.assertEqual(self.fingerprint(), self.fingerprint())
+        self.assertEqual(context_files(self.context, DockerIgnore.load(self.context)), [".dockerignore", "Dockerfile", "app.py"])
+
+    def test_content_change(self):
+        before = self.fingerprint()
+        self.context.joinpath("app.py").write_text("print('changed')\n")
+        self.assertNotEqual(self.fingerprint(), before)
+
+    def test_dockerfile_change(self):
+        before = self.fingerprint()
+        self.dockerfile.write_text("FROM scratch\n")
+        self.assertNotEqual(self.fingerprint(), before)
+
+    def test_new_file(self):
+        before = self.fingerprint()
+        self.context.joinpath("static").mkdir()
+        self.context.joinpath("static", "index.html").write_text("<html></html>\n")
+        self.assertNotEqual(self.fingerprint(), before)
+
+    def test_executable_bit(self):
+        before = self.fingerprint()
+        os.chmod(self.context.joinpath("app.py"), 0o755)
+        self.assertNotEqual(self.fingerprint(), before)
+
+    def test_ignored_files(self):
+        before = self.fingerprint()
+        self.context.joinpath("node_modules", "dependency.js").write_text("module.exports = 2\n")
+        self.context.joinpath("debug.log").write_text("log\n")
+        self.assertEqual(self.fingerprint(), before)
+
+    def test_excluded_files(self):
+        version = self.context.joinpath("version")
+        version.write_text("1\n")
+        before = self.fingerprint(exclude={version})
+        version.write_text("2\n")
+        self.assertEqual(self.fingerprint(exclude={version}), before)
+
+    def test_dockerfile_specific_ignore(self):
+        before = self.fingerprint()
+        self.dockerfile.with_name("Dockerfile.dockerignore").write_text("app.py\nnode_modules\n")
+        after = self.fingerprint()
+        self.assertNotEqual(after, before)
+
+        # The context .dockerignore no longer applies
+        self.context.joinpath("debug.log").write_text("log\n")
+        self.assertNotEqual(self.fingerprint(), after)
+
+class TestBuildState(unittest.TestCase):
+    def test_unchanged(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory).joinpath("state.json")
+            state = BuildState(path)
+            self.assertFalse(state.unchanged({"image": "a"}))
+            self.assertFalse(state.unchanged({}))
+
+            state.record("image", "a", 2)
+            state.save()
+
+            state = BuildState(path)
+            self.assertTrue(state.unchanged({"image": "a"}))
+            self.assertFalse(state.unchanged({"image": "b"}))
+            self.assertFalse(state.unchanged({"image": "a", "other": "a"}))
+
+    def test_duration(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory).joinpath("state.json")
+            state = BuildState(path)
+            state.record("image", "a", 1, 12.34567)
+            state.record("other", "b", 1)
+            state.save()
+
+            state = BuildState(path)
+            self.assertEqual(state.duration("image"), 12.346)
+            self.assertIsNone(state.duration("other"))
+            self.assertIsNone(state.duration("missing"))
+
+    def test_concurrent_runs_merged(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory).joinpath("state.json")
+            first = BuildState(path)
+            second = BuildState(path)
+
+            first.record("image", "a", 1, 10)
+            first.save()
+            second.record("other", "b", 1, 20)
+            second.save()
+
+            state = BuildState(path)
+            self.assertTrue(state.unchanged({"image": "a", "other": "b"}))
+            self.assertEqual((state.duration("image"), state.duration("other")), (10, 20))
+
+            # A later build of the same image replaces the saved one
+            first.record("image", "c", 2)
+            first.save()
+            self.assertTrue(BuildState(path).unchanged({"image": "c", "other": "b"}))
+            self.assertTrue(Path(directory).joinpath("locks", "state.lock").exists())
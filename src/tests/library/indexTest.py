@@ -0,0 +1,122 @@
+import os
+import unittest
+import sys
+import tempfile
+
+from pathlib import Path
+from unittest import mock
+
+sys.path.append('..')
+
+from library.data import Challenge, Page
+from library.index import ChallengeIndex
+
+class TestChallengeIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repo = Path(self.temp_dir.name)
+        self.patch = mock.patch('library.utils.CHALLENGE_REPO_ROOT', self.repo)
+        self.patch.start()
+
+        self.challenge = Challenge(
+            name="Index Challenge",
+            slug="index-challenge",
+            author="Test Author",
+            category="web",
+            difficulty="easy",
+            type="instanced",
+            instanced_type="web",
+            flag="ctfpilot{index}",
+        )
+        self.challenge_dir = self.challenge.get_path()
+        self.challenge_dir.mkdir(parents=True)
+        self.challenge_file = self.challenge_dir.joinpath("challenge.yml")
+        self.challenge_file.write_text(self.challenge.str_yml("-"))
+
+        self.page = Page(slug="rules", title="Rules", route="/rules")
+        self.page_dir = self.page.get_path()
+        self.page_dir.mkdir(parents=True)
+        self.page_dir.joinpath("page.json").write_text(self.page.str_json("-"))
+
+    def tearDown(self):
+        self.patch.stop()
+        self.temp_dir.cleanup()
+
+    def age(self, path: Path, seconds: int = 60):
+        # Move the modification time back, so the file is not considered recently modified
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - seconds * 1_000_000_000))
+
+    def test_loads_same_data_as_definition(self):
+        index = ChallengeIndex()
+        loaded = index.challenge(self.challenge_dir)
+        self.assertIsNotNone(loaded)
+        self.assertEqual(loaded.str_yml("-"), Challenge.load_dir(self.challenge_dir).str_yml("-"))
+
+        page = index.page(self.page_dir)
+        self.assertIsNotNone(page)
+        self.assertEqual(page.str_json("-"), self.page.str_json("-"))
+
+    def test_persisted_between_instances(self):
+        self.age(self.challenge_file)
+        ChallengeIndex().challenge(self.challenge_dir)
+        self.assertTrue(self.repo.joinpath(".ctf-cache", "index.json").is_file())
+
+        with mock.patch.object(ChallengeIndex, 'parse', side_effect=AssertionError("parsed again")):
+            loaded = ChallengeIndex().challenge(self.challenge_dir)
+        self.assertEqual(loaded.slug, "index-challenge")
+
+    def test_changed_file_is_parsed_again(self):
+        ChallengeIndex().challenge(self.challenge_dir)
+
+        self.challenge.set_name("Renamed Challenge")
+        self.challenge_file.write_text(self.challenge.str_yml("-"))
+
+        self.assertEqual(ChallengeIndex().challenge(self.challenge_dir).name, "Renamed Challenge")
+
+    def test_touched_file_with_same_content_is_reused(self):
+        self.age(self.challenge_file, 120)
+        ChallengeIndex().challenge(self.challenge_dir)
+        self.age(self.challenge_file, -60)
+
+        with mock.patch.object(ChallengeIndex, 'parse', side_effect=AssertionError("parsed again")):
+            ChallengeIndex().challenge(self.challenge_dir)
+
+    def test_recently_modified_file_is_hashed(self):
+        index = ChallengeIndex()
+        index.challenge(self.challenge_dir)
+
+        # Same size and modification time, but different content
+        stat = self.challenge_file.stat()
+        self.challenge_file.write_text(self.challenge_file.read_text().replace("Index Challenge", "Other Challenge"))
+        os.utime(self.challenge_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        self.assertEqual(index.challenge(self.challenge_dir).name, "Other Challenge")
+
+    def test_invalid_definition_is_not_cached(self):
+        self.challenge_file.write_text("name: Broken\ncategory: not-a-category\n")
+        index = ChallengeIndex()
+        with self.assertRaises(ValueError):
+            index.challenge(self.challenge_dir)
+        self.assertEqual(index.entries, {})
+
+    def test_refresh_reports_errors(self):
+        broken = self.repo.joinpath("challenges", "web", "broken")
+        broken.mkdir(parents=True)
+        broken.joinpath("challenge.yml").write_text("name: Broken\ncategory: not-a-category\n")
+
+        errors = ChallengeIndex().refresh()
+        self.assertEqual(list(errors), ["web/broken"])
+
+    def test_corrupt_index_is_ignored(self):
+        self.repo.joinpath(".ctf-cache").mkdir()
+        self.repo.joinpath(".ctf-cache", "index.json").write_text("{not json")
+        self.assertEqual(ChallengeIndex().challenge(self.challenge_dir).slug, "index-challenge")
+
+    def test_directory_without_definition(self):
+        empty = self.repo.joinpath("challenges", "web", "empty")
+        empty.mkdir(parents=True)
+        self.assertIsNone(ChallengeIndex().challenge(empty))
+
+if __name__ == '__main__':
+    unittest.main()
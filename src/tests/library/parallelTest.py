@@ -0,0 +1,45 @@
+import unittest
+import sys
+
+sys.path.append('..')
+
+from library.parallel import ParallelExecutor, Task
+
+def square(value):
+    print(f"Squaring {value}")
+    return value * value
+
+def fail(message):
+    raise ValueError(message)
+
+def exit_with(code):
+    sys.exit(code)
+
+class TestParallelExecutor(unittest.TestCase):
+    def test_results_in_submission_order(self):
+        tasks = [Task(str(i), square, (i,)) for i in range(8)]
+        results = ParallelExecutor(4).run(tasks)
+        self.assertEqual([result.name for result in results], [str(i) for i in range(8)])
+        self.assertEqual([result.value for result in results], [i * i for i in range(8)])
+        self.assertTrue(all(result.success for result in results))
+
+    def test_output_captured(self):
+        results = ParallelExecutor(2).run([Task("a", square, (2,)), Task("b", square, (3,))])
+        self.assertEqual(results[0].output, "Squaring 2\n")
+        self.assertEqual(results[1].output, "Squaring 3\n")
+
+    def test_error_captured(self):
+        results = ParallelExecutor(2).run([Task("ok", square, (2,)), Task("bad", fail, ("broken",))])
+        self.assertTrue(results[0].success)
+        self.assertFalse(results[1].success)
+        self.assertEqual(results[1].error, "broken")
+
+    def test_exit_codes(self):
+        results = ParallelExecutor(2).run([Task("zero", exit_with, (0,)), Task("one", exit_with, (1,))])
+        self.assertTrue(results[0].success)
+        self.assertFalse(results[1].success)
+
+    def test_single_job_runs_inline(self):
+        results = ParallelExecutor(1).run([Task("bad", fail, ("inline",)), Task("ok", square, (4,))])
+        self.assertFalse(results[0].success)
+        self.assertEqual(results[1].value, 16)
@@ -0,0 +1,78 @@
+import sys
+import json
+import time
+import unittest
+import tempfile
+
+from pathlib import Path
+
+sys.path.append('..')
+
+from library.report import RunReport
+
+class TestRunReport(unittest.TestCase):
+    def report(self):
+        report = RunReport()
+        with report.phase("load"):
+            time.sleep(0.01)
+        with report.phase("build"):
+            pass
+        with report.phase("load"):
+            time.sleep(0.01)
+        report.challenge("web/example")["version"] = 3
+        report.add_image("web/example", {"identifier": "app", "image": "registry/ctf-web-example-app", "success": True, "duration": 1.5, "build_duration": 1.0, "push_duration": 0.5, "exit_code": 0, "build_stats": {"cache_hit_ratio": 0.75, "context_bytes": 2048}})
+        report.add_image("web/example", {"identifier": "bot", "image": "registry/ctf-web-example-bot", "success": False, "duration": 0.25, "build_duration": 0.25, "push_duration": None, "exit_code": 2})
+        report.challenge("web/example")["status"] = "failed"
+        report.status = "failed"
+        return report
+
+    def test_phases(self):
+        report = self.report()
+        self.assertGreaterEqual(report.phases["load"], 0.02)
+        self.assertLess(report.phases["build"], 0.01)
+        self.assertEqual(list(report.phases), ["load", "build"])
+
+    def test_json(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory).joinpath("reports", "run.json")
+            self.report().write_json(path)
+            data = json.loads(path.read_text())
+
+        self.assertEqual(data["status"], "failed")
+        self.assertEqual(data["challenges"][0]["challenge"], "web/example")
+        self.assertEqual(data["challenges"][0]["version"], 3)
+        self.assertEqual([image["exit_code"] for image in data["challenges"][0]["images"]], [0, 2])
+
+    def test_openmetrics(self):
+        metrics = self.report().openmetrics()
+        lines = metrics.splitlines()
+
+        self.assertEqual(lines[-1], "# EOF")
+        self.assertIn("# TYPE ctfpilot_pipeline_phase_duration_seconds gauge", lines)
+        self.assertIn("# UNIT ctfpilot_pipeline_phase_duration_seconds seconds", lines)
+        self.assertIn('ctfpilot_pipeline_challenge_success{challenge="web/example"} 0', lines)
+        self.assertIn('ctfpilot_pipeline_challenge_version{challenge="web/example"} 3', lines)
+        self.assertIn('ctfpilot_pipeline_image_phase_duration_seconds{challenge="web/example",identifier="app",image="registry/ctf-web-example-app",phase="push"} 0.5', lines)
+        self.assertIn('ctfpilot_pipeline_image_exit_code{challenge="web/example",identifier="bot",image="registry/ctf-web-example-bot"} 2', lines)
+        self.assertIn('ctfpilot_pipeline_image_cache_hit_ratio{challenge="web/example",identifier="app",image="registry/ctf-web-example-app"} 0.75', lines)
+        self.assertIn("# UNIT ctfpilot_pipeline_image_context_bytes bytes", lines)
+        # Unknown values are left out
+        self.assertNotIn('phase="push"} None', metrics)
+        self.assertEqual(sum(line.startswith("ctfpilot_pipeline_image_phase_duration_seconds{") for line in lines), 3)
+
+        # Every family is declared once, before its samples
+        types = [line.split()[2] for line in lines if line.startswith("# TYPE")]
+        self.assertEqual(len(types), len(set(types)))
+
+    def test_label_escaping(self):
+        self.assertEqual(RunReport.sample("x", {"a": 'q"\\\n'}, 1), 'ctfpilot_pipeline_x{a="q\\"\\\\\\n"} 1')
+
+    def test_sample_precision(self):
+        self.assertEqual(RunReport.sample("run_timestamp_seconds", {}, 1792275123.456), "ctfpilot_pipeline_run_timestamp_seconds 1792275123.456")
+        self.assertEqual(RunReport.sample("x", {}, 1792275123.0), "ctfpilot_pipeline_x 1792275123")
+        self.assertEqual(RunReport.sample("x", {}, 12345678901), "ctfpilot_pipeline_x 12345678901")
+        self.assertEqual(RunReport.sample("x", {}, 0.000123), "ctfpilot_pipeline_x 0.000123")
+
+        report = RunReport()
+        report.started_at = 1792275123.456
+        self.assertIn("ctfpilot_pipeline_run_timestamp_seconds 1792275123.456", report.openmetrics().splitlines())
@@ -0,0 +1,180 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from pathlib import Path
+
+sys.path.append('..')
+
+from library.template import Template, TemplateCache
+
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent.parent.parent.joinpath("template")
+
+def replace_templated(key: str, value: str, content: str):
+    '''
+    Variable replacement of the renderers before the template engine, kept as the reference for its output
+    '''
+    content = content.replace("{{ " + key + " }}", value)
+    content = content.replace("{{" + key + "}}", value)
+    content = content.replace("{ { " + key + " } }", value)
+    content = content.replace("{ {" + key + "} }", value)
+    return content
+
+def render_replace(source: str, values: dict, blocks: dict) -> str:
+    '''
+    Render the way the renderers did before the template engine: blocks first, then every variable in turn
+    '''
+    output = source
+    for key, content in blocks.items():
+        output = output.replace("    %%" + key + "%%", content)
+    for key, value in values.items():
+        output = replace_templated(key, value, output)
+    return output
+
+class TestTemplate(unittest.TestCase):
+    def test_spacing_variants(self):
+        template = Template("{{ NAME }} {{NAME}} { { NAME } } { {NAME} }")
+        self.assertEqual(template.render({"NAME": "x"}), "x x x x")
+
+    def test_mixed_spacing_not_replaced(self):
+        template = Template("{{ NAME}} {{NAME }}")
+        self.assertEqual(template.render({"NAME": "x"}), "{{ NAME}} {{NAME }}")
+
+    def test_unknown_variables_kept(self):
+        template = Template("{{ NAME }} {{ OTHER }} {{ .Values.kubectf.host }}")
+        self.assertEqual(template.render({"NAME": "x"}), "x {{ OTHER }} {{ .Values.kubectf.host }}")
+
+    def test_values_not_rendered(self):
+        template = Template("{{ HOST }} {{ NAME }}")
+        self.assertEqual(template.render({"HOST": "{{ NAME }}", "NAME": "x"}), "{{ NAME }} x")
+
+    def test_block(self):
+        template = Template("data:\n  config: |\n    %%CONFIG%%\n  end: true\n")
+        output = template.render({}, {"CONFIG": Template.indent("a: 1\nb: 2")})
+        self.assertEqual(output, "data:\n  config: |\n    a: 1\n    b: 2\n\n  end: true\n")
+
+    def test_block_content_rendered(self):
+        template = Template("template: |\n    %%TEMPLATE%%\nname: {{ NAME }}\n")
+        output = template.render({"NAME": "x"}, {"TEMPLATE": "    name: {{ NAME }}\n    %%OTHER%%"})
+        self.assertEqual(output, "template: |\n    name: x\n    %%OTHER%%\nname: x\n")
+
+    def test_unknown_block_kept(self):
+        template = Template("    %%TEMPLATE%%\n")
+        self.assertEqual(template.render({}, {}), "    %%TEMPLATE%%\n")
+
+    def test_template_reused(self):
+        template = Template("name: {{ NAME }}\n")
+        self.assertEqual(template.render({"NAME": "a"}), "name: a\n")
+        self.assertEqual(template.render({"NAME": "b"}), "name: b\n")
+
+    def test_indent(self):
+        self.assertEqual(Template.indent("a\nb"), "    a\n    b\n")
+        self.assertEqual(Template.indent("a", "  "), "  a\n")
+        self.assertEqual(Template.indent(""), "")
+
+class TestTemplateGolden(unittest.TestCase):
+    '''
+    The template engine renders the same output as the previous str.replace based renderers.
+    Values are not rendered again by the engine, so none of the values below contain a variable
+    '''
+    VALUES = {
+        "CHALLENGE_NAME": "example-challenge",
+        "CHALLENGE_PATH": "challenges/web/example-challenge",
+        "CHALLENGE_REPO": "org/repo",
+        "CHALLENGE_CATEGORY": "web",
+        "CHALLENGE_TYPE": "web",
+        "CHALLENGE_VERSION": "3",
+        "CHALLENGE_ENABLED": "true",
+        "CHALLENGE_EXPIRES": "3600",
+        "CHALLENGE_AVAILABLE_AT": "0",
+        "DOCKER_IMAGE": "web-example-challenge",
+        "HOST": "{{ .Values.kubectf.host }}",
+        "CURRENT_DATE": "2024-05-01 10:00:00",
+        "PAGE_SLUG": "about",
+        "PAGE_NAME": "about",
+        "PAGE_PATH": "pages/about",
+        "PAGE_REPO": "org/repo",
+        "PAGE_VERSION": "2",
+        "PAGE_ENABLED": "false",
+    }
+
+    BLOCKS = {
+        "TEMPLATE": "\n".join(["    " + line for line in TEMPLATE_DIR.joinpath("instanced-web-k8s.yml").read_text().splitlines()]),
+        "CONFIG": Template.indent('{\n  "name": "{{ CHALLENGE_NAME }}",\n  "points": 500\n}'),
+        "DESCRIPTION": Template.indent("# Example\n\nConnect to {{HOST}} as { { CHALLENGE_NAME } }."),
+        "PAGE": Template.indent('{\n  "slug": "{ {PAGE_SLUG} }"\n}'),
+        "CONTENT": Template.indent("# About\n\nGenerated {{ CURRENT_DATE }} for {{ UNKNOWN }}"),
+    }
+
+    def assert_matches_replace(self, source: str, values: dict, blocks: dict):
+        expected = render_replace(source, values, blocks)
+        self.assertEqual(Template(source).render(values, blocks), expected)
+        return expected
+
+    def test_spacing_variants(self):
+        source = "a: {{ NAME }}\nb: {{NAME}}\nc: { { NAME } }\nd: { {NAME} }\ne: {{ NAME}} {{NAME }} { {NAME } }\n"
+        expected = self.assert_matches_replace(source, {"NAME": "x"}, {})
+        self.assertEqual(expected, "a: x\nb: x\nc: x\nd: x\ne: {{ NAME}} {{NAME }} { {NAME } }\n")
+
+    def test_unknown_keys(self):
+        source = "{{ NAME }} {{ OTHER }} {{OTHER}} { { OTHER } } { {OTHER} } {{ .Values.kubectf.host }} %%OTHER%%\n    %%OTHER%%\n"
+        self.assert_matches_replace(source, {"NAME": "x"}, {"BLOCK": "    y\n"})
+
+    def test_block_indentation(self):
+        source = "data:\n  config: |\n    %%CONFIG%%\n  description: |\n    %%DESCRIPTION%%\nname: {{ NAME }}\n"
+        blocks = {
+            "CONFIG": Template.indent("a: {{ NAME }}\nb:\n  c: {{NAME}}"),
+            "DESCRIPTION": "\n".join(["    " + line for line in ["first", "  second { { NAME } }", "", "%%KEEP%%"]]),
+        }
+        expected = self.assert_matches_replace(source, {"NAME": "x"}, blocks)
+        self.assertEqual(expected, "data:\n  config: |\n    a: x\n    b:\n      c: x\n\n  description: |\n    first\n      second x\n    \n    %%KEEP%%\nname: x\n")
+
+    def test_repo_templates(self):
+        templates = sorted(TEMPLATE_DIR.iterdir())
+        self.assertEqual([template.name for template in templates], [
+            "challenge-configmap.yml", "instanced-k8s-challenge.yml", "instanced-tcp-k8s.yml", "instanced-web-k8s.yml", "page-configmap.yml",
+        ])
+
+        for template in templates:
+            with self.subTest(template=template.name):
+                expected = self.assert_matches_replace(template.read_text(), self.VALUES, self.BLOCKS)
+                # Every block and known variable of the template was rendered
+                self.assertNotIn("%%", expected)
+                for key in self.VALUES:
+                    self.assertNotIn("{{ " + key + " }}", expected)
+
+class TestTemplateCache(unittest.TestCase):
+    def setUp(self):
+        TemplateCache.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name).joinpath("template.yml")
+        self.path.write_text("name: {{ NAME }}\n")
+
+    def tearDown(self):
+        TemplateCache.clear()
+        self.tmp.cleanup()
+
+    def test_compiled_once(self):
+        first = TemplateCache.get(self.path)
+        self.assertIs(TemplateCache.get(str(self.path)), first)
+        self.assertEqual(first.render({"NAME": "x"}), "name: x\n")
+
+    def test_reloaded_on_change(self):
+        first = TemplateCache.get(self.path)
+        stat = self.path.stat()
+        self.path.write_text("other: {{ NAME }}\n")
+        # Ensure the modification time differs, even on filesystems with coarse timestamps
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        second = TemplateCache.get(self.path)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.render({"NAME": "x"}), "other: x\n")
+
+    def test_missing_file(self):
+        missing = Path(self.tmp.name).joinpath("missing.yml")
+        self.assertFalse(TemplateCache.exists(missing))
+        self.assertFalse(TemplateCache.exists(self.tmp.name))
+        self.assertTrue(TemplateCache.exists(self.path))
+        with self.assertRaises(OSError):
+            TemplateCache.get(missing)
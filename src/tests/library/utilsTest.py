@@ -0,0 +1,88 @@
+import unittest
+import sys
+
+from pathlib import Path
+from unittest import mock
+
+import yaml
+
+sys.path.append('..')
+
+from library.data import Challenge, Page
+from library.utils import Utils
+
+class TestYaml(unittest.TestCase):
+    file_dir = Path('tests/data')
+
+    def python_dump(self, data) -> str:
+        return yaml.dump(data, Dumper=yaml.SafeDumper, sort_keys=False, allow_unicode=True)
+
+    def challenges(self):
+        challenges = [Challenge.load(str(file)) for file in sorted(self.file_dir.iterdir()) if file.suffix in [".yml", ".yaml", ".json"]]
+        challenges.append(Challenge(
+            name="Ünïcode Chällenge ✓",
+            slug="unicode",
+            author="Jane Doe, John Smith",
+            category="misc",
+            difficulty="medium",
+            type="instanced",
+            instanced_type="tcp",
+            tags=["yes", "null", "10", "a: b", " leading", "? key"],
+            connection="nc " + "very-long-hostname." * 10 + "example.com 1337",
+            flag=[{"flag": "ctfpilot{'quoted\" flag'}", "case_sensitive": True}, "ctfpilot{second}"],
+        ))
+        return challenges
+
+    def test_dump_identical_to_pure_python(self):
+        for challenge in self.challenges():
+            data = challenge.generate_dict("-")
+            self.assertTrue(Utils.yaml_c_dumper_safe(data), challenge.slug)
+            self.assertEqual(Utils.dump_yaml(data), self.python_dump(data), challenge.slug)
+
+    def test_dump_fallback_identical(self):
+        data = {
+            "emoji": "flag 😀",
+            "multiline": "first line \nsecond line " + "x" * 100,
+            "tab": "a\tb",
+            "next_line": "a\x85b",
+            "float": 1.5,
+        }
+        self.assertFalse(Utils.yaml_c_dumper_safe(data))
+        self.assertEqual(Utils.dump_yaml(data), self.python_dump(data))
+
+    def test_dump_keys_identical(self):
+        keys = ["", "a" * 122, "a" * 123, "a" * 128, "a" * 129, "é" * 61, "é" * 62, "é" * 64, "é" * 65, "✓" * 43, "é" * 130]
+        for key in keys:
+            data = {"name": "x", key: "value", "nested": {key: [key]}}
+            self.assertEqual(Utils.dump_yaml(data), self.python_dump(data), key)
+            self.assertEqual(yaml.safe_load(Utils.dump_yaml(data)), data)
+
+        self.assertTrue(Utils.yaml_c_dumper_safe({"a" * 122: 1, "é" * 61: 1}))
+        for key in ["", "a" * 123, "é" * 65]:
+            self.assertFalse(Utils.yaml_c_dumper_safe({key: 1}), key)
+        # Only keys are limited, as long values are emitted identically by both dumpers
+        self.assertTrue(Utils.yaml_c_dumper_safe({"key": "é" * 200}))
+
+    def test_dump_without_libyaml(self):
+        challenge = self.challenges()[-1]
+        expected = challenge.str_yml("-")
+        with mock.patch.dict(yaml.__dict__):
+            yaml.__dict__.pop("CSafeDumper", None)
+            yaml.__dict__.pop("CSafeLoader", None)
+            self.assertEqual(challenge.str_yml("-"), expected)
+            self.assertEqual(Utils.load_yaml(self.file_dir.joinpath("full-example.yml")), yaml.safe_load(self.file_dir.joinpath("full-example.yml").read_text()))
+
+    def test_page_dump_identical(self):
+        page = Page(slug="rules", title="Rules: read these", route="/rules")
+        data = page.generate_dict("-")
+        self.assertEqual(Utils.dump_yaml(data), self.python_dump(data))
+
+    def test_load_identical_to_pure_python(self):
+        for file in sorted(self.file_dir.iterdir()):
+            if file.suffix in [".yml", ".yaml"]:
+                self.assertEqual(Utils.load_yaml(file), yaml.safe_load(file.read_text()), file.name)
+
+    def test_round_trip(self):
+        for challenge in self.challenges():
+            data = challenge.generate_dict("-")
+            self.assertEqual(yaml.safe_load(Utils.dump_yaml(data)), data)
@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import time
+import socket
+import unittest
+import tempfile
+import threading
+
+from pathlib import Path
+from unittest import mock
+
+sys.path.append('..')
+
+from library.version import VersionFile
+
+class TestVersionFile(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repo = Path(self.temp_dir.name)
+        self.patch = mock.patch('library.utils.CHALLENGE_REPO_ROOT', self.repo)
+        self.patch.start()
+        self.directory = self.repo.joinpath("challenges", "web", "example")
+        self.directory.mkdir(parents=True)
+        self.version = VersionFile(self.directory, "challenge-web-example")
+
+    def tearDown(self):
+        self.patch.stop()
+        self.temp_dir.cleanup()
+
+    def test_read_write(self):
+        self.assertEqual(self.version.read(), 0)
+        self.version.write(4)
+        self.assertEqual(self.directory.joinpath("version").read_text(), "4")
+        self.assertEqual(self.version.read(), 4)
+        self.assertEqual(self.version.increment(), 5)
+        # Only the version file is left in the challenge directory
+        self.assertEqual([path.name for path in self.directory.iterdir()], ["version"])
+
+    def test_reserve_commit(self):
+        self.version.write(2)
+        first = self.version.reserve()
+        second = self.version.reserve()
+        self.assertEqual((first, second), (3, 4))
+        # Nothing is written until a version is committed
+        self.assertEqual(self.version.read(), 2)
+
+        self.version.commit(second)
+        self.assertEqual(self.version.read(), 4)
+        # A lower version committed later does not move the version back
+        self.version.commit(first)
+        self.assertEqual(self.version.read(), 4)
+        self.assertFalse(self.version.reservations_path().exists())
+
+    def test_release(self):
+        version = self.version.reserve()
+        self.version.release(version)
+        self.assertEqual(self.version.read(), 0)
+        self.assertEqual(self.version.reserve(), version)
+
+    def test_stale_reservations(self):
+        path = self.version.reservations_path()
+        path.parent.mkdir(parents=True)
+        path.write_text(json.dumps({
+            # Not running anymore
+            "7": {"pid": 2 ** 22 + 1, "host": socket.gethostname(), "time": time.time()},
+            # Too old
+            "8": {"pid": os.getpid(), "host": "elsewhere", "time": time.time() - 2 * 24 * 60 * 60},
+        }))
+        self.assertEqual(self.version.reserve(), 1)
+
+    def test_concurrent_reservations(self):
+        versions = []
+        lock = threading.Lock()
+
+        def reserve():
+            # Each thread opens the lock file itself, so the file lock serializes them like separate processes
+            version = VersionFile(self.directory, "challenge-web-example").reserve()
+            with lock:
+                versions.append(version)
+
+        threads = [threading.Thread(target=reserve) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(versions), list(range(1, 17)))
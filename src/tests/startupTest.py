@@ -0,0 +1,106 @@
+import unittest
+import sys
+import json
+import subprocess
+
+from pathlib import Path
+
+sys.path.append('..')
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+
+# Upper bound for the total import time of a subcommand, measured with -X importtime. Generous, as CI runners vary
+# in speed, so it only catches a command importing far more than it needs. The module checks below are exact
+STARTUP_BUDGET_MS = 500
+
+# Modules that are slow to import, and only needed once a command actually runs
+HEAVY_MODULES = ["yaml", "asyncio", "concurrent.futures"]
+
+COMMAND_MODULES = [
+    "commands.challenge_creator",
+    "commands.template_renderer",
+    "commands.pipeline",
+    "commands.page",
+    "commands.slugify",
+    "commands.changed",
+]
+
+# Runs ctf.py as the main module, then prints the imported modules as the last line of the output
+RUN_CLI = '''
+import sys, json, runpy
+sys.argv = ["ctf.py"] + sys.argv[1:]
+try:
+    runpy.run_path("ctf.py", run_name="__main__")
+except SystemExit:
+    pass
+print(json.dumps(sorted(sys.modules)))
+'''
+
+class TestStartup(unittest.TestCase):
+    @staticmethod
+    def imported_modules(*argv):
+        '''
+        Run the CLI, returning the names of the modules imported once the arguments are parsed
+        '''
+        result = subprocess.run(
+            [sys.executable, "-c", RUN_CLI, *argv],
+            cwd=SRC_DIR,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        return set(json.loads(result.stdout.splitlines()[-1]))
+
+    @staticmethod
+    def import_time(*argv) -> float:
+        '''
+        Run the CLI with -X importtime, returning the cumulative import time of the top-level imports in milliseconds
+        '''
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "ctf.py", *argv],
+            cwd=SRC_DIR,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+
+        total = 0
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if not name[1:].startswith(" "):
+                total += int(cumulative)
+        return total / 1000
+
+    def assert_startup(self, argv, module, forbidden):
+        modules = self.imported_modules(*argv)
+
+        self.assertIn(module, modules)
+        for other in COMMAND_MODULES:
+            if other != module:
+                self.assertNotIn(other, modules, f"'{argv[0]}' should not import {other}")
+        for name in HEAVY_MODULES + forbidden:
+            self.assertNotIn(name, modules, f"'{argv[0]}' should not import {name}")
+
+        duration = self.import_time(*argv)
+        self.assertGreater(duration, 0)
+        self.assertLess(duration, STARTUP_BUDGET_MS, f"'{argv[0]}' took {duration:.1f} ms to import")
+
+    def test_slugify(self):
+        self.assert_startup(["slugify", "Startup Test"], "commands.slugify", ["tempfile", "subprocess"])
+
+    def test_changed(self):
+        self.assert_startup(["changed", "--help"], "commands.changed", ["slugify", "tempfile"])
+
+    def test_template(self):
+        self.assert_startup(["template", "--help"], "commands.template_renderer", ["slugify", "tempfile", "subprocess", "zipfile"])
+
+    def test_page(self):
+        self.assert_startup(["page", "--help"], "commands.page", ["slugify", "tempfile", "subprocess"])
+
+    def test_pipeline(self):
+        self.assert_startup(["pipeline", "--help"], "commands.pipeline", ["slugify", "tempfile"])
+
+    def test_create(self):
+        self.assert_startup(["create", "--help"], "commands.challenge_creator", ["slugify", "tempfile", "subprocess"])